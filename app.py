@@ -1,13 +1,15 @@
 import streamlit as st
-import cv2
-import numpy as np
-import pytesseract
-from PIL import Image
-import plotly.express as px
-import time
 import os
 import base64
-from detector import analyze_currency_elite
+import hashlib
+import config
+from detector import evaluate_modules, build_results, is_degraded, visual_jpeg, warm_up, REGISTRY
+from note_frame import NoteFrame
+from note_layout import LAYOUTS
+from ttl_cache import TTLCache
+
+# Always-on checks behind the verdict; the toggles below add the security-feature modules
+CORE_MODULES = ["ai", "lines", "faces", "ocr"]
 
 st.set_page_config(
     page_title="AI Currency Guardian | Elite",
@@ -36,12 +38,74 @@ st.query_params["p"] = st.session_state.page
 st.query_params["theme"] = st.session_state.theme
 
 # --- Asset Helpers ---
+# Streamlit reruns this script on every widget change; files are read once per server, not per rerun
+@st.cache_data
 def get_base64_img(path):
     if os.path.exists(path):
         with open(path, "rb") as img_file:
             return base64.b64encode(img_file.read()).decode()
     return ""
 
+@st.cache_data
+def read_text(path):
+    with open(path, "r") as f:
+        return f.read()
+
+# --- Cached Analysis (shared by all sessions of this server process) ---
+@st.cache_resource(show_spinner="Loading forensic model...")
+def load_detector():
+    """Loads and warms the model and OCR engines once per server, not on every rerun."""
+    return warm_up()
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def decode_note(digest, denomination, _upload):
+    """Decoded note per upload hash and layout; its memoized views survive reruns."""
+    return NoteFrame.from_bytes(_upload, denomination)
+
+@st.cache_resource
+def analysis_store():
+    # Module outputs hold arrays tied to the cached NoteFrame, so they are kept as objects, not pickled per rerun
+    return TTLCache(config.VISUAL_CACHE_SIZE * (len(REGISTRY) + 8), config.RESULT_CACHE_TTL_S)
+
+def analyze_note(digest, denomination, frame, modules):
+    """
+    Module outputs for one upload. Modules already run on it are reused; only newly
+    toggled ones execute. Strictness is applied afterwards in build_results, so it never reruns a module.
+    """
+    store = analysis_store()
+    cached = {}
+    for name in modules:
+        output = store.get((digest, denomination, name))
+        if output is not None:
+            cached[name] = output
+    outputs, timed_out = evaluate_modules(frame, modules, precomputed=cached)
+    for name in modules:
+        if name not in cached and name not in timed_out and not outputs[name].get("fallback"):
+            store.put((digest, denomination, name), outputs[name])
+    return outputs, timed_out
+
+def note_results(digest, denomination, frame, outputs, strictness, timed_out=()):
+    """Fused verdict per upload, module set and strictness, so reruns do not store a new analysis each time."""
+    store = analysis_store()
+    key = (digest, denomination, "results", tuple(sorted(outputs)), strictness)
+    results = store.get(key)
+    if results is None:
+        results = build_results(frame, outputs, strictness, timed_out, visuals="none")
+        if not timed_out and not is_degraded(outputs):
+            store.put(key, results)
+    return results
+
+def note_visual(digest, denomination, frame, outputs, name, timed_out=()):
+    """JPEG of one visual, encoded once per upload (timed-out fallbacks are not kept)."""
+    store = analysis_store()
+    key = (digest, denomination, "visual", name)
+    jpeg = store.get(key)
+    if jpeg is None:
+        jpeg = visual_jpeg(frame, outputs, name)
+        if jpeg is not None and not timed_out:
+            store.put(key, jpeg)
+    return jpeg
+
 hero_base64 = get_base64_img("static/hero.png")
 
 # --- Custom Styling (Elite Design System) ---
@@ -390,7 +454,7 @@ if st.session_state.page == 'journal':
     with col_j2:
         st.markdown("<h1 style='text-align:center;'>TECHNICAL <span class='gradient-text'>JOURNAL</span></h1>", unsafe_allow_html=True)
         try:
-            with open("journal/JOURNAL.html", "r") as f: html_content = f.read()
+            html_content = read_text("journal/JOURNAL.html")
             st.components.v1.html(html_content, height=800, scrolling=True)
         except Exception as e: st.error(f"Error: {e}")
 
@@ -400,7 +464,7 @@ elif st.session_state.page == 'manual':
     with col_m2:
         st.markdown("<h1 style='text-align:center;'>USER <span class='gradient-text'>MANUAL</span></h1>", unsafe_allow_html=True)
         try:
-            with open("journal/USER_GUIDE.html", "r") as f: html_content = f.read()
+            html_content = read_text("journal/USER_GUIDE.html")
             st.components.v1.html(html_content, height=800, scrolling=True)
         except Exception as e: st.error(f"Error: {e}")
 
@@ -428,6 +492,7 @@ else:
         intaglio_enabled = st.toggle("Intaglio (উঁচু ছাপা)", value=True)
         microprint_enabled = st.toggle("Microprint (ক্ষুদ্র লেখা)", value=True)
         ovi_enabled = st.toggle("Color Shift (রঙ পরিবর্তন)", value=True)
+        denomination = st.selectbox("Denomination", list(LAYOUTS))
         st.divider()
         sensitivity = st.slider("Strictness Mode", 0, 20, 12)
         st.markdown("</div>", unsafe_allow_html=True)
@@ -438,63 +503,47 @@ else:
         st.markdown("</div>", unsafe_allow_html=True)
 
     with col_arena:
+        load_detector()
         uploaded_file = st.file_uploader("", type=["jpg", "jpeg", "png"])
         if uploaded_file:
-            file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-            image = cv2.imdecode(file_bytes, 1)
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            # Decode once; every module below (and the AI core) shares this frame's cached views
+            # getbuffer() is a view of the upload, not a copy; it is released once the note is hashed (and decoded, on a new upload)
+            with uploaded_file.getbuffer() as upload:
+                digest = hashlib.sha256(upload).hexdigest()
+                frame = decode_note(digest, denomination, upload)
+            if frame is None:
+                st.error("Could not decode the uploaded image.")
+                st.stop()
+            image = frame.image
+            image_rgb = frame.rgb
             
-            # --- Forensic Detection Modules ---
-            def analyze_watermark(img):
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                blur = cv2.GaussianBlur(gray, (7, 7), 0)
-                _, thresh = cv2.threshold(blur, 200, 255, cv2.THRESH_BINARY)
-                density = np.sum(thresh == 255) / thresh.size
-                return thresh, density > 0.05
-
-            def analyze_security_thread(img):
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                edges = cv2.Canny(gray, 50, 150)
-                lines = cv2.HoughLinesP(edges, 1, np.pi/180, 50, minLineLength=100, maxLineGap=20)
-                thread_img = img.copy()
-                valid = False
-                if lines is not None:
-                    for line in lines:
-                        x1, y1, x2, y2 = line[0]
-                        if abs(x1 - x2) < 25: 
-                            cv2.line(thread_img, (x1, y1), (x2, y2), (0, 255, 0), 3)
-                            valid = True
-                return thread_img, valid
-
-            def analyze_intaglio(img):
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-                variance = laplacian.var()
-                return cv2.convertScaleAbs(laplacian), variance > 400
-
-            def analyze_microprint(img):
-                try:
-                    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                    text = pytesseract.image_to_string(gray).upper()
-                    found = any(word in text for word in ["BANGLADESH", "BANK", "TAKA"])
-                    return gray, found, text
-                except: return img, False, "OCR FAIL"
-
-            def analyze_ovi(img):
-                hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-                hist = cv2.calcHist([hsv], [0], None, [180], [0, 180])
-                variance = np.var(hist)
-                return hsv, variance > 800
+            # --- Forensic Detection Modules (registered in the detector layer) ---
+            toggles = {
+                "watermark": watermark_enabled,
+                "thread": thread_enabled,
+                "intaglio": intaglio_enabled,
+                "microprint": microprint_enabled,
+                "ovi": ovi_enabled,
+            }
+            selected_modules = CORE_MODULES + [name for name, enabled in toggles.items() if enabled]
 
             with st.status("⚔️ Deploying Forensic Modules...", expanded=False) as status:
                 st.write("Initializing AI Forensic Engine...")
-                ai_results, ai_err = analyze_currency_elite(uploaded_file.getvalue(), strictness=sensitivity)
+                # Only selected modules not yet run on this upload execute; they run concurrently on the shared pool
+                module_outputs, timed_out = analyze_note(digest, denomination, frame, selected_modules)
                 st.write("Running Structural Analysis...")
-                w_img, w_pass = analyze_watermark(image) if watermark_enabled else (None, False)
-                t_img, t_pass = analyze_security_thread(image) if thread_enabled else (None, False)
-                i_img, i_pass = analyze_intaglio(image) if intaglio_enabled else (None, False)
-                m_img, m_pass, m_text = analyze_microprint(image) if microprint_enabled else (None, False, "")
-                o_img, o_pass = analyze_ovi(image) if ovi_enabled else (None, False)
+                ai_results = note_results(digest, denomination, frame, module_outputs, sensitivity, timed_out)
+
+                def module_view(name):
+                    # Disabled modules were never run: no visual, not passed. Overlays are drawn and JPEG-encoded on demand.
+                    return note_visual(digest, denomination, frame, module_outputs, name, timed_out), module_outputs.get(name, {}).get("passed", False)
+
+                w_img, w_pass = module_view("watermark")
+                t_img, t_pass = module_view("thread")
+                i_img, i_pass = module_view("intaglio")
+                m_img, m_pass = module_view("microprint")
+                m_text = module_outputs.get("microprint", {}).get("text", "")
+                o_img, o_pass = module_view("ovi")
                 status.update(label="Forensic Analysis Complete", state="complete")
 
             res_col1, res_col2 = st.columns([1.2, 1])
@@ -510,8 +559,8 @@ else:
                 
                 # New Metrics display
                 m_row1 = st.columns(3)
-                m_row1[0].metric("AI Confidence", f"{ai_results['ai_confidence']}%")
-                m_row1[1].metric("Anomaly Score", f"{ai_results['anomaly_score']}")
+                m_row1[0].metric("AI Confidence", "n/a" if ai_results['ai_confidence'] is None else f"{ai_results['ai_confidence']}%")
+                m_row1[1].metric("Anomaly Score", "n/a" if ai_results['anomaly_score'] is None else f"{ai_results['anomaly_score']}")
                 m_row1[2].metric("Thread", "PASS" if t_pass else "FAIL")
                 
                 m_row2 = st.columns(2)
@@ -523,8 +572,8 @@ else:
             
             with tabs[0]: 
                 t_col1, t_col2 = st.columns(2)
-                t_col1.image("data:image/jpeg;base64," + ai_results['visuals']['ai_attention'], caption="AI Attention Heatmap (SE-Block Focus)", use_container_width=True)
-                t_col2.image("data:image/jpeg;base64," + ai_results['visuals']['reconstruction'], caption="AI Reconstruction (Forensic Decoder)", use_container_width=True)
+                t_col1.image(note_visual(digest, denomination, frame, module_outputs, "ai_attention", timed_out), caption="AI Attention Heatmap (SE-Block Focus)", use_container_width=True)
+                t_col2.image(note_visual(digest, denomination, frame, module_outputs, "reconstruction", timed_out), caption="AI Reconstruction (Forensic Decoder)", use_container_width=True)
                 st.info("The AI model uses Attention Mechanisms to focus on micro-features and Anomaly Detection to flag deviations from a genuine note's distribution.")
 
             with tabs[1]: st.image(w_img if w_img is not None else image, caption="Texture Analysis", use_container_width=True)
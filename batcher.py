@@ -0,0 +1,84 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects concurrently submitted items for a few milliseconds and hands them
+    to `process_batch` as one list, so many callers share a single forward pass.
+    `process_batch` must return one output per input, in order.
+    """
+    def __init__(self, process_batch, max_batch_size=16, max_wait_ms=5.0):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._batch_sizes = Counter()
+        self._queue_depths = Counter()
+        self._items = 0
+
+    def submit(self, item):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": sum(self._batch_sizes.values()),
+                "items": self._items,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "queue_depth_histogram": {str(k): v for k, v in sorted(self._queue_depths.items())},
+            }
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        # Block for the first item, then keep filling until the batch is full or the window closes
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._queue_depths[self._queue.qsize()] += 1
+                self._items += len(batch)
+
+            items = [item for item, _ in batch]
+            try:
+                outputs = self.process_batch(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), output in zip(batch, outputs):
+                future.set_result(output)
@@ -0,0 +1,57 @@
+"""
+Latency/throughput of the AI core per inference backend: eager PyTorch fp32 versus
+exported models from export_model.py (TorchScript, ONNX, int8 variants), plus the
+anomaly-score parity of each export against eager.
+
+Usage: python benchmarks/bench_backends.py --weights currency_forensic_model.pth \
+           --models model.onnx model.int8-static.onnx model.ts [--batch-sizes 1 8] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from export_model import check_parity, load_samples
+from model_runtime import load_runtime
+
+
+def measure(runtime, batch_size, repeat):
+    batch = torch.rand(batch_size, 3, 512, 512)
+    runtime(batch)  # Warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        runtime(batch)
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return best * 1000, batch_size / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default=config.MODEL_PATH)
+    parser.add_argument("--models", nargs="*", default=[])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--calibration", default="training_data")
+    args = parser.parse_args()
+
+    reference = load_runtime(args.weights)
+    samples = load_samples(args.calibration, 8)
+    for path in [args.weights] + args.models:
+        runtime = reference if path == args.weights else load_runtime(path)
+        name = f"{runtime.backend}:{os.path.basename(path)}"
+        for batch_size in args.batch_sizes:
+            latency_ms, throughput = measure(runtime, batch_size, args.repeat)
+            print(f"{name:<40} batch={batch_size:<3} latency={latency_ms:8.1f} ms  throughput={throughput:6.1f} notes/s")
+        if runtime is not reference:
+            parity = check_parity(reference, runtime, samples)
+            print(f"{name:<40} parity: max_abs_diff={parity['max_abs_diff']:.3g} verdict_flips={parity['verdict_flips']}/{parity['notes']}")
+
+
+if __name__ == "__main__":
+    main()
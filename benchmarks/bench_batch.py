@@ -0,0 +1,54 @@
+"""
+Throughput benchmark for batched inference.
+Reports notes/sec for the AI core alone and for the full analyze_currency_batch pipeline.
+
+Usage: python benchmarks/bench_batch.py [--notes 64] [--sizes 1 8 32]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+os.environ["FORENSIC_RESULT_CACHE"] = "0"  # every batch size must really analyze the notes
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import detector
+
+
+def synthetic_notes(count, size=(600, 1300)):
+    rng = np.random.default_rng(0)
+    notes = []
+    for _ in range(count):
+        img = rng.integers(0, 255, (size[0], size[1], 3), dtype=np.uint8)
+        _, buffer = cv2.imencode('.jpg', img)
+        notes.append(buffer.tobytes())
+    return notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notes", type=int, default=64)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    notes = synthetic_notes(args.notes)
+    detector.run_ai_batch([detector.decode_image(notes[0])])  # warm-up
+
+    print(f"{'batch':>6} {'ai notes/s':>12} {'e2e notes/s':>12}")
+    for size in args.sizes:
+        # Fresh frames per size: NoteFrames memoize their AI input tensor
+        images = [detector.decode_image(b) for b in notes]
+        start = time.perf_counter()
+        detector.run_ai_batch(images, max_batch_size=size)
+        ai_rate = len(images) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        detector.analyze_currency_batch(notes, max_batch_size=size)
+        e2e_rate = len(notes) / (time.perf_counter() - start)
+        print(f"{size:>6} {ai_rate:>12.2f} {e2e_rate:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
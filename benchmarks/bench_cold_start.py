@@ -0,0 +1,53 @@
+"""
+Cold-start benchmark: import time, model load, warm-up and first-request latency.
+Each scenario runs in a fresh interpreter so nothing is cached between runs.
+
+Usage: python benchmarks/bench_cold_start.py [--weights path/to/model.pth]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import detector
+timings = {"import_s": time.perf_counter() - start}
+import cv2, numpy as np
+if sys.argv[1] == "warm":
+    timings.update(detector.warm_up(sys.argv[2] or None))
+elif sys.argv[2]:
+    detector.load_model(sys.argv[2])
+note = cv2.imencode('.jpg', np.random.default_rng(0).integers(0, 255, (600, 1300, 3), dtype=np.uint8))[1].tobytes()
+for key in ("first_request_s", "second_request_s"):
+    start = time.perf_counter()
+    detector.analyze_currency_elite(note)
+    timings[key] = time.perf_counter() - start
+print("RESULT" + json.dumps(timings))
+"""
+
+
+def run(mode, weights):
+    out = subprocess.run([sys.executable, "-c", PROBE, mode, weights or ""], cwd=ROOT, capture_output=True, text=True)
+    line = [l for l in out.stdout.splitlines() if l.startswith("RESULT")]
+    if not line:
+        raise RuntimeError(out.stderr)
+    return json.loads(line[0][len("RESULT"):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--weights", default=None)
+    args = parser.parse_args()
+
+    for mode in ("cold", "warm"):
+        timings = run(mode, args.weights)
+        print(f"[{mode}] " + ", ".join(f"{k}={v:.3f}" for k, v in timings.items()))
+
+
+if __name__ == "__main__":
+    main()
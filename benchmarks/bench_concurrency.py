@@ -0,0 +1,59 @@
+"""
+Concurrent-load benchmark for the AI core with and without micro-batching.
+Each client thread repeatedly submits one note, the way parallel /analyze requests do.
+
+Usage: python benchmarks/bench_concurrency.py [--clients 8] [--requests 4]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import detector
+
+
+def run_load(image, clients, requests_per_client):
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            detector.run_ai(image)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=4)
+    args = parser.parse_args()
+
+    image = np.random.default_rng(0).integers(0, 255, (600, 1300, 3), dtype=np.uint8)
+    detector.run_ai_batch([image])  # warm-up
+
+    print(f"{'mode':>14} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for enabled in (False, True):
+        config.MICRO_BATCHING = enabled
+        rate, p50, p99 = run_load(image, args.clients, args.requests)
+        print(f"{'micro-batch' if enabled else 'direct':>14} {rate:>8.2f} {p50:>9.1f} {p99:>9.1f}")
+    print("batcher stats:", detector.get_ai_batcher().stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Early-exit cascade vs full analysis on a set of notes: average modules executed per
+note, mean latency and the share saved, per strictness. Also checks that every
+early-exit verdict matches the full analysis.
+
+Without --images, a synthetic set is used: printed notes with a dense line grid (the
+structural checks pass) and flat or noisy photocopies (they fail), in equal parts.
+
+Usage: python benchmarks/bench_early_exit.py [--images dir/] [--notes 12] [--strictness 6 12 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+os.environ["FORENSIC_RESULT_CACHE"] = "0"  # every run must really analyze the note
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import detector
+
+
+def synthetic_notes(count, width=1300, height=600):
+    rng = np.random.default_rng(0)
+    notes = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:  # printed note: fine line grid over a colored background
+            note = np.full((height, width, 3), rng.integers(90, 200, 3), dtype=np.uint8)
+            for x in range(0, width, 24):
+                cv2.line(note, (x, 0), (x, height - 1), (20, 20, 20), 2)
+            for y in range(0, height, 24):
+                cv2.line(note, (0, y), (width - 1, y), (20, 20, 20), 2)
+        elif kind == 1:  # flat photocopy
+            note = np.full((height, width, 3), rng.integers(150, 230), dtype=np.uint8)
+        else:  # noisy print, no structure
+            note = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        notes.append(cv2.imencode(".jpg", note)[1].tobytes())
+    return notes
+
+
+def load_notes(directory):
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith((".jpg", ".jpeg", ".png")))
+    notes = []
+    for name in names:
+        with open(os.path.join(directory, name), "rb") as f:
+            notes.append(f.read())
+    return notes
+
+
+def run(notes, strictness, full_analysis):
+    executed, latencies, verdicts = 0, [], []
+    for note in notes:
+        start = time.perf_counter()
+        results, error = detector.analyze_currency_elite(note, strictness=strictness, visuals="none", full_analysis=full_analysis)
+        latencies.append(time.perf_counter() - start)
+        if error:
+            raise RuntimeError(error)
+        executed += len(results["modules"])
+        verdicts.append(results["is_real"])
+    return executed / len(notes), float(np.mean(latencies)), verdicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=None, help="directory of note photos (default: synthetic set)")
+    parser.add_argument("--notes", type=int, default=12)
+    parser.add_argument("--strictness", type=int, nargs="+", default=[6, 12, 20])
+    args = parser.parse_args()
+
+    notes = load_notes(args.images) if args.images else synthetic_notes(args.notes)
+    detector.warm_up()
+    detector.analyze_currency_elite(notes[0], visuals="none", full_analysis=True)  # first-call overheads out of the way
+
+    print(f"{len(notes)} notes, {len(detector.resolve_modules())} modules selected")
+    print(f"{'strictness':>10} {'modules/note':>14} {'full':>6} {'ms/note':>9} {'full':>9} {'saved':>7} {'same verdict':>13}")
+    for strictness in args.strictness:
+        full_modules, full_s, full_verdicts = run(notes, strictness, True)
+        cascade_modules, cascade_s, cascade_verdicts = run(notes, strictness, False)
+        same = sum(a == b for a, b in zip(full_verdicts, cascade_verdicts))
+        print(f"{strictness:>10} {cascade_modules:>14.2f} {full_modules:>6.2f} {cascade_s * 1000:>9.0f} {full_s * 1000:>9.0f} "
+              f"{(1 - cascade_s / full_s) * 100:>6.0f}% {same:>6}/{len(notes)}")
+
+
+if __name__ == "__main__":
+    main()
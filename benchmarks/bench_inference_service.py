@@ -0,0 +1,93 @@
+"""
+In-process inference vs the shared inference service. Runs the same concurrent
+single-note load (like parallel /analyze requests) once with the model loaded in this
+process and once through a freshly started inference_service.py over a UNIX socket,
+and reports throughput, latency and each front end's resident memory.
+
+Usage: python benchmarks/bench_inference_service.py [--clients 4] [--requests 5] [--address /tmp/bench-inference.sock]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def front_end(clients, requests_per_client):
+    """Runs in a child process; the detector picks local or remote inference from FORENSIC_INFERENCE_ADDRESS."""
+    import detector
+    from note_frame import NoteFrame
+
+    detector.warm_up(ocr=False)
+    frame = NoteFrame(np.random.default_rng(0).integers(0, 255, (1080, 2400, 3), dtype=np.uint8))
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            detector.run_ai(frame)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "notes_per_s": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(np.percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(np.percentile(latencies, 99) * 1000, 1),
+        "front_end_rss_mb": rss_mb(os.getpid()),
+        "torch_loaded": "torch" in sys.modules,
+    }))
+
+
+def run_front_end(args, address):
+    env = dict(os.environ, FORENSIC_INFERENCE_ADDRESS=address)
+    out = subprocess.run([sys.executable, __file__, "--child", "--clients", str(args.clients), "--requests", str(args.requests)],
+                         env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--address", default="/tmp/bench-inference.sock")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return front_end(args.clients, args.requests)
+
+    print("in-process:", run_front_end(args, ""))
+    service = subprocess.Popen([sys.executable, "inference_service.py", "--listen", args.address], cwd=ROOT,
+                               env=dict(os.environ, FORENSIC_INFERENCE_ADDRESS=""), stdout=subprocess.DEVNULL)
+    try:
+        print("service:   ", run_front_end(args, args.address))
+        print(f"service RSS: {rss_mb(service.pid)} MB (shared by every front end)")
+    finally:
+        service.terminate()
+        service.wait()
+
+
+if __name__ == "__main__":
+    main()
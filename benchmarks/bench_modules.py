@@ -0,0 +1,51 @@
+"""
+Per-note latency of the detector modules run sequentially versus concurrently
+on the module scheduler's thread pool.
+
+Usage: python benchmarks/bench_modules.py [--notes 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import detector
+from note_frame import NoteFrame
+from scheduler import run_modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notes", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (600, 1300, 3), dtype=np.uint8) for _ in range(args.notes)]
+    detector.warm_up()
+
+    stage_ms = {}
+    start = time.perf_counter()
+    for image in images:
+        frame = NoteFrame(image)
+        tasks = detector.module_tasks(frame, detector.resolve_modules())
+        for name, fn in tasks.items():
+            t = time.perf_counter()
+            fn()
+            stage_ms[name] = stage_ms.get(name, 0.0) + (time.perf_counter() - t) * 1000 / len(images)
+    sequential = (time.perf_counter() - start) * 1000 / len(images)
+
+    start = time.perf_counter()
+    for image in images:
+        frame = NoteFrame(image)
+        run_modules(detector.module_tasks(frame, detector.resolve_modules()))
+    concurrent = (time.perf_counter() - start) * 1000 / len(images)
+
+    print("per-module ms: " + ", ".join(f"{k}={v:.1f}" for k, v in stage_ms.items()))
+    print(f"sequential: {sequential:.1f} ms/note  concurrent: {concurrent:.1f} ms/note  slowest module: {max(stage_ms.values()):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+OCR benchmark: per-call pytesseract ('inline') vs the warm engine pool ('pool').
+Reports latency and CPU time per note (including worker/child processes) for full-note
+OCR and for a small whitelisted ROI.
+
+Usage: python benchmarks/bench_ocr.py [--requests 20] [--workers 2]
+"""
+import argparse
+import os
+import resource
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from ocr_service import OCRService, PSM_SINGLE_BLOCK
+
+
+def make_note():
+    note = np.full((600, 1300), 235, dtype=np.uint8)
+    cv2.putText(note, "BANGLADESH BANK", (120, 140), cv2.FONT_HERSHEY_SIMPLEX, 3, 0, 6)
+    cv2.putText(note, "500 TAKA", (380, 360), cv2.FONT_HERSHEY_SIMPLEX, 3, 0, 6)
+    cv2.putText(note, "KA 1234567", (820, 540), cv2.FONT_HERSHEY_SIMPLEX, 1.4, 0, 3)
+    return note
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run(backend, workers, note, requests, **kwargs):
+    service = OCRService(backend, workers)
+    service.warm_up()
+    latencies, text = [], ""
+    cpu_start = cpu_seconds()
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            text = service.recognize(note, **kwargs)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        # Workers only show up in RUSAGE_CHILDREN once they have been reaped,
+        # so pool CPU also includes the one-off engine start, amortized over the run
+        service.shutdown(wait=True)
+    return latencies, (cpu_seconds() - cpu_start) / requests, text.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    note = make_note()
+    scenarios = {
+        "full note": {},
+        "serial ROI": {"roi": (800, 490, 420, 80), "whitelist": "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ ", "psm": PSM_SINGLE_BLOCK},
+    }
+    for backend in ("inline", "pool"):
+        for name, kwargs in scenarios.items():
+            try:
+                latencies, cpu, text = run(backend, args.workers, note, args.requests, **kwargs)
+            except Exception as e:
+                print(f"[{backend}] unavailable: {e}")
+                break
+            print(f"[{backend}] {name:<10} p50={statistics.median(latencies) * 1000:.1f}ms "
+                  f"max={max(latencies) * 1000:.1f}ms cpu/note={cpu * 1000:.1f}ms text={text!r}")
+
+
+if __name__ == "__main__":
+    main()
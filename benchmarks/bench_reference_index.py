@@ -0,0 +1,73 @@
+"""
+Reference index growth: adds synthetic genuine-note embeddings in increments and, at
+each size, measures the latency of a batch k-NN query (IVF lists vs a full scan of the
+same file), recall and the error of the mean k-NN distance against an exact float32
+search, and the size on disk. Below IVF_MIN_TRAIN notes the index is always scanned in full.
+
+Usage: python benchmarks/bench_reference_index.py [--sizes 1000 10000 100000] [--dtype int8] [--batch 16]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reference_index import ReferenceIndex, normalize
+
+
+def embeddings(rng, centers, count, noise=0.15):
+    # Non-negative like pooled ReLU latents, clustered like notes of a few designs and print runs
+    picks = centers[rng.integers(0, len(centers), count)]
+    return np.maximum(picks + rng.normal(0, noise, picks.shape), 0).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dtype", choices=("float16", "int8"), default="float16")
+    parser.add_argument("--batch", type=int, default=16, help="query embeddings per search call")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.random((200, args.dim)).astype(np.float32)
+    index = ReferenceIndex(tempfile.mkdtemp(), args.dtype, args.k, args.nprobe)
+    stored = np.zeros((0, args.dim), np.float32)
+
+    print(f"{'notes':>8} {'lists':>6} {'add s':>7} {'query ms':>9} {'ms/note':>8} {'full scan':>10} {'recall@k':>9} {'dist err':>9} {'MB':>7}")
+    for size in sorted(args.sizes):
+        new = embeddings(rng, centers, size - len(stored))
+        start = time.perf_counter()
+        for part in np.array_split(new, max(1, len(new) // 1000)):
+            index.add(part)  # incremental adds of ~1000 notes, as a nightly import would do
+        add_s = time.perf_counter() - start
+        stored = np.concatenate([stored, new])
+
+        queries = embeddings(rng, centers, args.batch)
+        index.search(queries)  # first query maps the files
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            distances, ids = index.search(queries)
+        query_s = (time.perf_counter() - start) / args.repeats
+        state = index.refresh()._replace(centroids=None)
+        start = time.perf_counter()
+        index.search(queries, state=state)
+        scan_s = time.perf_counter() - start
+
+        sims = normalize(queries) @ normalize(stored).T
+        exact = np.argsort(-sims, axis=1)[:, :args.k]
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(ids, exact)])
+        error = np.abs(distances.mean(axis=1) - (1 - np.take_along_axis(sims, exact, axis=1)).mean(axis=1)).mean()
+        stats = index.stats()
+        print(f"{size:>8} {stats['nlist']:>6} {add_s:>7.2f} {query_s * 1000:>9.2f} {query_s * 1000 / args.batch:>8.3f} "
+              f"{scan_s * 1000:>10.2f} {recall:>9.3f} {error:>9.5f} {stats['bytes'] / 1e6:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Latency versus input size: decode plus the CV modules for JPEG photos from 1 to 48 MP,
+with full-size decoding and with IMREAD_REDUCED_* decoding (config.DECODE_MIN_SIDE).
+OCR and the AI core are left out; their input size does not depend on the upload.
+
+Usage: python benchmarks/bench_resolution.py [--megapixels 1 3 12 24 48] [--repeat 2]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from forensic_modules import REGISTRY
+from note_frame import NoteFrame
+from bench_roi import make_photo
+
+CV_MODULES = ("lines", "faces", "watermark", "thread", "intaglio", "ovi")
+
+
+def analyze(note_bytes):
+    start = time.perf_counter()
+    frame = NoteFrame.from_bytes(note_bytes)
+    decoded = time.perf_counter()
+    outputs = {name: REGISTRY[name].run(frame) for name in CV_MODULES}
+    return frame, decoded - start, time.perf_counter() - decoded, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[1, 3, 12, 24, 48])
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    min_side = config.DECODE_MIN_SIDE
+    analyze(cv2.imencode('.jpg', make_photo(1, rng))[1].tobytes())  # Load the Haar cascade outside the timings
+    for megapixels in args.megapixels:
+        note_bytes = cv2.imencode('.jpg', make_photo(megapixels, rng), [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        row = []
+        for label, side in (("full decode", 0), ("reduced", min_side)):
+            config.DECODE_MIN_SIDE = side
+            runs = [analyze(note_bytes) for _ in range(args.repeat)]
+            frame, outputs = runs[-1][0], runs[-1][3]
+            decode_ms = min(r[1] for r in runs) * 1000
+            cv_ms = min(r[2] for r in runs) * 1000
+            passed = "".join("1" if outputs[name]["passed"] else "0" for name in CV_MODULES)
+            row.append(f"{label}: {frame.shape[1]}x{frame.shape[0]} decode={decode_ms:.0f}ms cv={cv_ms:.0f}ms passed={passed}")
+        print(f"{megapixels:>4g} MP | " + " | ".join(row))
+    config.DECODE_MIN_SIDE = min_side
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+CV work per note on a large phone-camera style photo: the full-image scans
+(Canny + Hough over every pixel, Haar over the whole gray image, OCR thresholding
+the full upload) versus alignment plus the layout-region modules.
+
+Usage: python benchmarks/bench_roi.py [--megapixels 12] [--notes 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from forensic_modules import REGISTRY, find_lines, find_faces
+from note_frame import NoteFrame
+
+CV_MODULES = ("lines", "faces", "watermark", "thread")
+
+
+def make_photo(megapixels, rng):
+    """A textured note lying slightly rotated on a darker table."""
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    photo = np.full((height, width, 3), 40, dtype=np.uint8)
+    note_w, note_h = int(width * 0.75), int(width * 0.75 / 2.25)
+    note = rng.integers(120, 230, (note_h, note_w, 3), dtype=np.uint8)
+    for x in range(0, note_w, note_w // 40):
+        cv2.line(note, (x, 0), (x, note_h - 1), (30, 30, 30), 3)
+    m = cv2.getRotationMatrix2D((note_w / 2, note_h / 2), 4, 1.0)
+    m[:, 2] += ((width - note_w) / 2, (height - note_h) / 2)
+    cv2.warpAffine(note, m, (width, height), dst=photo, borderMode=cv2.BORDER_TRANSPARENT)
+    return photo
+
+
+def full_image(image):
+    # What the modules did before layout regions: every check scans the whole upload
+    frame = NoteFrame(image)
+    find_lines(frame)
+    find_faces(frame)
+    cv2.HoughLinesP(frame.edges(50, 150), 1, np.pi/180, 50, minLineLength=100, maxLineGap=20)
+    cv2.threshold(cv2.GaussianBlur(frame.gray, (7, 7), 0), 200, 255, cv2.THRESH_BINARY)
+    cv2.threshold(frame.gray, 150, 255, cv2.THRESH_BINARY)
+
+
+def regions(image):
+    frame = NoteFrame(image)
+    for name in CV_MODULES:
+        REGISTRY[name].run(frame)
+    cv2.threshold(frame.region("serial").gray, 150, 255, cv2.THRESH_BINARY)
+    return frame
+
+
+def timed(fn, images):
+    start = time.perf_counter()
+    for image in images:
+        fn(image)
+    return (time.perf_counter() - start) * 1000 / len(images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--notes", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = [make_photo(args.megapixels, rng) for _ in range(args.notes)]
+    regions(images[0])  # Load the Haar cascade outside the timings
+
+    start = time.perf_counter()
+    aligned = NoteFrame(images[0]).aligned
+    align_ms = (time.perf_counter() - start) * 1000
+    full_ms, roi_ms = timed(full_image, images), timed(regions, images)
+    print(f"{images[0].shape[1]}x{images[0].shape[0]} photo -> aligned {aligned.shape[1]}x{aligned.shape[0]} in {align_ms:.1f} ms")
+    print(f"full image: {full_ms:.1f} ms/note  regions (incl. alignment): {roi_ms:.1f} ms/note  ({full_ms / roi_ms:.1f}x less CV work)")
+
+
+if __name__ == "__main__":
+    main()
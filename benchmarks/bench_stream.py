@@ -0,0 +1,85 @@
+"""
+Stream mode on a synthetic checkout clip: an empty counter, a note slid in, held
+(with hand jitter and a few blurred frames), taken away, then a second note. Reports
+the sustained frame rate, per-frame latency, keyframes and the fused verdict.
+
+Usage: python benchmarks/bench_stream.py [--size 640x480] [--seconds 10] [--realtime] [--video clip.avi]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import detector
+from stream_analyzer import StreamAnalyzer, run_stream
+
+
+def make_clip(path, width, height, seconds, fps=30):
+    rng = np.random.default_rng(0)
+    table = np.full((height, width, 3), 45, dtype=np.uint8)
+    note_w, note_h = int(width * 0.7), int(width * 0.7 / 2.25)
+    notes = []
+    for _ in range(2):
+        note = rng.integers(120, 230, (note_h, note_w, 3), dtype=np.uint8)
+        for x in range(0, note_w, max(1, note_w // 40)):
+            cv2.line(note, (x, 0), (x, note_h - 1), (30, 30, 30), 2)
+        notes.append(note)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    total = int(seconds * fps)
+    jitter = (0, 0)
+    for i in range(total):
+        phase = i / total
+        frame = table.copy()
+        if 0.05 <= phase < 0.45 or 0.55 <= phase < 0.95:
+            note = notes[0] if phase < 0.5 else notes[1]
+            start = 0.05 if phase < 0.5 else 0.55
+            # Slides in during the first 10% of its time on the counter, then the hand drifts by a pixel now and then
+            slide = max(0.0, 1.0 - (phase - start) / 0.05)
+            if rng.random() < 0.1:
+                jitter = (int(rng.integers(-1, 2)), int(rng.integers(-1, 2)))
+            dx = int((width - note_w) / 2 - slide * width * 0.6) + jitter[0]
+            dy = (height - note_h) // 2 + jitter[1]
+            m = cv2.getRotationMatrix2D((note_w / 2, note_h / 2), 3, 1.0)
+            m[:, 2] += (dx, dy)
+            cv2.warpAffine(note, m, (width, height), dst=frame, borderMode=cv2.BORDER_TRANSPARENT)
+            if slide > 0 or rng.random() < 0.1:
+                frame = cv2.GaussianBlur(frame, (9, 9), 3)
+        writer.write(frame)
+    writer.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="640x480")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--realtime", action="store_true", help="pace the clip at 30 fps and drop frames the analyzer cannot keep up with")
+    parser.add_argument("--video", default=None, help="analyze this file instead of a synthetic clip")
+    parser.add_argument("--modules", default=None)
+    args = parser.parse_args()
+
+    detector.warm_up()
+    path = args.video
+    if path is None:
+        width, height = (int(v) for v in args.size.split("x"))
+        path = os.path.join(tempfile.mkdtemp(), "clip.avi")
+        make_clip(path, width, height, args.seconds)
+
+    verdicts = []
+    def on_frame(image, result):
+        if result["verdict"] and result["verdict"]["final"] and (not verdicts or result["frame"] - verdicts[-1][0] > 30):
+            verdicts.append((result["frame"], result["verdict"]["is_real"], result["verdict"]["score"]))
+
+    stats = run_stream(path, StreamAnalyzer(args.modules), realtime=args.realtime, on_frame=on_frame)
+    stats.pop("verdict")
+    print(json.dumps(stats))
+    print(f"first final verdicts (frame, is_real, score): {verdicts[:4]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Throughput across server-worker x thread combinations. Each combination starts
+`workers` processes (like gunicorn workers) that analyze notes at the same time,
+with torch/OpenCV threads set per worker. 'auto' uses the defaults from config
+(cores split between workers).
+
+Usage: python benchmarks/bench_threads.py [--workers 1 2 4] [--threads auto 1 2 4] [--notes 4]
+       [--inference-mode 0 1] [--channels-last 0 1]
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# OCR is left out: it runs in its own process pool (kept inline here so workers exit cleanly)
+MODULES = "ai,lines,faces,watermark,thread,intaglio,ovi"
+
+
+def worker(barrier, notes, results):
+    import cv2
+    import numpy as np
+    import detector
+
+    detector.warm_up()
+    note = cv2.imencode('.jpg', np.random.default_rng(os.getpid()).integers(0, 255, (1200, 2600, 3), dtype=np.uint8))[1].tobytes()
+    barrier.wait()
+    start = time.perf_counter()
+    for _ in range(notes):
+        detector.analyze_currency_elite(note, modules=MODULES, visuals="none")
+    results.put(time.perf_counter() - start)
+
+
+def run(workers, threads, notes, inference_mode, channels_last):
+    env = {"WEB_CONCURRENCY": str(workers), "FORENSIC_RESULT_CACHE": "0", "FORENSIC_MICRO_BATCHING": "0", "FORENSIC_OCR_BACKEND": "inline",
+           "FORENSIC_INFERENCE_MODE": inference_mode, "FORENSIC_CHANNELS_LAST": channels_last}
+    if threads != "auto":
+        env.update(FORENSIC_TORCH_THREADS=threads, FORENSIC_CV_THREADS=threads)
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)  # Inherited by the spawned workers, which read config at import
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        barrier, results = ctx.Barrier(workers + 1), ctx.Queue()
+        procs = [ctx.Process(target=worker, args=(barrier, notes, results)) for _ in range(workers)]
+        for proc in procs:
+            proc.start()
+        barrier.wait()
+        start = time.perf_counter()
+        per_worker = [results.get() for _ in procs]
+        elapsed = time.perf_counter() - start
+        for proc in procs:
+            proc.join()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    return workers * notes / elapsed, max(per_worker) / notes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", nargs="+", default=["auto", "1", "2", "4"])
+    parser.add_argument("--notes", type=int, default=4)
+    parser.add_argument("--inference-mode", nargs="+", default=["1"])
+    parser.add_argument("--channels-last", nargs="+", default=["1"])
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores")
+    for workers, threads, mode, channels_last in itertools.product(args.workers, args.threads, args.inference_mode, args.channels_last):
+        throughput, latency_ms = run(workers, threads, args.notes, mode, channels_last)
+        print(f"workers={workers} threads={threads:<4} inference_mode={mode} channels_last={channels_last} "
+              f"throughput={throughput:5.2f} notes/s  latency={latency_ms:7.1f} ms/note")
+
+
+if __name__ == "__main__":
+    main()
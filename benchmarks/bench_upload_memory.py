@@ -0,0 +1,73 @@
+"""
+Memory per request for large uploads: peak Python/numpy allocations (tracemalloc)
+while the API receives a JPEG photo and analyzes it with one cheap module. The request
+body is built before measuring, as if it came off the socket. With --upload-only the
+request names an unknown denomination, so it stops right after the upload is read.
+Endpoint `raw` posts the JPEG as a bare `image/jpeg` body to /analyze instead of a form.
+
+Usage: python benchmarks/bench_upload_memory.py [--megapixels 12 24] [--endpoint /analyze /analyze/batch raw] [--upload-only]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+os.environ.setdefault("FORENSIC_RESULT_CACHE", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from werkzeug.test import EnvironBuilder
+
+from server import app
+from bench_roi import make_photo
+
+
+def measure(endpoint, jpeg, upload_only=False):
+    options = {"modules": "lines", "visuals": "none"}
+    if upload_only:
+        options["denomination"] = "upload-only"
+    if endpoint == "raw":
+        environ = EnvironBuilder(path="/analyze", method="POST", query_string=options, data=jpeg, content_type="image/jpeg").get_environ()
+    else:
+        field = "files" if endpoint.endswith("batch") else "file"
+        data = dict(options, **{field: (io.BytesIO(jpeg), "note.jpg")})
+        environ = EnvironBuilder(path=endpoint, method="POST", data=data).get_environ()
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(status)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    b"".join(app.wsgi_app(environ, start_response))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return statuses[0], peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[12, 24])
+    parser.add_argument("--endpoint", nargs="+", default=["/analyze", "/analyze/batch", "raw"])
+    parser.add_argument("--quality", type=int, default=95)
+    parser.add_argument("--upload-only", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for megapixels in args.megapixels:
+        jpeg = cv2.imencode(".jpg", make_photo(megapixels, rng), [cv2.IMWRITE_JPEG_QUALITY, args.quality])[1].tobytes()
+        for endpoint in args.endpoint:
+            measure(endpoint, jpeg, args.upload_only)  # Warm-up: model, pools and import-time allocations
+            status, peak, elapsed = measure(endpoint, jpeg, args.upload_only)
+            upload_mb = len(jpeg) / 2**20
+            print(f"{megapixels:4g} MP upload={upload_mb:5.1f} MB {endpoint:<15} status={status.split()[0]} "
+                  f"peak={peak / 2**20:6.1f} MB ({peak / len(jpeg):.2f}x upload)  time={elapsed * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
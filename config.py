@@ -0,0 +1,125 @@
+import os
+
+# --- Runtime Configuration (override via environment) ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Checkpoint written by train_ai.py (.pth or .safetensors).
+MODEL_PATH = os.environ.get("FORENSIC_MODEL_PATH", os.path.join(BASE_DIR, "currency_forensic_model.pth"))
+# Inference backend: empty = pick from the file name (.pth/.safetensors eager, .ts TorchScript, .onnx ONNX Runtime)
+MODEL_BACKEND = os.environ.get("FORENSIC_MODEL_BACKEND", "")
+
+# Threads: the cores are split between server worker processes (WEB_CONCURRENCY, as read by gunicorn)
+# so several workers per box do not oversubscribe the CPU. 0 for the inter-op pool keeps torch's default.
+SERVER_WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+CORES_PER_WORKER = max(1, (os.cpu_count() or 1) // SERVER_WORKERS)
+# Request threads per gunicorn worker (gthread); concurrent requests share the worker's micro-batcher.
+WORKER_THREADS = int(os.environ.get("FORENSIC_WORKER_THREADS", "4"))
+TORCH_THREADS = int(os.environ.get("FORENSIC_TORCH_THREADS", str(CORES_PER_WORKER)))
+TORCH_INTEROP_THREADS = int(os.environ.get("FORENSIC_TORCH_INTEROP_THREADS", "1" if SERVER_WORKERS > 1 else "0"))
+CV_THREADS = int(os.environ.get("FORENSIC_CV_THREADS", str(CORES_PER_WORKER)))
+# torch.inference_mode instead of no_grad, and channels-last activations for the convolutions.
+INFERENCE_MODE = os.environ.get("FORENSIC_INFERENCE_MODE", "1") == "1"
+CHANNELS_LAST = os.environ.get("FORENSIC_CHANNELS_LAST", "1") == "1"
+
+# Largest number of notes pushed through CurrencyForensicNet in one forward pass.
+MAX_BATCH_SIZE = int(os.environ.get("FORENSIC_MAX_BATCH_SIZE", "16"))
+
+# Dynamic micro-batching of concurrent single-note requests.
+MICRO_BATCHING = os.environ.get("FORENSIC_MICRO_BATCHING", "1") == "1"
+MICRO_BATCH_MAX_SIZE = int(os.environ.get("FORENSIC_MICRO_BATCH_MAX_SIZE", str(MAX_BATCH_SIZE)))
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get("FORENSIC_MICRO_BATCH_MAX_WAIT_MS", "5"))
+
+# Thread pool that runs independent forensic modules concurrently.
+MODULE_WORKERS = int(os.environ.get("FORENSIC_MODULE_WORKERS", str(min(8, (os.cpu_count() or 1) + 4))))
+# Per-module timeouts in seconds; a module that overruns is reported and scored as failed.
+MODULE_TIMEOUT_S = float(os.environ.get("FORENSIC_MODULE_TIMEOUT_S", "30"))
+OCR_TIMEOUT_S = float(os.environ.get("FORENSIC_OCR_TIMEOUT_S", "10"))
+# Timeouts count from when a module starts running; one still waiting for a pool thread after this long
+# (e.g. behind a large batch) is cancelled and reported as timed out.
+MODULE_QUEUE_TIMEOUT_S = float(os.environ.get("FORENSIC_MODULE_QUEUE_TIMEOUT_S", "120"))
+
+# Forensic modules run when a caller does not choose (comma-separated names; empty = all registered).
+DEFAULT_MODULES = [m.strip() for m in os.environ.get("FORENSIC_DEFAULT_MODULES", "").split(",") if m.strip()]
+
+# Early-exit cascade: modules run cheapest first and the rest are skipped once the score bounds decide the
+# verdict. Set to 0 (or pass full_analysis) to always run every selected module
+EARLY_EXIT = os.environ.get("FORENSIC_EARLY_EXIT", "1") == "1"
+
+# Visuals: 'none', 'thumbnails' or 'full' in API responses; rendered lazily from a short-lived store.
+DEFAULT_VISUALS = os.environ.get("FORENSIC_DEFAULT_VISUALS", "full")
+RESPONSE_VISUALS = ["original", "ai_attention", "reconstruction", "cv_features"]
+THUMBNAIL_SIZE = int(os.environ.get("FORENSIC_THUMBNAIL_SIZE", "256"))
+VISUAL_CACHE_SIZE = int(os.environ.get("FORENSIC_VISUAL_CACHE_SIZE", "16"))
+VISUAL_CACHE_TTL_S = float(os.environ.get("FORENSIC_VISUAL_CACHE_TTL_S", "120"))
+# JPEG encoding of visuals; VISUAL_MAX_SIDE = 0 keeps full resolution.
+JPEG_QUALITY = int(os.environ.get("FORENSIC_JPEG_QUALITY", "90"))
+VISUAL_MAX_SIDE = int(os.environ.get("FORENSIC_VISUAL_MAX_SIDE", "0"))
+
+# Result cache keyed by image hash + strictness + module set.
+RESULT_CACHE = os.environ.get("FORENSIC_RESULT_CACHE", "1") == "1"
+RESULT_CACHE_SIZE = int(os.environ.get("FORENSIC_RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL_S = float(os.environ.get("FORENSIC_RESULT_CACHE_TTL_S", "3600"))
+# Optional on-disk tier that survives restarts and is shared by every front end (empty = disabled).
+RESULT_CACHE_DIR = os.environ.get("FORENSIC_RESULT_CACHE_DIR", "")
+RESULT_CACHE_DISK_MAX = int(os.environ.get("FORENSIC_RESULT_CACHE_DISK_MAX", "50000"))
+RESULT_CACHE_DISK_TTL_S = float(os.environ.get("FORENSIC_RESULT_CACHE_DISK_TTL_S", str(7 * 24 * 3600)))
+
+# OCR service: 'pool' keeps warm Tesseract engines in worker processes, 'local' keeps one in this process,
+# 'inline' shells out per call.
+OCR_BACKEND = os.environ.get("FORENSIC_OCR_BACKEND", "pool")
+OCR_WORKERS = int(os.environ.get("FORENSIC_OCR_WORKERS", str(CORES_PER_WORKER)))
+OCR_LANG = os.environ.get("FORENSIC_OCR_LANG", "eng")
+
+# Note layout: default denomination ('generic', '1000', '500', '100') and width of the aligned note
+NOTE_LAYOUT = os.environ.get("FORENSIC_NOTE_LAYOUT", "generic")
+NOTE_WIDTH = int(os.environ.get("FORENSIC_NOTE_WIDTH", "1200"))
+
+# Uploads are decoded at 1/2, 1/4 or 1/8 scale while their long side stays above this (0 = always full size)
+DECODE_MIN_SIDE = int(os.environ.get("FORENSIC_DECODE_MIN_SIDE", str(NOTE_WIDTH * 4 // 3)))
+
+# Serving: uploads above this size are rejected with 413; the dev server's debug mode is off unless asked for.
+MAX_REQUEST_MB = float(os.environ.get("FORENSIC_MAX_REQUEST_MB", "32"))
+DEBUG = os.environ.get("FORENSIC_DEBUG", "0") == "1"
+
+# Shared inference service (inference_service.py): when set, the detector sends forward passes to this
+# address ('/path.sock', 'unix:/path.sock' or 'host:port') instead of loading its own model.
+# Idle connections kept per process, and how long a call (or the wait for the service at warm-up) may take
+INFERENCE_ADDRESS = os.environ.get("FORENSIC_INFERENCE_ADDRESS", "")
+INFERENCE_POOL_SIZE = int(os.environ.get("FORENSIC_INFERENCE_POOL_SIZE", "4"))
+INFERENCE_TIMEOUT_S = float(os.environ.get("FORENSIC_INFERENCE_TIMEOUT_S", "30"))
+
+# Reference index of genuine-note embeddings (reference_index.py; scoring is off while the directory holds no index).
+# Notes are scored by their mean cosine distance to the REFERENCE_K nearest genuine notes (IVF lists probed:
+# REFERENCE_NPROBE); that score takes REFERENCE_WEIGHT of the AI module's share, the reconstruction error the rest.
+REFERENCE_INDEX_DIR = os.environ.get("FORENSIC_REFERENCE_INDEX_DIR", os.path.join(BASE_DIR, "reference_index"))
+REFERENCE_DTYPE = os.environ.get("FORENSIC_REFERENCE_DTYPE", "float16")
+REFERENCE_K = int(os.environ.get("FORENSIC_REFERENCE_K", "5"))
+REFERENCE_NPROBE = int(os.environ.get("FORENSIC_REFERENCE_NPROBE", "8"))
+REFERENCE_WEIGHT = float(os.environ.get("FORENSIC_REFERENCE_WEIGHT", "0.5"))
+
+# Startup budget in seconds checked by startup_profile.py / `python server.py --profile-startup` (0 = none)
+STARTUP_BUDGET_S = float(os.environ.get("FORENSIC_STARTUP_BUDGET_S", "0"))
+
+# Metrics: directory shared by the server workers so /metrics sums all of them ('' = this worker only),
+# and a threshold above which an analysis prints its stage timings as one JSON line (0 = off)
+METRICS_DIR = os.environ.get("FORENSIC_METRICS_DIR", "")
+LOG_SLOW_MS = float(os.environ.get("FORENSIC_LOG_SLOW_MS", "0"))
+
+# Async API (/analyze/async): background analysis threads per worker, queue bound, how long finished
+# jobs can be polled, and an optional directory shared by all workers so any of them can answer a poll
+ASYNC_JOB_WORKERS = int(os.environ.get("FORENSIC_ASYNC_JOB_WORKERS", "2"))
+ASYNC_MAX_PENDING = int(os.environ.get("FORENSIC_ASYNC_MAX_PENDING", "32"))
+ASYNC_JOB_TTL_S = float(os.environ.get("FORENSIC_ASYNC_JOB_TTL_S", "600"))
+ASYNC_JOB_DIR = os.environ.get("FORENSIC_ASYNC_JOB_DIR", "")
+
+# Stream mode (stream_analyzer.py): a keyframe needs the note still (mean frame difference in gray levels) for a
+# few frames and a sharpness (Laplacian variance) above the floor and near the best seen for the note.
+# Verdicts fuse the last STREAM_FUSION_WINDOW results per module and are final after STREAM_MIN_KEYFRAMES keyframes.
+STREAM_MAX_MOTION = float(os.environ.get("FORENSIC_STREAM_MAX_MOTION", "4.0"))
+STREAM_STABLE_FRAMES = int(os.environ.get("FORENSIC_STREAM_STABLE_FRAMES", "3"))
+STREAM_MIN_SHARPNESS = float(os.environ.get("FORENSIC_STREAM_MIN_SHARPNESS", "100"))
+STREAM_SHARPNESS_RATIO = float(os.environ.get("FORENSIC_STREAM_SHARPNESS_RATIO", "0.8"))
+STREAM_KEYFRAME_INTERVAL_S = float(os.environ.get("FORENSIC_STREAM_KEYFRAME_INTERVAL_S", "0.5"))
+STREAM_FUSION_WINDOW = int(os.environ.get("FORENSIC_STREAM_FUSION_WINDOW", "15"))
+STREAM_MIN_KEYFRAMES = int(os.environ.get("FORENSIC_STREAM_MIN_KEYFRAMES", "3"))
+STREAM_RESET_FRAMES = int(os.environ.get("FORENSIC_STREAM_RESET_FRAMES", "15"))
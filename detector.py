@@ -1,136 +1,672 @@
 import cv2
 import numpy as np
-import pytesseract
-from PIL import Image
 import base64
+import gc
+import json
+import threading
+import time
+import uuid
+import config
+from batcher import MicroBatcher
+from ttl_cache import TTLCache
+from result_cache import result_cache, make_key
+from note_frame import NoteFrame, as_frame
+from note_layout import get_layout
+from forensic_modules import REGISTRY, COST_CLASSES, register_module, resolve_modules, detect_lines, detect_faces, run_ocr
+from scheduler import run_modules, submit_modules, collect
+from ocr_service import get_ocr_service
+from metrics import metrics, Timings
+from reference_index import reference_index
+
+# OpenCV's own thread pool gets this worker's share of the cores (see config.CV_THREADS)
+cv2.setNumThreads(config.CV_THREADS)
 
 # --- Safe AI Import Mechanism ---
 AI_DISABLED = False
-try:
-    import torch
-    import torch.nn.functional as F
-    from model_arch import CurrencyForensicNet, get_anomaly_score
-    
-    # Initialize the AI Model (Forensic Intelligence)
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    model = CurrencyForensicNet().to(device)
-    model.eval() # Set to evaluation mode
-except (ImportError, OSError, Exception) as e:
-    AI_DISABLED = True
-    print(f"Warning: AI core initialization failed ({type(e).__name__}). Falling back to CV-only mode.")
-    print(f"Details: {e}")
-
-def detect_lines(image):
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    edges = cv2.Canny(gray, 100, 200)
-    lines = cv2.HoughLinesP(edges, 1, np.pi/180, 100, minLineLength=50, maxLineGap=10)
-    line_img = image.copy()
-    count = 0
-    if lines is not None:
-        count = len(lines)
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
-            cv2.line(line_img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-    return line_img, count
-
-def detect_faces(image):
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-    face_img = image.copy()
-    for (x, y, w, h) in faces:
-        cv2.rectangle(face_img, (x, y), (x+w, y+h), (255, 0, 0), 2)
-    return face_img, len(faces)
-
-def run_ocr(image):
+WARM = False  # Model loaded and one forward pass done (see /readyz)
+model = None
+torch = None  # imported on first use (see import_ai_runtime), with the model runtime below
+device = None
+get_dl_score = load_runtime = apply_thread_settings = grad_disabled = None
+_model_lock = threading.Lock()
+_runtime_lock = threading.Lock()
+if config.INFERENCE_ADDRESS:
+    # Forward passes run in the shared inference service: no torch runtime or weights in this process
+    from inference_service import InferenceClient
+    _inference_client = InferenceClient(config.INFERENCE_ADDRESS, config.INFERENCE_POOL_SIZE, config.INFERENCE_TIMEOUT_S)
+
+def import_ai_runtime():
+    """
+    Imports torch and the model runtime the first time the model is needed (warm_up or a
+    first request) rather than when this module is imported: torch alone takes seconds.
+    Returns False, in CV-only mode, when they are unavailable.
+    """
+    global torch, device, get_dl_score, load_runtime, apply_thread_settings, grad_disabled, AI_DISABLED
+    if torch is not None or AI_DISABLED:
+        return not AI_DISABLED
+    with _runtime_lock:
+        if torch is not None or AI_DISABLED:
+            return not AI_DISABLED
+        try:
+            import torch as torch_module
+            from model_arch import get_dl_score
+            from model_runtime import load_runtime, apply_thread_settings, grad_disabled
+
+            apply_thread_settings()
+            device = torch_module.device('cuda' if torch_module.cuda.is_available() else 'cpu')
+            torch = torch_module
+        except (ImportError, OSError, Exception) as e:
+            AI_DISABLED = True
+            print(f"Warning: AI core initialization failed ({type(e).__name__}). Falling back to CV-only mode.")
+            print(f"Details: {e}")
+    return not AI_DISABLED
+
+def local_model():
+    """True when this process runs the model itself (AI enabled and no inference service configured)."""
+    return not AI_DISABLED and not config.INFERENCE_ADDRESS
+
+# --- Model Loading ---
+def load_model(weights_path=None):
+    """
+    Loads the forensic model from `weights_path` (default: config.MODEL_PATH): a state dict
+    for eager PyTorch, or a TorchScript (.ts) / ONNX (.onnx) export from export_model.py.
+    Eager mode falls back to untrained weights if no checkpoint exists.
+    """
+    global model, AI_DISABLED
+    if not local_model() or not import_ai_runtime():
+        return None
+    path = weights_path or config.MODEL_PATH
+    try:
+        model = load_runtime(path, device, config.MODEL_BACKEND or None)
+    except Exception as e:
+        AI_DISABLED = True
+        print(f"Warning: AI model loading failed ({type(e).__name__}). Falling back to CV-only mode.")
+        print(f"Details: {e}")
+    return model
+
+def get_model():
+    if model is None:
+        with _model_lock:
+            if model is None:
+                load_model()
+    return model
+
+def warm_up(weights_path=None, ocr=True):
+    """
+    Loads the model and runs one dummy forward pass so the first real request is not slow.
+    With `ocr`, also starts the OCR worker processes. Returns the time spent in each step, in seconds.
+    """
+    global WARM
+    timings = {}
+    start = time.perf_counter()
+    connected = True
+    with _model_lock:
+        if config.INFERENCE_ADDRESS:
+            connected = _connect_inference_service()
+        elif model is None or weights_path:
+            load_model(weights_path)
+    timings["load_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if local_model():
+        run_ai_batch([NoteFrame(np.zeros((512, 512, 3), dtype=np.uint8))])
+    timings["warmup_s"] = time.perf_counter() - start
+    WARM = connected
+
+    timings["ocr_warmup_s"] = _warm_up_ocr() if ocr else 0.0
+    return timings
+
+def _connect_inference_service():
+    # The service may still be loading its model; CV-only there means CV-only here (until a reply says otherwise)
+    global AI_DISABLED
+    try:
+        status = _inference_client.wait_ready(config.INFERENCE_TIMEOUT_S)
+        AI_DISABLED = status["ai_disabled"]
+        print(f"Using inference service at {config.INFERENCE_ADDRESS} (pid {status['pid']}, backend {status['backend']})")
+        return True
+    except OSError as e:
+        print(f"AI Warning: inference service at {config.INFERENCE_ADDRESS} unreachable ({e}). Retrying per request.")
+        return False
+
+def _warm_up_ocr():
+    # Start the OCR worker processes (and their Tesseract engines)
+    start = time.perf_counter()
     try:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
-        text = pytesseract.image_to_string(thresh)
-        return text.strip()
+        get_ocr_service().warm_up()
     except Exception as e:
-        print(f"OCR Error: {e}")
-        return ""
+        print(f"OCR Warning: warm-up failed ({e})")
+    return time.perf_counter() - start
+
+# --- Pre-fork Serving (gunicorn --preload) ---
+def preload(weights_path=None):
+    """
+    Loads and warms the model in a parent process that forks workers afterwards, so
+    the weights are shared copy-on-write. Warm-up runs single-threaded: thread pools
+    started before fork do not survive into the workers, which size their own in init_worker().
+    The OCR pool is started per worker for the same reason.
+    """
+    cv2.setNumThreads(0)
+    if local_model() and import_ai_runtime():
+        torch.set_num_threads(1)
+    timings = warm_up(weights_path, ocr=False)
+    # Keep preloaded objects out of the collector so it does not dirty the shared pages
+    gc.freeze()
+    return timings
+
+def init_worker():
+    """Per-worker setup after fork: thread pools sized from config and the OCR engines."""
+    cv2.setNumThreads(config.CV_THREADS)
+    if local_model() and import_ai_runtime():
+        apply_thread_settings()
+    if WARM:
+        return {"ocr_warmup_s": _warm_up_ocr()}
+    return warm_up()
 
 def preprocess_for_ai(image):
-    # Resize and normalize for Deep Learning Model
-    img_resized = cv2.resize(image, (512, 512))
-    img_rgb = cv2.cvtColor(img_resized, cv2.COLOR_BGR2RGB)
-    tensor = torch.from_numpy(img_rgb).permute(2, 0, 1).float() / 255.0
-    return tensor.unsqueeze(0).to(device)
+    # Resize and normalize for Deep Learning Model (memoized on the frame)
+    return as_frame(image).tensor((512, 512)).to(device)
+
+def preprocess_batch_for_ai(images):
+    # Stack several notes into a single NCHW tensor
+    return torch.cat([preprocess_for_ai(img) for img in images], dim=0)
 
-def analyze_currency_elite(image_bytes, strictness=12):
+def decode_image(image_bytes, denomination=None):
+    """Decodes an upload into a NoteFrame (None if invalid). NoteFrames pass through untouched."""
+    if isinstance(image_bytes, NoteFrame):
+        return image_bytes
+    return NoteFrame.from_bytes(image_bytes, denomination)
+
+def _blank_ai_result():
+    # Stand-in when the AI core could not score the note (model missing, AI error, inference service down)
+    return {
+        "anomaly_score": 0.0,
+        "dl_score": 0.0,
+        "attention": np.zeros((64, 64), dtype=np.uint8),
+        "reconstruction": np.zeros((512, 512, 3), dtype=np.uint8),
+        "embedding": None,
+        "reference_distance": None,
+        "reference_score": None,
+        "passed": False,
+        "fallback": True,
+    }
+
+def ai_score(dl_score, reference_score=None):
+    """AI score (0-10): the reconstruction score, blended with the reference index k-NN score when there is one."""
+    if reference_score is None:
+        return dl_score
+    return (1 - config.REFERENCE_WEIGHT) * dl_score + config.REFERENCE_WEIGHT * reference_score
+
+def score_reference(embeddings):
+    """(k-NN distance, score) per note from the genuine reference index; None without one, or when it cannot be read."""
+    if embeddings is None:
+        return None
+    try:
+        return reference_index.score(embeddings)
+    except (OSError, ValueError, LookupError) as e:
+        print(f"Reference Index Warning: scoring skipped ({e})")
+        return None
+
+def run_ai_batch(images, max_batch_size=None):
     """
-    Elite Forensic Analysis: Hybrid CV + Deep Learning
+    Runs the forensic autoencoder over a list of decoded notes (NoteFrames or BGR arrays).
+    Notes are processed in chunks of at most `max_batch_size` per forward pass.
     """
     global AI_DISABLED
-    # 1. Decode & Load Image
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    if image is None: return None, "Invalid image"
+    if config.INFERENCE_ADDRESS:
+        # The service decides per call: it may have recovered (or lost) its model since the last one
+        return run_remote_ai_batch(images, max_batch_size)
+    if AI_DISABLED:
+        return [_blank_ai_result() for _ in images]
+    if not import_ai_runtime():
+        return [_blank_ai_result() for _ in images]
 
-    # 2. Deep Learning Anomaly Detection
-    if not AI_DISABLED:
-        try:
-            with torch.no_grad():
-                input_tensor = preprocess_for_ai(image)
-                reconstructed, latent_space = model(input_tensor)
-                
-                # Calculate Anomaly Score (Reconstruction Error)
-                anomaly_score = get_anomaly_score(input_tensor, reconstructed)
-                
-                # Simulate Attention Map
-                attention_map = latent_space.mean(dim=1).squeeze().cpu().numpy()
-                attention_map = (attention_map - attention_map.min()) / (attention_map.max() - attention_map.min() + 1e-8)
-                attention_map = cv2.resize((attention_map * 255).astype(np.uint8), (512, 512))
-                heatmap = cv2.applyColorMap(attention_map, cv2.COLORMAP_JET)
-                recon_img = cv2.cvtColor((reconstructed.squeeze().permute(1,2,0).cpu().numpy() * 255).astype(np.uint8), cv2.COLOR_RGB2BGR)
-                dl_score = max(0, 10 - (anomaly_score * 100))
-        except Exception as e:
-            AI_DISABLED = True
-            print(f"AI Error: {e}")
-            anomaly_score, dl_score = 0.0, 0.0
-            heatmap = np.zeros((512, 512, 3), dtype=np.uint8)
-            recon_img = np.zeros((512, 512, 3), dtype=np.uint8)
-    else:
-        anomaly_score, dl_score = 0.0, 0.0
-        heatmap = np.zeros((512, 512, 3), dtype=np.uint8)
-        recon_img = np.zeros((512, 512, 3), dtype=np.uint8)
-
-    # 3. Structural CV Checks (Legacy Modules)
-    line_img, line_count = detect_lines(image)
-    face_img, face_count = detect_faces(image)
-    ocr_text = run_ocr(image)
-
-    # 4. Scoring Fusion
-    # DL Score: Lower anomaly is better. Scale 0-10.
-    
-    cv_score = (4 if face_count > 0 else 0) + (4 if line_count > 5 else 0) + (2 if len(ocr_text) > 5 else 0)
-    
-    total_score = (dl_score * 0.6) + (cv_score * 1.0) # Weighted sum
-    is_real = total_score >= (strictness / 2) # Normalizing threshold
-
-    def to_base64(img):
-        _, buffer = cv2.imencode('.jpg', img)
-        return base64.b64encode(buffer).decode('utf-8')
+    max_batch_size = max_batch_size or config.MAX_BATCH_SIZE
+    outputs = []
+    try:
+        with grad_disabled():
+            for start in range(0, len(images), max_batch_size):
+                # Stage times are per forward pass; every note in the chunk reports the same ones
+                timings = Timings()
+                with timings.stage("ai.preprocess"):
+                    input_tensor = preprocess_batch_for_ai(images[start:start + max_batch_size])
+                # Anomaly Score (Reconstruction Error) and Attention Map (latent resolution, colorized only when rendered) per note
+                with timings.stage("ai.forward"):
+                    anomaly_scores, attention_maps, recon_batch, embeddings = get_model()(input_tensor)
+                # Distance to the nearest genuine notes, one vectorized query for the whole chunk
+                with timings.stage("ai.reference"):
+                    reference = score_reference(embeddings)
+                with timings.stage("ai.postprocess"):
+                    chunk = []
+                    for i, (anomaly_score, attention_map, recon) in enumerate(zip(anomaly_scores, attention_maps, recon_batch)):
+                        anomaly_score = float(anomaly_score)
+                        dl_score = get_dl_score(anomaly_score)
+                        reference_distance, reference_score = reference[i] if reference else (None, None)
+                        chunk.append({
+                            "anomaly_score": anomaly_score,
+                            "dl_score": dl_score,
+                            "attention": (attention_map * 255).astype(np.uint8),
+                            "reconstruction": recon,  # RGB
+                            "embedding": embeddings[i] if embeddings is not None else None,
+                            "reference_distance": reference_distance,
+                            "reference_score": reference_score,
+                            "passed": ai_score(dl_score, reference_score) > 5,
+                        })
+                outputs.extend(dict(output, timings=timings.stages) for output in chunk)
+    except Exception as e:
+        AI_DISABLED = True
+        print(f"AI Error: {e}")
+        return [_blank_ai_result() for _ in images]
+    return outputs
+
+def run_remote_ai_batch(images, max_batch_size=None):
+    """run_ai_batch through the shared inference service; notes score without the AI core while it is down."""
+    global AI_DISABLED
+    try:
+        outputs = _inference_client.infer(images, max_batch_size)
+        AI_DISABLED = _inference_client.ai_disabled
+        return outputs
+    except (OSError, RuntimeError) as e:
+        print(f"AI Warning: inference service call failed ({e}).")
+        metrics.inc("forensic_inference_errors_total")
+        return [_blank_ai_result() for _ in images]
+
+_ai_batcher = None
+_ai_batcher_lock = threading.Lock()
+
+def get_ai_batcher():
+    """Shared micro-batcher that funnels concurrent single-note requests into one forward pass."""
+    global _ai_batcher
+    with _ai_batcher_lock:
+        if _ai_batcher is None:
+            _ai_batcher = MicroBatcher(run_ai_batch, config.MICRO_BATCH_MAX_SIZE, config.MICRO_BATCH_MAX_WAIT_MS)
+    return _ai_batcher
+
+def run_ai(image):
+    if config.MICRO_BATCHING and (config.INFERENCE_ADDRESS or not AI_DISABLED):
+        return get_ai_batcher()(image)
+    return run_ai_batch([image], max_batch_size=1)[0]
+
+def render_attention(frame, ai):
+    attention_map = cv2.resize(ai["attention"], (512, 512))
+    return cv2.applyColorMap(attention_map, cv2.COLORMAP_JET)
+
+def render_reconstruction(frame, ai):
+    return cv2.cvtColor(ai["reconstruction"], cv2.COLOR_RGB2BGR)
+
+# DL Score: Lower anomaly is better. Scale 0-10 (with the reference index score blended in), weighted 0.6 in the fused score.
+register_module("ai", "Forensic Anomaly", inputs=("tensor",), cost="expensive",
+                outputs=("anomaly_score", "dl_score", "reference_distance", "reference_score"),
+                weight=6, default=_blank_ai_result(), scorer=lambda out: ai_score(out["dl_score"], out.get("reference_score")) * 0.6,
+                visuals={"ai_attention": render_attention, "reconstruction": render_reconstruction})(run_ai)
+
+# --- Module Scheduling ---
+def module_tasks(frame, names, timings=None):
+    """Selected registry modules for one note, as independent zero-argument tasks (timed into `timings`)."""
+    if timings is None:
+        return {name: (lambda module=REGISTRY[name]: module.run(frame)) for name in names}
+    def timed(module):
+        with timings.stage(f"module:{module.name}"):
+            return module.run(frame)
+    return {name: (lambda module=REGISTRY[name]: timed(module)) for name in names}
+
+def module_defaults(names):
+    # Fallbacks used when a module times out or fails
+    return {name: REGISTRY[name].default for name in names}
+
+def module_timeouts(names):
+    return {name: REGISTRY[name].timeout for name in names if REGISTRY[name].timeout}
 
+def evaluate_modules(frame, modules=None, precomputed=None, timings=None):
+    """
+    Runs the selected forensic modules concurrently on one NoteFrame.
+    Modules that are not selected are never executed. `precomputed` supplies
+    outputs obtained elsewhere (e.g. a batched AI pass). Returns (outputs, timed_out).
+    """
+    names = resolve_modules(modules)
+    precomputed = precomputed or {}
+    tasks = module_tasks(frame, [name for name in names if name not in precomputed], timings)
+    outputs, timed_out = run_modules(tasks, module_defaults(names), module_timeouts(names))
+    outputs.update(precomputed)
+    return {name: outputs[name] for name in names}, timed_out
+
+def verdict_threshold(strictness):
+    return strictness / 2  # Normalizing threshold
+
+def score_outputs(outputs, strictness=12):
+    """Scoring Fusion: weighted sum of module contributions against the strictness threshold."""
+    total_score = sum(REGISTRY[name].score(output) for name, output in outputs.items())
+    is_real = total_score >= verdict_threshold(strictness)
+    return total_score, is_real
+
+# --- Early-Exit Cascade ---
+def cost_stages(names):
+    """Selected modules grouped by cost class, cheapest stage first."""
+    stages = [[name for name in names if REGISTRY[name].cost == cost] for cost in COST_CLASSES]
+    return [stage for stage in stages if stage]
+
+def score_bounds(outputs, pending):
+    """(lower, upper) bounds on the fused score from finished `outputs` and the modules still `pending`."""
+    scored = sum(REGISTRY[name].score(output) for name, output in outputs.items())
+    return scored, scored + sum(REGISTRY[name].max_score for name in pending)
+
+def verdict_decided(outputs, pending, strictness):
+    """True when no result of the `pending` modules can flip the verdict any more."""
+    lower, upper = score_bounds(outputs, pending)
+    threshold = verdict_threshold(strictness)
+    return lower >= threshold or upper < threshold
+
+def evaluate_cascade(frame, modules=None, strictness=12, early_exit=True, timings=None):
+    """
+    Runs the selected modules one cost stage at a time (cheap, medium, expensive), each
+    stage concurrently. Before a stage starts, the score bounds are checked: once the verdict
+    cannot change, the remaining stages are skipped. With `early_exit=False` every module runs
+    in a single stage, as in evaluate_modules. Returns (outputs, timed_out, skipped).
+    """
+    names = resolve_modules(modules)
+    stages = cost_stages(names) if early_exit else [names]
+    outputs, timed_out = {}, []
+    skipped = []
+    for i, stage in enumerate(stages):
+        pending = [name for later in stages[i:] for name in later]
+        if early_exit and verdict_decided(outputs, pending, strictness):
+            skipped = pending
+            break
+        stage_outputs, stage_timed_out = evaluate_modules(frame, stage, timings=timings)
+        outputs.update(stage_outputs)
+        timed_out += stage_timed_out
+    return {name: outputs[name] for name in names if name in outputs}, timed_out, skipped
+
+# --- Visuals (rendered lazily, on request) ---
+VISUAL_MODES = ("none", "thumbnails", "full")
+
+# Recent analyses kept briefly so visuals can be fetched later by result ID
+visual_store = TTLCache(config.VISUAL_CACHE_SIZE, config.VISUAL_CACHE_TTL_S)
+
+def available_visuals(outputs):
+    names = ["original"]
+    for name in outputs:
+        names.extend(REGISTRY[name].visuals)
+    return names
+
+def render_visual(frame, outputs, name):
+    """Draws one named visual for an analyzed note. Returns None if its module did not run."""
+    if name == "original":
+        return frame.image
+    for module_name, output in outputs.items():
+        render = REGISTRY[module_name].visuals.get(name)
+        if render is not None:
+            return render(frame, output)
+    # Legacy fallback: cv_features shows the plain note when line detection did not run
+    return frame.image if name == "cv_features" else None
+
+def fit_within(img, max_side):
+    h, w = img.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1:
+        return img
+    return cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+def encode_jpeg(img, quality=None, max_side=None):
+    """JPEG-encodes an image straight into a buffer, downscaling first if `max_side` is set."""
+    quality = config.JPEG_QUALITY if quality is None else quality
+    max_side = config.VISUAL_MAX_SIDE if max_side is None else max_side
+    if max_side:
+        img = fit_within(img, max_side)
+    _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    return buffer
+
+def visual_jpeg(frame, outputs, name, quality=None, max_side=None):
+    """Encoded JPEG bytes for one visual, or None if its module did not run."""
+    img = render_visual(frame, outputs, name)
+    return None if img is None else encode_jpeg(img, quality, max_side).tobytes()
+
+def encode_visuals(frame, outputs, mode="full", names=None, quality=None):
+    """Renders and base64-encodes the requested visuals ('thumbnails' are downscaled first)."""
+    if mode not in VISUAL_MODES:
+        raise ValueError(f"Unknown visuals mode '{mode}' (expected one of {', '.join(VISUAL_MODES)})")
+    if mode == "none":
+        return {}
+
+    max_side = config.THUMBNAIL_SIZE if mode == "thumbnails" else None
+    visuals = {}
+    for name in names or config.RESPONSE_VISUALS:
+        img = render_visual(frame, outputs, name)
+        if img is None:
+            continue
+        visuals[name] = base64.b64encode(encode_jpeg(img, quality, max_side)).decode('utf-8')
+    return visuals
+
+def build_results(frame, outputs, strictness=12, timed_out=(), visuals=None, timings=None, skipped=()):
+    """
+    Fuses the module outputs of one NoteFrame into the API response.
+    The analysis is stored under `result_id` so its visuals can be fetched later.
+    `skipped` lists modules the early-exit cascade did not run; the score then
+    covers the modules that ran, and `score_bounds` the range the skipped ones allowed.
+    A skipped AI module, or one that fell back without a forward pass, reports null
+    `anomaly_score` and `ai_confidence` (and `ai_active` false).
+    """
+    timings = timings or Timings()
+    ai = outputs.get("ai", _blank_ai_result())
+    anomaly_score, dl_score = ai["anomaly_score"], ai["dl_score"]
+    no_ai_score = "ai" in skipped or ("ai" in outputs and ai.get("fallback"))
+    total_score, is_real = score_outputs(outputs, strictness)
+
+    features = []
+    if "ai" in outputs:
+        if ai.get("fallback"):
+            # No forward pass: an outage is not an anomaly
+            features.append({"name": "Forensic Anomaly", "status": "INITIALIZING" if AI_DISABLED else "UNAVAILABLE", "val": "n/a"})
+        else:
+            features.append({"name": "Forensic Anomaly", "status": "OK" if dl_score > 5 else "HIGH", "val": f"{round(anomaly_score, 4)}"})
+        if ai.get("reference_score") is not None:
+            features.append({"name": "Genuine Reference", "status": "PASS" if ai["reference_score"] > 5 else "FAIL", "val": f"{round(ai['reference_distance'], 4)}"})
+    for name, output in outputs.items():
+        module = REGISTRY[name]
+        if name == "ai" or not module.outputs:
+            continue
+        features.append({"name": module.label, "status": "PASS" if output.get("passed") else "FAIL", "val": str(output.get(module.outputs[0]))[:40]})
+
+    result_id = uuid.uuid4().hex
+    visual_store.put(result_id, (frame, outputs))
+
+    with timings.stage("visuals"):
+        encoded = encode_visuals(frame, outputs, visuals or config.DEFAULT_VISUALS)
     results = {
         "is_real": bool(is_real),
         "score": round(total_score, 1),
-        "anomaly_score": round(anomaly_score, 4),
-        "ai_confidence": round(dl_score * 10, 1),
-        "ai_active": not AI_DISABLED,
-        "features": [
-            {"name": "Forensic Anomaly", "status": "OK" if dl_score > 5 else ("INITIALIZING" if AI_DISABLED else "HIGH"), "val": f"{round(anomaly_score, 4)}"},
-            {"name": "Portrait Recognition", "status": "PASS" if face_count > 0 else "FAIL", "val": f"{face_count}"},
-            {"name": "Structural Grid", "status": "PASS" if line_count > 5 else "FAIL", "val": f"{line_count}"}
-        ],
-        "visuals": {
-            "original": to_base64(image),
-            "ai_attention": to_base64(heatmap),
-            "reconstruction": to_base64(recon_img),
-            "cv_features": to_base64(line_img)
-        }
+        "anomaly_score": None if no_ai_score else round(anomaly_score, 4),
+        "ai_confidence": None if no_ai_score else round(dl_score * 10, 1),
+        "ai_active": "ai" in outputs and not ai.get("fallback"),
+        "features": features,
+        "modules": {name: REGISTRY[name].summary(output) for name, output in outputs.items()},
+        "result_id": result_id,
+        "visuals": encoded,
+        "timed_out_modules": list(timed_out),
+        "skipped_modules": list(skipped),
+        "score_bounds": [round(bound, 1) for bound in score_bounds(outputs, skipped)],
+        "cached": False
     }
 
+    return results
+
+# --- Result Cache ---
+def cache_key(image_bytes, strictness, modules, denomination=None, early_exit=False):
+    """Cache key for raw upload bytes; None when caching is off or the input is already decoded."""
+    if not config.RESULT_CACHE or isinstance(image_bytes, NoteFrame):
+        return None
+    # Adding genuine notes to the reference index changes AI scores, so it invalidates cached verdicts
+    reference = reference_index.generation() if "ai" in modules else ""
+    return make_key(image_bytes, strictness, modules, denomination or config.NOTE_LAYOUT, early_exit, reference)
+
+def cached_results(key, visuals=None):
+    """
+    Returns a cached response for `key`, or None on a miss. The verdict is always served;
+    its images only while the decoded note is still in the visual store (otherwise
+    `visuals` is empty and `result_id` None, as rendering them would need a full reanalysis).
+    """
+    if key is None:
+        return None
+    cached = result_cache.get(key)
+    if cached is None:
+        return None
+    stored = visual_store.get(cached["result_id"])
+    results = dict(cached, cached=True)
+    results["result_id"] = cached["result_id"] if stored is not None else None
+    results["visuals"] = encode_visuals(stored[0], stored[1], visuals or config.DEFAULT_VISUALS) if stored is not None else {}
+    return results
+
+def is_degraded(outputs):
+    """True when a module timed out, failed or (AI) scored without a forward pass: a verdict not worth reusing."""
+    return any(output.get("fallback") for output in outputs.values())
+
+def store_results(key, results, outputs):
+    # Timed-out, failed and fallback modules are transient failures, not a verdict worth reusing
+    if key is not None and not results["timed_out_modules"] and not is_degraded(outputs):
+        result_cache.put(key, {k: v for k, v in results.items() if k != "visuals"})
+
+def analyze_currency_elite(image_bytes, strictness=12, modules=None, visuals=None, denomination=None, include_timings=False, full_analysis=False):
+    """
+    Elite Forensic Analysis: Hybrid CV + Deep Learning
+    Accepts raw upload bytes or an already decoded NoteFrame. `modules` selects
+    which registered checks run (default: config.DEFAULT_MODULES / all),
+    `visuals` is one of VISUAL_MODES and `denomination` picks the note layout
+    (default: config.NOTE_LAYOUT). With `include_timings`, the response carries
+    the time spent per stage in milliseconds (always recorded in the metrics).
+    Modules run cheapest first and stop once the verdict is decided (config.EARLY_EXIT);
+    `full_analysis` runs every selected module regardless, e.g. for audits.
+    """
+    start = time.perf_counter()
+    try:
+        modules = resolve_modules(modules)
+        _check_visuals_mode(visuals)
+        _check_denomination(denomination)
+    except ValueError as e:
+        metrics.inc("forensic_analyses_total", outcome="rejected")
+        return None, str(e)
+    timings = Timings()
+    early_exit = config.EARLY_EXIT and not full_analysis
+
+    # 0. Rescanned or duplicate notes skip reanalysis
+    with timings.stage("cache"):
+        key = cache_key(image_bytes, strictness, modules, denomination, early_exit)
+        results = cached_results(key, visuals)
+    if results is not None:
+        record_analysis(timings, start, "cached", results=results, include=include_timings)
+        return results, None
+
+    # 1. Decode & Load Image
+    with timings.stage("decode"):
+        frame = decode_image(image_bytes, denomination)
+    if frame is None:
+        record_analysis(timings, start, "invalid_image")
+        return None, "Invalid image"
+
+    # 2. Structural CV Checks + Deep Learning Anomaly Detection, cheapest stage first, each stage concurrently
+    outputs, timed_out, skipped = evaluate_cascade(frame, modules, strictness, early_exit, timings)
+
+    results = build_results(frame, outputs, strictness, timed_out, visuals, timings, skipped)
+    store_results(key, results, outputs)
+    record_analysis(timings, start, "analyzed", outputs, timed_out, results, include_timings, skipped)
     return results, None
+
+def record_analysis(timings, start, outcome, outputs=None, timed_out=(), results=None, include=False, skipped=()):
+    """Feeds one analysis into the metrics and, if asked, adds its stage times (ms) to the response."""
+    if outputs and "ai" in outputs:
+        if AI_DISABLED:
+            metrics.inc("forensic_ai_fallbacks_total")
+        # Forward-pass stages are shared by every note in the batch
+        for stage, seconds in outputs["ai"].get("timings", {}).items():
+            timings.add(stage, seconds)
+    total = time.perf_counter() - start
+    metrics.observe_timings(timings)
+    metrics.observe("forensic_analysis_seconds", total, outcome=outcome)
+    metrics.inc("forensic_analyses_total", outcome=outcome)
+    for name in timed_out:
+        metrics.inc("forensic_module_timeouts_total", module=name)
+    for name in skipped:
+        metrics.inc("forensic_modules_skipped_total", module=name)
+    if outputs is not None:
+        metrics.inc("forensic_modules_executed_total", len(outputs))
+    if config.LOG_SLOW_MS and total * 1000 >= config.LOG_SLOW_MS:
+        print(json.dumps({"event": "slow_analysis", "outcome": outcome, "total_ms": round(total * 1000, 2), "stages_ms": timings.as_ms()}))
+    if results is not None and include:
+        results["timings"] = dict(timings.as_ms(), total=round(total * 1000, 2))
+
+def _check_visuals_mode(visuals):
+    if visuals is not None and visuals not in VISUAL_MODES:
+        raise ValueError(f"Unknown visuals mode '{visuals}' (expected one of {', '.join(VISUAL_MODES)})")
+
+def _check_denomination(denomination):
+    if denomination is not None:
+        get_layout(denomination)
+
+def analyze_currency_batch(list_of_bytes, strictness=12, max_batch_size=None, modules=None, visuals=None, denomination=None, include_timings=False, full_analysis=False):
+    """
+    Batch Forensic Analysis: decodes every note, runs the AI core over them in
+    as few forward passes as possible and returns (results, error) per note in input order.
+    Cost stages run for the whole batch at once; notes whose verdict is decided leave the
+    cascade early, as in analyze_currency_elite (unless `full_analysis`).
+    """
+    start = time.perf_counter()
+    try:
+        modules = resolve_modules(modules)
+        _check_visuals_mode(visuals)
+        _check_denomination(denomination)
+    except ValueError as e:
+        metrics.inc("forensic_analyses_total", len(list_of_bytes), outcome="rejected")
+        return [(None, str(e)) for _ in list_of_bytes]
+    timings = [Timings() for _ in list_of_bytes]
+    early_exit = config.EARLY_EXIT and not full_analysis
+
+    keys, hits = [], {}
+    for i, image_bytes in enumerate(list_of_bytes):
+        with timings[i].stage("cache"):
+            keys.append(cache_key(image_bytes, strictness, modules, denomination, early_exit))
+            results = cached_results(keys[i], visuals)
+        if results is not None:
+            hits[i] = results
+
+    frames = [None] * len(list_of_bytes)
+    for i, image_bytes in enumerate(list_of_bytes):
+        if i not in hits:
+            with timings[i].stage("decode"):
+                frames[i] = decode_image(image_bytes, denomination)
+    active = [i for i, frame in enumerate(frames) if frame is not None]
+    note_outputs = {i: {} for i in active}
+    timed_out = {i: [] for i in active}
+    skipped = {i: [] for i in active}
+
+    stages = cost_stages(modules) if early_exit else [modules]
+    for n, stage in enumerate(stages):
+        pending = [name for later in stages[n:] for name in later]
+        for i in [i for i in active if early_exit and verdict_decided(note_outputs[i], pending, strictness)]:
+            skipped[i] = pending
+            active.remove(i)
+        # CV checks for every remaining note start on the pool while the batched forward pass runs here
+        cv_modules = [name for name in stage if name != "ai"]
+        cv_runs = {i: submit_modules(module_tasks(frames[i], cv_modules, timings[i])) for i in active}
+        ai_results = {}
+        if "ai" in stage:
+            ai_results = dict(zip(active, run_ai_batch([frames[i] for i in active], max_batch_size)))
+        for i in active:
+            note_outputs[i].update(collect(cv_runs[i], module_defaults(cv_modules), module_timeouts(cv_modules)))
+            timed_out[i] += cv_runs[i].timed_out
+            if i in ai_results:
+                note_outputs[i]["ai"] = ai_results[i]
+
+    outputs = []
+    for i, frame in enumerate(frames):
+        if i in hits:
+            record_analysis(timings[i], start, "cached", results=hits[i], include=include_timings)
+            outputs.append((hits[i], None))
+            continue
+        if frame is None:
+            record_analysis(timings[i], start, "invalid_image")
+            outputs.append((None, "Invalid image"))
+            continue
+        ran = {name: note_outputs[i][name] for name in modules if name in note_outputs[i]}
+        results = build_results(frame, ran, strictness, timed_out[i], visuals, timings[i], skipped[i])
+        store_results(keys[i], results, ran)
+        record_analysis(timings[i], start, "analyzed", ran, timed_out[i], results, include_timings, skipped[i])
+        outputs.append((results, None))
+    return outputs
@@ -0,0 +1,159 @@
+"""
+Exports CurrencyForensicNet (with its scoring) for CPU inference and checks that
+the exported model's anomaly scores match the eager fp32 model.
+
+Usage:
+    python export_model.py --format onnx --quantize static --calibration training_data
+    python export_model.py --format torchscript --quantize dynamic
+
+Point FORENSIC_MODEL_PATH at the output (.onnx or .ts) to serve it.
+"""
+import argparse
+import copy
+import inspect
+import os
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+
+import config
+from model_arch import get_dl_score
+from model_runtime import TorchRuntime, build_eager, load_runtime
+
+FORMATS = ("torchscript", "onnx")
+QUANTIZATION = ("none", "dynamic", "static")
+INPUT_SIZE = (512, 512)
+
+
+# --- Calibration / Parity Inputs ---
+def load_samples(folder, count):
+    """Up to `count` notes from `folder`, preprocessed like train_ai.py. Random inputs if the folder is empty."""
+    files = []
+    if folder and os.path.isdir(folder):
+        files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(('.jpg', '.png')))[:count]
+    samples = []
+    for path in files:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        img = cv2.cvtColor(cv2.resize(img, INPUT_SIZE), cv2.COLOR_BGR2RGB)
+        samples.append(torch.from_numpy(img).permute(2, 0, 1).float() / 255.0)
+    if not samples:
+        print(f"Warning: no notes found in '{folder}'. Using random inputs for calibration and parity.")
+        samples = list(torch.rand(count, 3, *INPUT_SIZE, generator=torch.Generator().manual_seed(0)))
+    return samples
+
+
+def batches(samples, batch_size):
+    for start in range(0, len(samples), batch_size):
+        yield torch.stack(samples[start:start + batch_size])
+
+
+# --- PyTorch Quantization (TorchScript export) ---
+def quantize_torch(head, mode, samples):
+    if mode == "dynamic":
+        # Dynamic int8 only covers Linear layers here (the SE blocks); convolutions stay fp32
+        return torch.ao.quantization.quantize_dynamic(head, {nn.Linear}, dtype=torch.qint8)
+    if mode == "static":
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+        example = (samples[0].unsqueeze(0),)
+        # Only the network is quantized; the scoring (MSE, attention normalization) stays fp32
+        prepared = prepare_fx(head.net, get_default_qconfig_mapping("x86"), example)
+        with torch.no_grad():
+            for batch in batches(samples, 4):
+                prepared(batch)
+        head.net = convert_fx(prepared)
+    return head
+
+
+def export_torchscript(head, path, quantize, samples):
+    head = quantize_torch(head, quantize, samples)
+    with torch.no_grad():
+        traced = torch.jit.trace(head, samples[0].unsqueeze(0))
+    traced.save(path)
+
+
+# --- ONNX Export & Quantization ---
+def export_onnx(head, path, quantize, samples):
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_dynamic, quantize_static
+
+    class CalibrationReader(CalibrationDataReader):
+        """Feeds calibration notes to onnxruntime's static quantizer."""
+        def __init__(self):
+            self._samples = iter(samples)
+
+        def get_next(self):
+            sample = next(self._samples, None)
+            return None if sample is None else {"input": sample.unsqueeze(0).numpy()}
+
+    fp32_path = path if quantize == "none" else path + ".fp32.onnx"
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(head, (samples[0].unsqueeze(0),), fp32_path, input_names=["input"],
+                      output_names=["anomaly_score", "attention", "reconstruction", "embedding"],
+                      dynamic_axes={name: {0: "batch"} for name in ("input", "anomaly_score", "attention", "reconstruction", "embedding")},
+                      opset_version=17, **kwargs)
+    if quantize == "dynamic":
+        quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+    elif quantize == "static":
+        quantize_static(fp32_path, path, CalibrationReader(), activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    if fp32_path != path:
+        os.remove(fp32_path)
+
+
+# --- Parity Check ---
+def check_parity(reference, runtime, samples, batch_size=4):
+    """Compares anomaly scores (and the pass/fail verdict they imply) of `runtime` against `reference`."""
+    expected, actual = [], []
+    for batch in batches(samples, batch_size):
+        expected.extend(reference(batch)[0])
+        actual.extend(runtime(batch)[0])
+    expected, actual = np.asarray(expected, dtype=np.float64), np.asarray(actual, dtype=np.float64)
+    diff = np.abs(expected - actual)
+    flips = sum((get_dl_score(e) > 5) != (get_dl_score(a) > 5) for e, a in zip(expected, actual))
+    return {
+        "notes": len(expected),
+        "max_abs_diff": float(diff.max()),
+        "max_rel_diff": float((diff / np.maximum(np.abs(expected), 1e-12)).max()),
+        "max_dl_score_diff": float(max(abs(get_dl_score(e) - get_dl_score(a)) for e, a in zip(expected, actual))),
+        "verdict_flips": int(flips),
+    }
+
+
+def default_output(fmt, quantize):
+    suffix = "" if quantize == "none" else f".int8-{quantize}"
+    return os.path.splitext(config.MODEL_PATH)[0] + suffix + (".onnx" if fmt == "onnx" else ".ts")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default=config.MODEL_PATH)
+    parser.add_argument("--format", choices=FORMATS, default="onnx")
+    parser.add_argument("--quantize", choices=QUANTIZATION, default="none")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--calibration", default="training_data", help="Folder of genuine notes for calibration and parity")
+    parser.add_argument("--samples", type=int, default=16)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        parser.error(f"no forensic weights at '{args.weights}' (train the model first or pass --weights)")
+
+    output = args.output or default_output(args.format, args.quantize)
+    samples = load_samples(args.calibration, args.samples)
+    head = build_eager(args.weights)
+    # Parity reference: an untouched copy of the exact module being exported (static quantization rewrites head.net)
+    reference = TorchRuntime(copy.deepcopy(head), "eager", torch.device("cpu"))
+    if args.format == "onnx":
+        export_onnx(head, output, args.quantize, samples)
+    else:
+        export_torchscript(head, output, args.quantize, samples)
+    print(f"Exported {args.format} ({args.quantize} quantization) to {output}")
+
+    parity = check_parity(reference, load_runtime(output), samples)
+    print("Parity vs eager fp32: " + ", ".join(f"{k}={v:.3g}" if isinstance(v, float) else f"{k}={v}" for k, v in parity.items()))
+
+
+if __name__ == "__main__":
+    main()
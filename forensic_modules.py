@@ -0,0 +1,233 @@
+import cv2
+import numpy as np
+
+import config
+from note_frame import as_frame
+from resources import get_cascade
+from ocr_service import get_ocr_service, PSM_SPARSE
+
+# --- Forensic Module Registry ---
+COST_CLASSES = ("cheap", "medium", "expensive")
+
+
+class ForensicModule:
+    """
+    A registered forensic check.
+    `inputs` names the NoteFrame views it reads, `cost` is one of COST_CLASSES,
+    `outputs` lists the scalar results exposed in API responses, and `weight`
+    is the number of score points it contributes when it passes (a custom `scorer`
+    must stay within [0, weight], which the early-exit cascade relies on). `visuals` maps
+    visual names to `render(frame, output)` functions, called only when an image is requested.
+    """
+    def __init__(self, name, fn, label, inputs, cost, outputs, weight=0, default=None, timeout=None, scorer=None, visuals=None):
+        if cost not in COST_CLASSES:
+            raise ValueError(f"Unknown cost class '{cost}' for module '{name}'")
+        self.name = name
+        self.fn = fn
+        self.label = label
+        self.inputs = tuple(inputs)
+        self.cost = cost
+        self.outputs = tuple(outputs)
+        self.weight = weight
+        self.default = {"passed": False, **(default or {})}
+        self.timeout = timeout
+        self.scorer = scorer
+        self.visuals = dict(visuals or {})
+
+    def run(self, frame):
+        return self.fn(frame)
+
+    def score(self, output):
+        if self.scorer is not None:
+            return self.scorer(output)
+        return self.weight if output.get("passed") else 0
+
+    @property
+    def max_score(self):
+        return float(self.weight)
+
+    def summary(self, output):
+        """JSON-safe view of a module result (scalar outputs only, no images)."""
+        summary = {key: output.get(key) for key in self.outputs}
+        summary["passed"] = bool(output.get("passed"))
+        return summary
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "label": self.label,
+            "inputs": list(self.inputs),
+            "cost": self.cost,
+            "outputs": list(self.outputs),
+            "weight": self.weight,
+            "visuals": list(self.visuals),
+        }
+
+
+REGISTRY = {}
+
+
+def register_module(name, label, inputs, cost, outputs, weight=0, default=None, timeout=None, scorer=None, visuals=None):
+    """Decorator that adds a check `fn(frame) -> dict` to the registry."""
+    def decorator(fn):
+        REGISTRY[name] = ForensicModule(name, fn, label, inputs, cost, outputs, weight, default, timeout, scorer, visuals)
+        return fn
+    return decorator
+
+
+def resolve_modules(names=None):
+    """
+    Validates a module selection. Accepts None (all registered modules), a list,
+    or a comma-separated string. Returns names in registry order.
+    """
+    if names is None:
+        names = config.DEFAULT_MODULES or list(REGISTRY)
+    if isinstance(names, str):
+        names = [n.strip() for n in names.split(",") if n.strip()]
+    unknown = [n for n in names if n not in REGISTRY]
+    if unknown:
+        raise ValueError(f"Unknown forensic module(s): {', '.join(unknown)}")
+    return [n for n in REGISTRY if n in names]
+
+
+# --- Overlay Rendering (only when a visual is requested) ---
+def draw_segments(image, segments, color=(0, 255, 0), thickness=2):
+    overlay = image.copy()
+    for x1, y1, x2, y2 in segments:
+        cv2.line(overlay, (int(x1), int(y1)), (int(x2), int(y2)), color, thickness)
+    return overlay
+
+def draw_boxes(image, boxes, color=(255, 0, 0), thickness=2):
+    overlay = image.copy()
+    for (x, y, w, h) in boxes:
+        cv2.rectangle(overlay, (int(x), int(y)), (int(x+w), int(y+h)), color, thickness)
+    return overlay
+
+def to_aligned(shapes, frame, region, width=None, boxes=False):
+    # Maps segments (x1, y1, x2, y2) or boxes (x, y, w, h) found in a region (cut at `width`) to aligned-note coordinates
+    x, y, _, _ = frame.region_box(region)
+    scale = frame.aligned.shape[1] / (width or frame.aligned.shape[1])
+    offset = (x, y, 0, 0) if boxes else (x, y, x, y)
+    return (shapes * scale).astype(np.int32) + np.array(offset, dtype=np.int32)
+
+
+# --- Scale-Consistent Thresholds ---
+# Pixel thresholds are quoted for a note 1300 px wide and scaled to the width a check runs at.
+# Each module runs at a fixed working width of the aligned note, whatever the upload size.
+REFERENCE_WIDTH = 1300
+REFERENCE_PIXELS = 1300 * 600
+
+def at_scale(value, width):
+    return max(1, int(round(value * width / REFERENCE_WIDTH)))
+
+FACES_WIDTH = 600      # Haar cascade: portraits are large, the cascade is the slowest CV step
+WATERMARK_WIDTH = 600  # Bright-area density is a ratio, resolution barely matters
+OVI_WIDTH = 300        # Hue histogram only needs colors
+
+
+# --- Structural CV Checks (Legacy Modules) ---
+def find_lines(frame):
+    width = frame.shape[1]
+    lines = cv2.HoughLinesP(frame.edges(100, 200), 1, np.pi/180, at_scale(100, width),
+                            minLineLength=at_scale(50, width), maxLineGap=at_scale(10, width))
+    return lines.reshape(-1, 4) if lines is not None else np.empty((0, 4), dtype=np.int32)
+
+def find_faces(frame, note_width=None):
+    face_cascade = get_cascade('haarcascade_frontalface_default.xml')
+    min_side = at_scale(60, note_width or frame.shape[1])
+    faces = face_cascade.detectMultiScale(frame.gray, 1.1, 4, minSize=(min_side, min_side))
+    return np.asarray(faces, dtype=np.int32).reshape(-1, 4)
+
+def detect_lines(image):
+    segments = find_lines(as_frame(image))
+    return draw_segments(as_frame(image).image, segments, (0, 255, 0), 2), len(segments)
+
+def detect_faces(image):
+    faces = find_faces(as_frame(image))
+    return draw_boxes(as_frame(image).image, faces, (255, 0, 0), 2), len(faces)
+
+def run_ocr(image):
+    # OCR failures propagate, so the scheduler records a module error instead of an empty serial
+    frame = as_frame(image)
+    _, thresh = cv2.threshold(frame.gray, 150, 255, cv2.THRESH_BINARY)
+    return get_ocr_service().recognize(thresh, timeout=config.OCR_TIMEOUT_S).strip()
+
+# Modules work on the aligned note (or one of its layout regions), never the full-resolution upload
+@register_module("lines", "Structural Grid", inputs=("aligned",), cost="medium", outputs=("count",), weight=4,
+                 default={"count": 0, "segments": np.empty((0, 4), dtype=np.int32)},
+                 visuals={"cv_features": lambda frame, out: draw_segments(frame.aligned.image, out["segments"], (0, 255, 0), 2),
+                          "edges": lambda frame, out: frame.aligned.edges(100, 200)})
+def lines_module(frame):
+    segments = find_lines(frame.aligned)
+    return {"count": len(segments), "segments": segments, "passed": len(segments) > 5}
+
+@register_module("faces", "Portrait Recognition", inputs=("region:portrait",), cost="medium", outputs=("count",), weight=4,
+                 default={"count": 0, "boxes": np.empty((0, 4), dtype=np.int32)},
+                 visuals={"portrait": lambda frame, out: draw_boxes(frame.aligned.image, out["boxes"], (255, 0, 0), 2)})
+def faces_module(frame):
+    portrait = frame.region("portrait", FACES_WIDTH)
+    boxes = to_aligned(find_faces(portrait, FACES_WIDTH), frame, "portrait", FACES_WIDTH, boxes=True)
+    return {"count": len(boxes), "boxes": boxes, "passed": len(boxes) > 0}
+
+@register_module("ocr", "Serial OCR", inputs=("region:serial",), cost="expensive", outputs=("text",), weight=2,
+                 default={"text": ""}, timeout=config.OCR_TIMEOUT_S)
+def ocr_module(frame):
+    text = run_ocr(frame.region("serial"))
+    return {"text": text, "passed": len(text) > 5}
+
+
+# --- Security Feature Checks ---
+MICROPRINT_KEYWORDS = ["BANGLADESH", "BANK", "TAKA"]
+# Restrict recognition to the letters of the keywords we look for
+MICROPRINT_WHITELIST = "".join(sorted(set("".join(MICROPRINT_KEYWORDS))))
+
+def _watermark_mask(frame):
+    def compute():
+        kernel = at_scale(7, WATERMARK_WIDTH) | 1
+        blur = cv2.GaussianBlur(frame.gray, (kernel, kernel), 0)
+        _, thresh = cv2.threshold(blur, 200, 255, cv2.THRESH_BINARY)
+        return thresh
+    return frame.memo("watermark_mask", compute)
+
+@register_module("watermark", "Watermark", inputs=("region:watermark",), cost="cheap", outputs=("density",), default={"density": 0.0},
+                 visuals={"watermark": lambda frame, out: _watermark_mask(frame.region("watermark", WATERMARK_WIDTH))})
+def analyze_watermark(frame):
+    thresh = _watermark_mask(frame.region("watermark", WATERMARK_WIDTH))
+    density = np.sum(thresh == 255) / thresh.size
+    return {"density": round(float(density), 4), "passed": bool(density > 0.05)}
+
+@register_module("thread", "Security Thread", inputs=("region:thread",), cost="medium", outputs=("segments",),
+                 default={"segments": 0, "lines": np.empty((0, 4), dtype=np.int32)},
+                 visuals={"thread": lambda frame, out: draw_segments(frame.aligned.image, out["lines"], (0, 255, 0), 3)})
+def analyze_security_thread(frame):
+    band, width = frame.region("thread"), frame.aligned.shape[1]
+    lines = cv2.HoughLinesP(band.edges(50, 150), 1, np.pi/180, at_scale(50, width),
+                            minLineLength=at_scale(100, width), maxLineGap=at_scale(20, width))
+    lines = lines.reshape(-1, 4) if lines is not None else np.empty((0, 4), dtype=np.int32)
+    # Keep only near-vertical segments
+    vertical = to_aligned(lines[np.abs(lines[:, 0] - lines[:, 2]) < at_scale(25, width)], frame, "thread")
+    return {"segments": len(vertical), "lines": vertical, "passed": len(vertical) > 0}
+
+# Laplacian variance grows as the image shrinks, so intaglio always runs on the full-width aligned portrait
+@register_module("intaglio", "Intaglio", inputs=("region:portrait",), cost="cheap", outputs=("variance",), default={"variance": 0.0},
+                 visuals={"intaglio": lambda frame, out: cv2.convertScaleAbs(cv2.Laplacian(frame.region("portrait").gray, cv2.CV_64F))})
+def analyze_intaglio(frame):
+    variance = cv2.Laplacian(frame.region("portrait").gray, cv2.CV_64F).var()
+    return {"variance": round(float(variance), 1), "passed": bool(variance > 400)}
+
+@register_module("microprint", "Microprint", inputs=("region:microprint",), cost="expensive", outputs=("text",),
+                 default={"text": ""}, timeout=config.OCR_TIMEOUT_S,
+                 visuals={"microprint": lambda frame, out: frame.region("microprint").gray})
+def analyze_microprint(frame):
+    text = get_ocr_service().recognize(frame.region("microprint").gray, whitelist=MICROPRINT_WHITELIST, psm=PSM_SPARSE, timeout=config.OCR_TIMEOUT_S).upper()
+    found = any(word in text for word in MICROPRINT_KEYWORDS)
+    return {"text": text, "passed": found}
+
+@register_module("ovi", "OVI Color", inputs=("aligned",), cost="cheap", outputs=("variance",), default={"variance": 0.0},
+                 visuals={"ovi": lambda frame, out: frame.aligned.scaled(OVI_WIDTH).hsv})
+def analyze_ovi(frame):
+    hsv = frame.aligned.scaled(OVI_WIDTH).hsv
+    hist = cv2.calcHist([hsv], [0], None, [180], [0, 180])
+    # Express bin counts as if the note had REFERENCE_PIXELS pixels
+    variance = np.var(hist * (REFERENCE_PIXELS / (hsv.shape[0] * hsv.shape[1])))
+    return {"variance": round(float(variance), 1), "passed": bool(variance > 800)}
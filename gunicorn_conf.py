@@ -0,0 +1,48 @@
+"""
+Production serving for the Flask API:
+
+    gunicorn -c gunicorn_conf.py server:app
+
+The master imports the app and warms the model before forking (preload_app), so
+every worker shares the weights copy-on-write. Each worker then sizes its own
+torch/OpenCV thread pools and starts its OCR engines.
+
+Settings: WEB_CONCURRENCY (workers), FORENSIC_WORKER_THREADS (request threads per
+worker), FORENSIC_BIND (default 0.0.0.0:5000), FORENSIC_MAX_REQUEST_MB, FORENSIC_METRICS_DIR.
+"""
+import os
+import tempfile
+
+# Workers write their metrics next to each other so /metrics can sum them; one directory per master
+os.environ.setdefault("FORENSIC_METRICS_DIR", os.path.join(tempfile.gettempdir(), f"forensic-metrics-{os.getpid()}"))
+
+# Not imported as 'config': gunicorn would read that name as its own setting
+import config as settings
+
+bind = os.environ.get("FORENSIC_BIND", "0.0.0.0:5000")
+workers = settings.SERVER_WORKERS
+worker_class = "gthread"
+threads = settings.WORKER_THREADS
+preload_app = True
+
+# A request may wait for module timeouts plus OCR; give it headroom before the worker is recycled
+timeout = int(settings.MODULE_TIMEOUT_S + settings.OCR_TIMEOUT_S + 30)
+graceful_timeout = 30
+
+# Header limits (the body limit is MAX_CONTENT_LENGTH in server.py)
+limit_request_line = 4094
+limit_request_fields = 100
+limit_request_field_size = 8190
+
+
+def when_ready(arbiter):
+    # Runs in the master after the app is imported and before any worker is forked
+    import detector
+    timings = detector.preload()
+    arbiter.log.info("Model preloaded: load %.2fs, warm-up %.2fs", timings["load_s"], timings["warmup_s"])
+
+
+def post_fork(arbiter, worker):
+    import detector
+    timings = detector.init_worker()
+    worker.log.info("Worker %s ready (OCR engines %.2fs)", worker.pid, timings["ocr_warmup_s"])
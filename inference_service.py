@@ -0,0 +1,306 @@
+"""
+Local inference service: one process keeps the warm forensic model and runs the forward
+passes for every front end on the host (gunicorn workers, Streamlit, the bulk scanner),
+so the weights and the torch thread pool exist once instead of once per process.
+
+    python inference_service.py --listen /tmp/forensic-inference.sock
+
+Front ends use it when FORENSIC_INFERENCE_ADDRESS is set to the same address (a UNIX
+socket path, 'unix:/path.sock' or a localhost 'host:port'). Their detector then sends
+each note, resized to the model input, through a pooled InferenceClient instead of
+loading its own model.
+"""
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import config
+
+DEFAULT_ADDRESS = "/tmp/forensic-inference.sock"
+INPUT_SIZE = (512, 512)
+
+# Frame: 8-byte prefix (header length, payload length), JSON header, then the raw array bytes
+_PREFIX = struct.Struct("!II")
+_DTYPES = {"|u1", "<f4"}  # uint8 images and maps, float32 embeddings
+MAX_PAYLOAD = 1 << 30
+
+
+def parse_address(address):
+    """('unix', path) or ('tcp', (host, port)) for an address string."""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    if "/" in address:
+        return "unix", address
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+# --- Wire Format ---
+def send_message(sock, header, arrays=()):
+    arrays = [np.ascontiguousarray(a) for a in arrays]
+    header = dict(header, arrays=[{"shape": a.shape, "dtype": a.dtype.str} for a in arrays])
+    encoded = json.dumps(header).encode()
+    sock.sendall(_PREFIX.pack(len(encoded), sum(a.nbytes for a in arrays)) + encoded)
+    for a in arrays:
+        sock.sendall(a.data.cast("B"))
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("connection closed by peer")
+        received += n
+    return buffer
+
+
+def recv_message(sock):
+    """(header, arrays) of the next message; the arrays are views of one receive buffer, not copies."""
+    header_len, payload_len = _PREFIX.unpack(_recv_exact(sock, _PREFIX.size))
+    if payload_len > MAX_PAYLOAD:
+        raise ConnectionError(f"message too large ({payload_len} bytes)")
+    header = json.loads(_recv_exact(sock, header_len))
+    payload = _recv_exact(sock, payload_len)
+    arrays, offset = [], 0
+    for spec in header.pop("arrays", []):
+        if spec["dtype"] not in _DTYPES:
+            # The whole frame has been read, so the connection can carry on after an error reply
+            raise ValueError(f"unsupported dtype {spec['dtype']}")
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        arrays.append(np.frombuffer(payload, dtype, count, offset).reshape(spec["shape"]))
+        offset += count * dtype.itemsize
+    return header, arrays
+
+
+# --- Server ---
+class _Handler(socketserver.BaseRequestHandler):
+    # One thread per client connection; connections are long-lived and carry many requests
+    def handle(self):
+        import detector
+        while True:
+            error = None
+            try:
+                header, arrays = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            except ValueError as e:
+                error = e  # a complete but malformed frame: the stream is still in sync, so answer it
+            try:
+                if error is not None:
+                    raise error
+                reply, out = _dispatch(detector, header, arrays)
+            except Exception as e:
+                print(f"Inference Service Error: {type(e).__name__}: {e}")
+                reply, out = {"error": f"{type(e).__name__}: {e}"}, []
+            try:
+                send_message(self.request, reply, out)
+            except OSError:
+                return
+
+
+def _dispatch(detector, header, arrays):
+    op = header.get("op")
+    if op == "ping":
+        return {"ai_disabled": detector.AI_DISABLED, "warm": detector.WARM, "pid": os.getpid(),
+                "backend": getattr(detector.model, "backend", None)}, []
+    if op != "infer":
+        raise ValueError(f"unknown op '{op}'")
+    check_infer_request(header, arrays)
+
+    from note_frame import NoteFrame
+    frames = [NoteFrame(image) for image in arrays[0]]
+    if len(frames) == 1:
+        # Single notes from different front ends meet in the micro-batcher and share a forward pass
+        outputs = [detector.run_ai(frames[0])]
+    else:
+        outputs = detector.run_ai_batch(frames, header.get("max_batch_size"))
+    results, out = [], []
+    for output in outputs:
+        results.append({key: output.get(key) for key in ("anomaly_score", "dl_score", "reference_distance", "reference_score", "passed", "fallback")})
+        results[-1]["timings"] = output.get("timings", {})
+        # An empty embedding stands for none (CV-only, or a model exported without embeddings)
+        embedding = output.get("embedding")
+        out += [output["attention"], output["reconstruction"], np.zeros(0, np.float32) if embedding is None else embedding]
+    return {"results": results, "ai_disabled": detector.AI_DISABLED}, out
+
+
+def check_infer_request(header, arrays):
+    """Rejects anything but one uint8 N x 512 x 512 x 3 batch, before it can reach the model."""
+    expected = INPUT_SIZE[::-1] + (3,)
+    if len(arrays) != 1 or arrays[0].dtype != np.uint8 or arrays[0].ndim != 4 or arrays[0].shape[1:] != expected or not len(arrays[0]):
+        got = ", ".join(f"{a.dtype}{list(a.shape)}" for a in arrays) or "nothing"
+        raise ValueError(f"infer expects one uint8 array of shape [N, {expected[0]}, {expected[1]}, 3], got {got}")
+    max_batch_size = header.get("max_batch_size")
+    if max_batch_size is not None and (not isinstance(max_batch_size, int) or max_batch_size < 1):
+        raise ValueError(f"max_batch_size must be a positive integer, got {max_batch_size!r}")
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_server(address):
+    kind, target = parse_address(address)
+    if kind == "tcp":
+        return _TCPServer(target, _Handler)
+    if os.path.exists(target):
+        os.remove(target)  # stale socket from a previous run
+    server = _UnixServer(target, _Handler)
+    os.chmod(target, 0o660)  # front ends of the same user/group only
+    return server
+
+
+# --- Client ---
+class InferenceClient:
+    """
+    Thin client for the inference service. Keeps up to `pool_size` idle connections
+    open so requests do not pay a connect each; concurrent callers beyond that get
+    a short-lived extra connection. Safe to share between threads.
+    """
+    def __init__(self, address, pool_size=4, timeout_s=30.0):
+        self.address = address
+        self.kind, self.target = parse_address(address)
+        self.timeout_s = timeout_s
+        self._idle = queue.LifoQueue(maxsize=max(1, pool_size))
+        self._pid = os.getpid()
+        self.ai_disabled = False  # as reported by the service in its last reply
+
+    def _connect(self):
+        family = socket.AF_UNIX if self.kind == "unix" else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout_s)
+        try:
+            sock.connect(self.target)
+        except OSError:
+            sock.close()
+            raise
+        if self.kind == "tcp":
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @contextmanager
+    def _connection(self, fresh=False):
+        if self._pid != os.getpid():
+            # Connections opened before a fork (gunicorn preload) belong to the parent
+            self._pid = os.getpid()
+            self._idle = queue.LifoQueue(maxsize=self._idle.maxsize)
+        sock = None
+        if not fresh:
+            try:
+                sock = self._idle.get_nowait()
+            except queue.Empty:
+                pass
+        sock = sock or self._connect()
+        try:
+            yield sock
+        except BaseException:
+            sock.close()
+            raise
+        try:
+            self._idle.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+
+    def call(self, header, arrays=()):
+        # A pooled connection may belong to a service that has since restarted: retry once on a new one
+        for attempt in range(2):
+            try:
+                with self._connection(fresh=attempt > 0) as sock:
+                    send_message(sock, header, arrays)
+                    reply, out = recv_message(sock)
+                break
+            except ConnectionError:
+                if attempt:
+                    raise
+        if "error" in reply:
+            raise RuntimeError(f"inference service: {reply['error']}")
+        return reply, out
+
+    def ping(self):
+        reply = self.call({"op": "ping"})[0]
+        self.ai_disabled = reply["ai_disabled"]
+        return reply
+
+    def wait_ready(self, timeout_s):
+        """Pings until the service answers (it may still be loading the model); re-raises after `timeout_s`."""
+        deadline = time.monotonic() + timeout_s
+        while True:
+            try:
+                return self.ping()
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def infer(self, images, max_batch_size=None):
+        """AI results for a list of NoteFrames / BGR arrays, in the same form as detector.run_ai_batch."""
+        from note_frame import as_frame
+        start = time.perf_counter()
+        batch = np.stack([as_frame(image).resized(INPUT_SIZE) for image in images])
+        reply, out = self.call({"op": "infer", "max_batch_size": max_batch_size}, [batch])
+        self.ai_disabled = reply["ai_disabled"]
+        rpc_s = time.perf_counter() - start
+        results = []
+        for i, result in enumerate(reply["results"]):
+            timings = dict(result.pop("timings"), **{"ai.rpc": rpc_s})
+            attention, reconstruction, embedding = out[3 * i:3 * i + 3]
+            results.append(dict(result, attention=attention, reconstruction=reconstruction,
+                                embedding=embedding if embedding.size else None, timings=timings))
+        return results
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listen", default=config.INFERENCE_ADDRESS or DEFAULT_ADDRESS,
+                        help="UNIX socket path or host:port (default: FORENSIC_INFERENCE_ADDRESS or %(default)s)")
+    parser.add_argument("--weights", default=None, help="model weights (default: FORENSIC_MODEL_PATH)")
+    args = parser.parse_args()
+
+    # This process is the service: its own detector must run the model in-process
+    config.INFERENCE_ADDRESS = ""
+    import detector
+    timings = detector.warm_up(args.weights, ocr=False)
+    server = make_server(args.listen)
+    print(f"Inference service on {args.listen} (pid {os.getpid()}): model load {timings['load_s']:.2f}s, "
+          f"warm-up {timings['warmup_s']:.2f}s, AI {'disabled' if detector.AI_DISABLED else 'active'}")
+    # stop.sh sends SIGTERM; exit through the cleanup below so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        kind, target = parse_address(args.listen)
+        if kind == "unix" and os.path.exists(target):
+            os.remove(target)
+
+
+if __name__ == "__main__":
+    main()
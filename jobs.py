@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from ttl_cache import TTLCache
+
+
+class JobStore:
+    """
+    Background analyses for the async API. Submitted callables run on a small pool and
+    their job records ({job_id, status, result, error, timings}) are kept for `ttl_s` seconds.
+    With `disk_dir`, records are also written as JSON files so every server worker
+    sharing the directory can answer a status poll, whichever worker runs the job.
+    """
+    def __init__(self, workers=2, max_pending=32, ttl_s=600.0, disk_dir=""):
+        self.max_pending = max(1, max_pending)
+        self.ttl_s = ttl_s
+        self.disk_dir = disk_dir
+        self.records = TTLCache(max(64, max_pending * 4), ttl_s)
+        self._workers = max(1, workers)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._counters = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def submit(self, fn, *args, **kwargs):
+        """Queues `fn(*args, **kwargs)`, which returns (result, error). Returns the job id, or None when the queue is full."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._counters["rejected"] += 1
+                return None
+            self._pending += 1
+            self._counters["submitted"] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="job")
+            prune = self.disk_dir and self._counters["submitted"] % 100 == 1
+        if prune:
+            self._prune_disk()
+        job_id = uuid.uuid4().hex
+        self._save({"job_id": job_id, "status": "queued", "submitted_at": time.time()})
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def get(self, job_id):
+        record = self.records.get(job_id)
+        return dict(record) if record is not None else self._disk_get(job_id)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters, pending=self._pending)
+        counters["disk_enabled"] = bool(self.disk_dir)
+        return counters
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job_id, fn, args, kwargs):
+        record = dict(self.records.get(job_id) or {"job_id": job_id, "submitted_at": time.time()}, status="running", started_at=time.time())
+        self._save(record)
+        try:
+            result, error = fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Job Error: {job_id} failed ({type(e).__name__}: {e})")
+            result, error = None, "Internal error during analysis"
+        status = "failed" if error else "done"
+        self._save(dict(record, status=status, result=result, error=error, finished_at=time.time()))
+        with self._lock:
+            self._pending -= 1
+            self._counters[status] += 1
+
+    def _save(self, record):
+        self.records.put(record["job_id"], record)
+        if self.disk_dir:
+            self._disk_put(record)
+
+    def _disk_path(self, job_id):
+        return os.path.join(self.disk_dir, job_id + ".json")
+
+    def _disk_get(self, job_id):
+        if not self.disk_dir or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        path = self._disk_path(job_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_s:
+                os.remove(path)
+                return None
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _prune_disk(self):
+        # Records nobody polled again are removed here rather than on read
+        now = time.time()
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            try:
+                if name.endswith(".json") and now - os.path.getmtime(path) > self.ttl_s:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _disk_put(self, record):
+        path = self._disk_path(record["job_id"])
+        try:
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(record, f)
+            os.replace(tmp_path, path)  # atomic, so a poll never sees a partial file
+        except OSError as e:
+            print(f"Job Store Warning: could not write {path} ({e})")
+
+
+job_store = JobStore(config.ASYNC_JOB_WORKERS, config.ASYNC_MAX_PENDING, config.ASYNC_JOB_TTL_S, config.ASYNC_JOB_DIR)
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+# Latency buckets in seconds, from a cached hit to a stalled OCR call
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DESCRIPTIONS = {
+    "forensic_stage_seconds": ("histogram", "Time spent per analysis stage (decode, module:<name>, ai.forward, visuals, ...)."),
+    "forensic_analysis_seconds": ("histogram", "End-to-end time of one note analysis inside the detector."),
+    "forensic_http_request_seconds": ("histogram", "HTTP request latency per endpoint."),
+    "forensic_http_requests_total": ("counter", "HTTP requests per endpoint and status code."),
+    "forensic_analyses_total": ("counter", "Note analyses by outcome (analyzed, cached, invalid_image, rejected)."),
+    "forensic_ai_fallbacks_total": ("counter", "Analyses that asked for the AI core while it was disabled (CV-only fallback)."),
+    "forensic_module_errors_total": ("counter", "Forensic modules that raised, per module."),
+    "forensic_module_timeouts_total": ("counter", "Forensic modules that exceeded their timeout, per module."),
+    "forensic_modules_executed_total": ("counter", "Forensic modules run across all analyses (divide by forensic_analyses_total for the average per note)."),
+    "forensic_modules_skipped_total": ("counter", "Modules skipped by the early-exit cascade because the verdict was already decided, per module."),
+    "forensic_inference_errors_total": ("counter", "Calls to the shared inference service that failed (scored without the AI core)."),
+    "forensic_ai_disabled": ("gauge", "1 when the AI core is disabled and analyses run CV-only."),
+    "forensic_model_warm": ("gauge", "1 once this worker's model has run its warm-up pass."),
+    "forensic_async_jobs_pending": ("gauge", "Async jobs queued or running on this worker."),
+    "forensic_result_cache_memory_entries": ("gauge", "Entries in this worker's in-memory result cache."),
+}
+
+
+class Timings:
+    """Stage durations of one request, in seconds. Module threads may record into it concurrently."""
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def as_ms(self):
+        with self._lock:
+            return {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """
+    Process-wide counters and latency histograms, rendered in the Prometheus text format.
+    With `shared_dir`, every server worker writes its snapshot there (at most once per
+    `dump_interval_s`) and /metrics reports the sum over all workers, so it does not matter
+    which worker answers the scrape.
+    """
+    def __init__(self, buckets=BUCKETS, shared_dir="", dump_interval_s=1.0):
+        self.buckets = tuple(buckets)
+        self.shared_dir = shared_dir
+        self.dump_interval_s = dump_interval_s
+        self._counters = {}
+        self._histograms = {}  # key -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+        self._last_dump = 0.0
+        if shared_dir:
+            os.makedirs(shared_dir, exist_ok=True)
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += seconds
+
+    def observe_timings(self, timings):
+        for stage, seconds in timings.stages.items():
+            self.observe("forensic_stage_seconds", seconds, stage=stage)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, list(labels), list(series)] for (name, labels), series in self._histograms.items()],
+            }
+
+    def maybe_dump(self):
+        """Writes this worker's snapshot to the shared directory (rate-limited)."""
+        now = time.monotonic()
+        if not self.shared_dir or now - self._last_dump < self.dump_interval_s:
+            return
+        self._last_dump = now
+        path = os.path.join(self.shared_dir, f"worker-{os.getpid()}.json")
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"Metrics Warning: could not write {path} ({e})")
+
+    def _merged(self):
+        if not self.shared_dir:
+            return [self.snapshot()]
+        self._last_dump = 0.0
+        self.maybe_dump()
+        snapshots = []
+        for name in os.listdir(self.shared_dir):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.shared_dir, name)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    pass
+        return snapshots
+
+    def render(self, gauges=None):
+        """Prometheus text exposition (version 0.0.4) of all workers' metrics plus this worker's `gauges`."""
+        counters, histograms = {}, {}
+        for snapshot in self._merged():
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, series in snapshot["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                total = histograms.setdefault(key, [0] * len(series))
+                histograms[key] = [a + b for a, b in zip(total, series)]
+
+        lines = []
+        for name in sorted({key[0] for key in counters}):
+            lines += _header(name, "counter")
+            for (series_name, labels), value in sorted(counters.items()):
+                if series_name == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        for name in sorted({key[0] for key in histograms}):
+            lines += _header(name, "histogram")
+            for (series_name, labels), series in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {series[-1]:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        for name, value in sorted((gauges or {}).items()):
+            lines += _header(name, "gauge")
+            lines.append(f"{name}{_labels((('pid', str(os.getpid())),))} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _header(name, kind):
+    help_text = DESCRIPTIONS.get(name, (kind, name.replace("_", " ")))[1]
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+metrics = Metrics(shared_dir=config.METRICS_DIR)
@@ -60,6 +60,34 @@ class CurrencyForensicNet(nn.Module):
         reconstruction = self.decoder(latent)
         return reconstruction, latent
 
-def get_anomaly_score(original, reconstructed):
-    """Calculates MSE between original and reconstructed image."""
-    return F.mse_loss(original, reconstructed).item()
+def get_dl_score(anomaly_score):
+    """DL Score: lower anomaly is better. Scale 0-10; above 5 counts as passed."""
+    return max(0, 10 - (anomaly_score * 100))
+
+def get_anomaly_scores(original, reconstructed):
+    """Per-sample MSE between originals and reconstructions, as an N tensor."""
+    errors = F.mse_loss(reconstructed, original, reduction='none')
+    return errors.flatten(1).mean(dim=1)
+
+def pool_latent(latent):
+    """Note embedding: the encoder's latent averaged over space (one value per channel)."""
+    return latent.mean(dim=(2, 3))
+
+class ForensicScoreHead(nn.Module):
+    """
+    CurrencyForensicNet plus its scoring, as one graph for TorchScript/ONNX export.
+    Returns per-note anomaly scores (MSE), min-max normalized attention maps (N x 64 x 64),
+    reconstructions (N x 3 x 512 x 512) and embeddings (N x 256, see pool_latent).
+    """
+    def __init__(self, net):
+        super(ForensicScoreHead, self).__init__()
+        self.net = net
+
+    def forward(self, x):
+        reconstruction, latent = self.net(x)
+        scores = get_anomaly_scores(x, reconstruction)
+        attention = latent.mean(dim=1)
+        low = attention.flatten(1).min(dim=1).values.view(-1, 1, 1)
+        high = attention.flatten(1).max(dim=1).values.view(-1, 1, 1)
+        attention = (attention - low) / (high - low + 1e-8)
+        return scores, attention, reconstruction, pool_latent(latent)
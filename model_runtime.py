@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+import torch
+
+import config
+from model_arch import CurrencyForensicNet, ForensicScoreHead
+
+# --- Inference Runtimes ---
+# Every runtime takes a normalized N x 3 x 512 x 512 float tensor and returns numpy arrays:
+# anomaly scores (N), attention maps in [0, 1] (N x 64 x 64), RGB uint8 reconstructions (N x 512 x 512 x 3)
+# and float32 embeddings (N x 256; None for models exported before the score head returned them).
+BACKENDS = ("eager", "torchscript", "onnx")
+
+
+def apply_thread_settings():
+    """Sizes torch's intra-/inter-op thread pools from config (call once, before the first forward pass)."""
+    torch.set_num_threads(config.TORCH_THREADS)
+    if config.TORCH_INTEROP_THREADS:
+        try:
+            torch.set_num_interop_threads(config.TORCH_INTEROP_THREADS)
+        except RuntimeError:
+            # Torch only allows this before any inter-op work has started
+            pass
+
+
+def grad_disabled():
+    """torch.inference_mode (no autograd bookkeeping at all) or the plain no_grad context."""
+    return torch.inference_mode() if config.INFERENCE_MODE else torch.no_grad()
+
+
+def backend_for(path):
+    """Picks the runtime from the file name: *.onnx, *.ts (TorchScript) or a state dict (*.pth, *.safetensors)."""
+    if path.endswith(".onnx"):
+        return "onnx"
+    if path.endswith(".ts"):
+        return "torchscript"
+    return "eager"
+
+
+def read_checkpoint(path):
+    if path.endswith('.safetensors'):
+        from safetensors.torch import load_file
+        return load_file(path)
+    try:
+        # Memory-map the checkpoint so tensors are paged in lazily instead of copied up front
+        return torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+    except (TypeError, RuntimeError):
+        # Older torch or legacy (non-zipfile) checkpoints cannot be memory-mapped
+        return torch.load(path, map_location='cpu', weights_only=True)
+
+
+def build_eager(path):
+    """CurrencyForensicNet with weights from `path` (untrained if the file is missing), wrapped in the score head."""
+    net = CurrencyForensicNet()
+    if os.path.exists(path):
+        net.load_state_dict(read_checkpoint(path))
+        print(f"Forensic weights loaded from {path}")
+    else:
+        print(f"Warning: no forensic weights at {path}. Running with untrained model.")
+    return ForensicScoreHead(net).eval()
+
+
+class TorchRuntime:
+    """Eager or TorchScript score head."""
+    def __init__(self, module, backend, device):
+        self.module = module.to(device) if backend == "eager" else module
+        self.backend = backend
+        self.device = device
+        self.memory_format = torch.channels_last if config.CHANNELS_LAST else torch.contiguous_format
+        if backend == "eager":
+            self.module = self.module.to(memory_format=self.memory_format)
+
+    def __call__(self, batch):
+        with grad_disabled():
+            batch = batch.to(self.device).contiguous(memory_format=self.memory_format)
+            outputs = self.module(batch)
+        scores, attention, reconstruction = outputs[:3]
+        reconstruction = (reconstruction.permute(0, 2, 3, 1) * 255).to(torch.uint8)
+        embeddings = outputs[3].float().cpu().numpy() if len(outputs) > 3 else None
+        return scores.cpu().numpy(), attention.cpu().numpy(), reconstruction.cpu().numpy(), embeddings
+
+
+class OnnxRuntime:
+    """Exported score head (fp32 or int8) on ONNX Runtime's CPU provider."""
+    backend = "onnx"
+
+    def __init__(self, path):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = config.TORCH_THREADS
+        if config.TORCH_INTEROP_THREADS:
+            options.inter_op_num_threads = config.TORCH_INTEROP_THREADS
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, batch):
+        outputs = self.session.run(None, {"input": batch.cpu().numpy()})
+        scores, attention, reconstruction = outputs[:3]
+        reconstruction = (np.transpose(reconstruction, (0, 2, 3, 1)) * 255).astype(np.uint8)
+        embeddings = outputs[3].astype(np.float32) if len(outputs) > 3 else None
+        return scores, attention, reconstruction, embeddings
+
+
+def load_runtime(path, device=torch.device('cpu'), backend=None):
+    """Loads the model at `path` with the given backend (default: from the file name)."""
+    backend = backend or backend_for(path)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+    if backend == "onnx":
+        runtime = OnnxRuntime(path)
+    elif backend == "torchscript":
+        runtime = TorchRuntime(torch.jit.load(path, map_location=device).eval(), backend, device)
+    else:
+        runtime = TorchRuntime(build_eager(path), backend, device)
+    if backend != "eager":
+        print(f"Forensic model loaded from {path} ({backend})")
+    return runtime
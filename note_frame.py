@@ -0,0 +1,151 @@
+import io
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import config
+from note_layout import get_layout, align_note
+
+
+class NoteFrame:
+    """
+    One decoded banknote plus lazily computed views (gray, HSV, edges, resizes, model tensor,
+    aligned note and layout regions). Every view is computed at most once per note and
+    shared by all forensic modules, including modules running concurrently on the scheduler's thread pool.
+    """
+    def __init__(self, image, layout=None):
+        self.image = image  # BGR, as decoded by OpenCV
+        self.layout = get_layout(layout or config.NOTE_LAYOUT)
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    @classmethod
+    def from_bytes(cls, image_bytes, layout=None):
+        """
+        Decodes an upload once. Returns None if the bytes are not an image (or empty).
+        Photos much larger than config.DECODE_MIN_SIDE are decoded at 1/2, 1/4 or 1/8 scale.
+        """
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        if not nparr.size:
+            return None  # cv2.imdecode asserts on an empty buffer
+        try:
+            image = cv2.imdecode(nparr, decode_flag(image_bytes, config.DECODE_MIN_SIDE))
+        except cv2.error:
+            return None
+        return cls(image, layout) if image is not None else None
+
+    def memo(self, key, compute):
+        if key in self._cache:
+            return self._cache[key]
+        # One lock per view: concurrent modules wait for a view in progress instead of recomputing it
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._cache:
+                self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @property
+    def gray(self):
+        return self.memo("gray", lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def hsv(self):
+        return self.memo("hsv", lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2HSV))
+
+    @property
+    def rgb(self):
+        return self.memo("rgb", lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB))
+
+    def edges(self, low, high):
+        return self.memo(("edges", low, high), lambda: cv2.Canny(self.gray, low, high))
+
+    def resized(self, size=(512, 512)):
+        return self.memo(("resized", size), lambda: cv2.resize(self.image, size))
+
+    def tensor(self, size=(512, 512)):
+        """Normalized 1x3xHxW RGB float tensor for CurrencyForensicNet (CPU)."""
+        def compute():
+            import torch
+            img_rgb = cv2.cvtColor(self.resized(size), cv2.COLOR_BGR2RGB)
+            return (torch.from_numpy(img_rgb).permute(2, 0, 1).float() / 255.0).unsqueeze(0)
+        return self.memo(("tensor", size), compute)
+
+    def pyramid(self, level):
+        """Level `level` of the image pyramid shared by all modules (each level halves the previous one)."""
+        if level == 0:
+            return self
+        return self.memo(("pyramid", level), lambda: NoteFrame(cv2.pyrDown(self.pyramid(level - 1).image), self.layout.name))
+
+    def scaled(self, width):
+        """This note `width` pixels wide, resized from the smallest pyramid level that is still wider."""
+        if width >= self.shape[1]:
+            return self
+        def compute():
+            level = 0
+            while (self.pyramid(level).shape[1] + 1) // 2 >= width:
+                level += 1
+            source = self.pyramid(level)
+            if source.shape[1] == width:
+                return source
+            height = max(1, round(source.shape[0] * width / source.shape[1]))
+            return NoteFrame(cv2.resize(source.image, (width, height), interpolation=cv2.INTER_AREA), self.layout.name)
+        return self.memo(("scaled", width), compute)
+
+    @property
+    def aligned(self):
+        """The note warped to its layout's canonical landscape size, as its own NoteFrame."""
+        return self.memo("aligned", lambda: NoteFrame(align_note(self.image, self.layout, config.NOTE_WIDTH), self.layout.name))
+
+    def region_box(self, name, width=None):
+        """Pixel box (x, y, w, h) of a layout region within the aligned note (optionally scaled to `width`)."""
+        height, width = self.aligned.scaled(width or config.NOTE_WIDTH).shape[:2]
+        return self.layout.box(name, width, height)
+
+    def region(self, name, width=None):
+        """
+        A layout region (e.g. 'thread', 'portrait') of the aligned note, as its own NoteFrame.
+        `width` is the working width of the whole aligned note the region is cut from.
+        """
+        def compute():
+            x, y, w, h = self.region_box(name, width)
+            note = self.aligned.scaled(width or config.NOTE_WIDTH)
+            return NoteFrame(note.image[y:y + h, x:x + w], self.layout.name)
+        return self.memo(("region", name, width), compute)
+
+
+# Largest reduction first; libjpeg decodes these scales directly from the DCT coefficients
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+# Enough for the image size even behind EXIF and ICC segments; if not, the photo is simply decoded at full size
+HEADER_BYTES = 256 * 1024
+
+
+def decode_flag(image_bytes, min_side):
+    """imdecode flag that keeps the long side of the decoded image at least `min_side` (0 disables reduction)."""
+    if not min_side:
+        return cv2.IMREAD_COLOR
+    if not isinstance(image_bytes, bytes):
+        # BytesIO copies any other buffer whole; the header sits near the start of the file
+        image_bytes = bytes(memoryview(image_bytes)[:HEADER_BYTES])
+    try:
+        # Reads the header only; the pixels are decoded once, by OpenCV
+        with Image.open(io.BytesIO(image_bytes)) as header:
+            long_side = max(header.size)
+    except Exception:
+        return cv2.IMREAD_COLOR
+    for factor, flag in REDUCED_FLAGS:
+        if long_side // factor >= min_side:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def as_frame(image):
+    """Accepts a NoteFrame or a raw BGR array, so legacy callers keep working."""
+    return image if isinstance(image, NoteFrame) else NoteFrame(image)
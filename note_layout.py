@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+
+# --- Note Layouts ---
+# Regions are (x0, y0, x1, y1) fractions of the aligned, landscape, front side of the note.
+# The generic layout uses wide bands that cover every denomination; the per-denomination
+# layouts are tighter so each detector sees less background.
+
+
+class NoteLayout:
+    """Canonical geometry of one denomination: aspect ratio (width / height) and named regions."""
+    def __init__(self, name, aspect, regions):
+        self.name = name
+        self.aspect = aspect
+        self.regions = dict(regions)
+
+    def size(self, width):
+        return width, int(round(width / self.aspect))
+
+    def box(self, region, width, height):
+        """Pixel box (x, y, w, h) of a named region in an aligned note of the given size."""
+        if region not in self.regions:
+            raise ValueError(f"Unknown note region '{region}' for layout '{self.name}'")
+        x0, y0, x1, y1 = self.regions[region]
+        x, y = int(x0 * width), int(y0 * height)
+        return x, y, max(1, int(x1 * width) - x), max(1, int(y1 * height) - y)
+
+
+def _regions(thread, portrait, watermark, microprint=(0.05, 0.80, 0.95, 0.97), serial=(0.0, 0.70, 0.50, 1.0)):
+    return {"thread": thread, "portrait": portrait, "watermark": watermark, "microprint": microprint, "serial": serial}
+
+
+LAYOUTS = {
+    layout.name: layout for layout in (
+        NoteLayout("generic", 2.25, _regions(thread=(0.20, 0.0, 0.60, 1.0), portrait=(0.45, 0.0, 1.0, 1.0),
+                                             watermark=(0.0, 0.0, 0.35, 1.0), microprint=(0.0, 0.70, 1.0, 1.0),
+                                             serial=(0.0, 0.55, 1.0, 1.0))),
+        NoteLayout("1000", 160 / 70, _regions(thread=(0.30, 0.0, 0.48, 1.0), portrait=(0.58, 0.08, 0.95, 0.92),
+                                              watermark=(0.04, 0.10, 0.30, 0.90))),
+        NoteLayout("500", 152 / 65, _regions(thread=(0.30, 0.0, 0.48, 1.0), portrait=(0.58, 0.08, 0.95, 0.92),
+                                             watermark=(0.04, 0.10, 0.30, 0.90))),
+        NoteLayout("100", 140 / 62, _regions(thread=(0.32, 0.0, 0.50, 1.0), portrait=(0.56, 0.08, 0.95, 0.92),
+                                             watermark=(0.04, 0.10, 0.32, 0.90))),
+    )
+}
+
+
+def get_layout(name):
+    if name not in LAYOUTS:
+        raise ValueError(f"Unknown note layout '{name}' (expected one of {', '.join(LAYOUTS)})")
+    return LAYOUTS[name]
+
+
+# --- Cheap Alignment ---
+LOCATE_WIDTH = 400  # Outline search runs on a thumbnail of this width
+DILATE_ITERATIONS = 2  # Closes small gaps in the note outline
+
+
+def _order_corners(pts):
+    """Orders 4 points as top-left, top-right, bottom-right, bottom-left, long side horizontal."""
+    pts = np.asarray(pts, dtype=np.float32)
+    s, d = pts.sum(axis=1), np.diff(pts, axis=1).ravel()
+    tl, br, tr, bl = pts[np.argmin(s)], pts[np.argmax(s)], pts[np.argmin(d)], pts[np.argmax(d)]
+    if np.linalg.norm(tr - tl) < np.linalg.norm(bl - tl):
+        # Note photographed upright: rotate the corner order by 90 degrees
+        tl, tr, br, bl = bl, tl, tr, br
+    return np.array([tl, tr, br, bl], dtype=np.float32)
+
+
+def locate_note(image):
+    """
+    Finds the note outline on a small thumbnail. Returns its 4 corners in full-image
+    coordinates, or None when the note fills the frame or no outline stands out.
+    """
+    h, w = image.shape[:2]
+    scale = min(1.0, LOCATE_WIDTH / w)
+    small = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small, (5, 5), 0)
+    edges = cv2.dilate(cv2.Canny(gray, 50, 150), None, iterations=DILATE_ITERATIONS)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    (cx, cy), (rw, rh), angle = cv2.minAreaRect(max(contours, key=cv2.contourArea))
+    # Undo the growth from the dilation above
+    rect = ((cx, cy), (max(1.0, rw - 2 * DILATE_ITERATIONS), max(1.0, rh - 2 * DILATE_ITERATIONS)), angle)
+    coverage = rect[1][0] * rect[1][1] / float(gray.shape[0] * gray.shape[1])
+    if not 0.2 < coverage < 0.9:
+        return None
+    return _order_corners(cv2.boxPoints(rect) / scale)
+
+
+def align_note(image, layout, width, corners=None):
+    """
+    Warps the note to the layout's canonical landscape size (`width` pixels wide).
+    Falls back to a plain resize (rotated to landscape) when no outline is found.
+    `corners` can pass in an outline already found by locate_note.
+    """
+    out_w, out_h = layout.size(width)
+    corners = locate_note(image) if corners is None else corners
+    if corners is None:
+        if image.shape[0] > image.shape[1]:
+            image = cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        return cv2.resize(image, (out_w, out_h), interpolation=cv2.INTER_AREA)
+
+    # Shrink large photos with area averaging first; the warp itself only interpolates
+    shrink = min(1.0, 2.0 * out_w / max(np.linalg.norm(corners[1] - corners[0]), 1.0))
+    if shrink < 0.5:
+        image = cv2.resize(image, None, fx=shrink, fy=shrink, interpolation=cv2.INTER_AREA)
+        corners = corners * shrink
+    target = np.array([[0, 0], [out_w - 1, 0], [out_w - 1, out_h - 1], [0, out_h - 1]], dtype=np.float32)
+    return cv2.warpPerspective(image, cv2.getPerspectiveTransform(corners, target), (out_w, out_h))
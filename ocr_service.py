@@ -0,0 +1,154 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import config
+
+# Page segmentation modes used by the detector (see `tesseract --help-psm`)
+PSM_AUTO = 3
+PSM_SINGLE_BLOCK = 6
+PSM_SPARSE = 11
+
+# --- Worker Process State ---
+_engine = None
+_engine_kind = None
+
+
+def _init_worker(lang):
+    """Starts one persistent Tesseract engine per worker process (falls back to pytesseract)."""
+    global _engine, _engine_kind
+    try:
+        import tesserocr
+        _engine = tesserocr.PyTessBaseAPI(lang=lang)
+        _engine_kind = "tesserocr"
+    except Exception as e:
+        print(f"OCR Warning: persistent engine unavailable ({type(e).__name__}: {e}). Using pytesseract.")
+        _engine, _engine_kind = None, "pytesseract"
+
+
+def _recognize(image, whitelist, psm, timeout):
+    """Runs OCR on a contiguous uint8 grayscale array inside a worker (or inline)."""
+    try:
+        return _run_engine(image, whitelist, psm, timeout)
+    except Exception as e:
+        # Some pytesseract exceptions cannot be unpickled in the parent; send a plain error back
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+def _run_engine(image, whitelist, psm, timeout):
+    if _engine is not None:
+        height, width = image.shape[:2]
+        _engine.SetPageSegMode(psm)
+        _engine.SetVariable("tessedit_char_whitelist", whitelist or "")
+        _engine.SetImageBytes(image.tobytes(), width, height, 1, width)
+        # Tesseract cancels recognition at the deadline, so most overruns free their worker. Page layout
+        # analysis does not check it; a call stuck there still runs on after recognize() has given up
+        if timeout and not _engine.Recognize(timeout=max(1, int(timeout * 1000))):
+            raise RuntimeError("Tesseract process timeout")
+        return _engine.GetUTF8Text()
+
+    import pytesseract
+    options = f"--psm {psm}"
+    if whitelist:
+        options += f" -c tessedit_char_whitelist={whitelist}"
+    return pytesseract.image_to_string(image, config=options, timeout=timeout)
+
+
+def _prepare(image, roi):
+    # Crop before crossing the process boundary so only the region of interest is pickled
+    if roi is not None:
+        x, y, w, h = roi
+        image = image[y:y + h, x:x + w]
+    if image.ndim == 3:
+        import cv2
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return np.ascontiguousarray(image, dtype=np.uint8)
+
+
+class OCRService:
+    """
+    OCR front end shared by every forensic module.
+    In 'pool' mode it keeps warm Tesseract engines in a process pool sized to the
+    cores, and accepts in-memory arrays plus an optional ROI and character whitelist.
+    'local' keeps one warm engine in this process (for processes that are themselves
+    pool workers, like the bulk scanner); 'inline' runs pytesseract per call.
+    """
+    def __init__(self, backend="pool", workers=1, lang="eng"):
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.lang = lang
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # 'spawn' keeps torch and the server's threads out of the OCR workers
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.lang,),
+                )
+        return self._pool
+
+    def warm_up(self):
+        """Starts every worker and its engine ahead of the first request."""
+        if self.backend == "local":
+            with self._lock:
+                if _engine_kind is None:
+                    _init_worker(self.lang)
+            return
+        if self.backend != "pool":
+            return
+        blank = np.full((32, 32), 255, dtype=np.uint8)
+        futures = [self._get_pool().submit(_recognize, blank, None, PSM_SINGLE_BLOCK, None) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def submit(self, image, roi=None, whitelist=None, psm=PSM_AUTO, timeout=None):
+        image = _prepare(image, roi)
+        try:
+            return self._get_pool().submit(_recognize, image, whitelist, psm, timeout)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool rather than failing forever
+            self.shutdown()
+            return self._get_pool().submit(_recognize, image, whitelist, psm, timeout)
+
+    def recognize(self, image, roi=None, whitelist=None, psm=PSM_AUTO, timeout=None):
+        """Returns the recognized text. Raises on OCR failure or timeout, like pytesseract."""
+        timeout = config.OCR_TIMEOUT_S if timeout is None else timeout
+        if self.backend == "local":
+            # One engine per process; Tesseract's API object is not thread-safe
+            with self._lock:
+                if _engine_kind is None:
+                    _init_worker(self.lang)
+                return _recognize(_prepare(image, roi), whitelist, psm, timeout)
+        if self.backend != "pool":
+            return _recognize(_prepare(image, roi), whitelist, psm, timeout)
+        try:
+            return self.submit(image, roi, whitelist, psm, timeout).result(timeout=timeout)
+        except BrokenProcessPool:
+            self.shutdown()
+            raise
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_ocr_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = OCRService(config.OCR_BACKEND, config.OCR_WORKERS, config.OCR_LANG)
+    return _service
@@ -0,0 +1,383 @@
+"""
+Reference index of genuine notes: the pooled encoder embedding (model_arch.pool_latent)
+of every known-genuine note, kept as a memory-mapped float16 or int8 matrix. Incoming
+notes are scored by their cosine distance to the k nearest genuine notes, a whole
+batch of queries at a time.
+
+    python reference_index.py add training_data/ [--dtype int8]
+    python reference_index.py stats
+
+Adding notes appends rows; nothing is rebuilt. From IVF_MIN_TRAIN notes on, every row
+is also assigned to the nearest k-means list, and queries only scan the `nprobe` closest
+lists instead of the whole matrix. The number of lists grows with the index (they are
+retrained, one pass over the file, each time it has doubled), so a query scans about
+the same number of rows at 10k notes as at 1M. Retrained lists go to new files
+(lists.<ivf>.i4, centroids.<ivf>.npy) that meta.json only points at once they are complete.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+import config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: run one writer at a time
+
+DTYPES = {"float16": np.float16, "int8": np.int8}
+# int8 rows are unit vectors times a scale fixed when the index is created: the largest component of the first
+# notes maps to 127 / INT8_HEADROOM, and later outliers are clipped
+INT8_HEADROOM = 1.5
+IVF_MIN_TRAIN = 4096
+# Lists are trained with this many rows each and retrained when the index has doubled, so a query scans
+# between nprobe * IVF_LIST_SIZE and twice that many rows at any index size
+IVF_LIST_SIZE = 64
+IVF_MAX_LISTS = 8192
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE_PER_LIST = 16
+KMEANS_MAX_SAMPLE = 65536
+CHUNK_ROWS = 65536
+# Queries searched together: they share one gather of their probed lists
+QUERY_CHUNK = 32
+# Genuine notes' own k-NN distances (leave-one-out) on a sample; this percentile scores 5 (the pass mark)
+CALIBRATION_SAMPLE = 512
+CALIBRATION_PERCENTILE = 99
+
+# Everything a query needs, taken from one consistent version of the files
+_State = namedtuple("_State", "meta vectors centroids order offsets")
+# Attempts at loading a state whose IVF files a concurrent retrain removed before they were opened
+LOAD_ATTEMPTS = 3
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors.reshape(len(vectors), -1)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def encode(unit, meta):
+    if meta["dtype"] == "int8":
+        return np.clip(np.round(unit * meta["scale"]), -127, 127).astype(np.int8)
+    return unit.astype(np.float16)
+
+
+def decode(rows, meta):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / meta["scale"] if meta["dtype"] == "int8" else rows
+
+
+def _merge_top(best_sims, best_ids, sims, ids, k):
+    # Keeps the k largest similarities per query row out of the current best and a new block
+    sims = np.concatenate([best_sims, sims], axis=1)
+    ids = np.concatenate([best_ids, np.broadcast_to(ids, (len(sims), len(ids)))], axis=1)
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(sims, top, axis=1), np.take_along_axis(ids, top, axis=1)
+
+
+def _replace(path, data):
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def _append(path, data, valid_bytes):
+    # Drops a partial tail left by an interrupted add (rows beyond the committed count) before appending
+    with open(path, "a+b") as f:
+        f.truncate(valid_bytes)
+        f.write(data)
+
+
+class ReferenceIndex:
+    """
+    Embeddings of genuine notes in `directory`. Several processes may query it while
+    one adds notes: readers pick up new rows when meta.json (written last) changes.
+    `dtype` only applies when the index is created.
+    """
+    def __init__(self, directory, dtype="float16", k=5, nprobe=8):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown index dtype '{dtype}' (expected one of {', '.join(DTYPES)})")
+        self.directory = directory
+        self.dtype = dtype
+        self.k = k
+        self.nprobe = nprobe
+        self._state = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _ivf_path(self, meta, kind):
+        # Each training of the lists has its own files, so a retrain never rewrites files readers may be loading
+        return self._path(f"lists.{meta['ivf']}.i4" if kind == "lists" else f"centroids.{meta['ivf']}.npy")
+
+    def _read_meta(self):
+        try:
+            with open(self._path("meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _load_state(self, meta):
+        count, dim = meta["count"], meta["dim"]
+        vectors = np.zeros((0, dim), DTYPES[meta["dtype"]])
+        if count:
+            vectors = np.memmap(self._path(f"vectors.{meta['dtype']}"), DTYPES[meta["dtype"]], "r", shape=(count, dim))
+        if not meta["nlist"]:
+            return _State(meta, vectors, None, None, None)
+        centroids = np.load(self._ivf_path(meta, "centroids"))
+        lists = np.fromfile(self._ivf_path(meta, "lists"), np.int32, count)
+        # Inverted lists: row ids grouped by list (ascending within a list, so gathers read forward)
+        order = np.argsort(lists, kind="stable")
+        offsets = np.searchsorted(lists[order], np.arange(meta["nlist"] + 1))
+        return _State(meta, vectors, centroids, order, offsets)
+
+    def refresh(self):
+        """Current state of the files (re-mapped after another process added notes); None while there is no index."""
+        if not self.directory:
+            return None
+        try:
+            stamp = os.stat(self._path("meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            self._state = self._stamp = None
+            return None
+        with self._lock:
+            if stamp != self._stamp:
+                for attempt in range(LOAD_ATTEMPTS):
+                    meta = self._read_meta()
+                    try:
+                        self._state = self._load_state(meta) if meta else None
+                        break
+                    except FileNotFoundError:
+                        # Lists retrained (and the old files removed) between reading meta.json and loading them
+                        if attempt == LOAD_ATTEMPTS - 1:
+                            raise
+                self._stamp = stamp
+            return self._state
+
+    def __len__(self):
+        state = self.refresh()
+        return state.meta["count"] if state else 0
+
+    def generation(self):
+        """Changes whenever notes are added or the lists retrained ('' without an index); part of result cache keys."""
+        state = self.refresh()
+        return f"{state.meta['count']}.{state.meta['version']}" if state else ""
+
+    # --- Queries ---
+    def search(self, queries, k=None, state=None):
+        """
+        Cosine distances (ascending) and row ids of the k nearest genuine notes for each
+        query embedding, as two (len(queries) x k) arrays.
+        """
+        state = state or self.refresh()
+        unit = normalize(queries)
+        count = state.meta["count"] if state else 0
+        k = min(k or self.k, count)
+        if not k:
+            return np.zeros((len(unit), 0), np.float32), np.zeros((len(unit), 0), np.int64)
+        best_sims = np.full((len(unit), k), -np.inf, np.float32)
+        best_ids = np.full((len(unit), k), -1, np.int64)
+        if state.centroids is None:
+            for start in range(0, count, CHUNK_ROWS):
+                block = decode(state.vectors[start:start + CHUNK_ROWS], state.meta)
+                best_sims, best_ids = _merge_top(best_sims, best_ids, unit @ block.T, np.arange(start, start + len(block)), k)
+        else:
+            for start in range(0, len(unit), QUERY_CHUNK):
+                part = slice(start, start + QUERY_CHUNK)
+                best_sims[part], best_ids[part] = self._search_lists(state, unit[part], best_sims[part], best_ids[part], k)
+        order = np.argsort(-best_sims, axis=1)
+        return 1.0 - np.take_along_axis(best_sims, order, axis=1), np.take_along_axis(best_ids, order, axis=1)
+
+    def _search_lists(self, state, unit, best_sims, best_ids, k):
+        nprobe = min(self.nprobe, len(state.centroids))
+        probes = np.argpartition(-(unit @ state.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        # One gather of every list any query probes, scored in one product; pairs of a query and a list
+        # it did not probe are masked out (cheaper than a Python loop over lists)
+        lists = np.unique(probes)
+        rows = np.concatenate([state.order[state.offsets[lst]:state.offsets[lst + 1]] for lst in lists])
+        owners = np.repeat(lists, state.offsets[lists + 1] - state.offsets[lists])
+        probed = np.zeros((len(unit), len(state.centroids)), bool)
+        np.put_along_axis(probed, probes, True, axis=1)
+        sims = unit @ decode(state.vectors[rows], state.meta).T
+        sims[~probed[:, owners]] = -np.inf
+        return _merge_top(best_sims, best_ids, sims, rows, k)
+
+    def score(self, embeddings, k=None):
+        """
+        (mean k-NN distance, 0-10 score) per embedding, or None without a calibrated index.
+        A note as far from its neighbours as the calibration percentile of genuine notes scores 5.
+        """
+        state = self.refresh()
+        threshold = state.meta.get("threshold") if state else None
+        if not threshold:
+            return None
+        distances, _ = self.search(embeddings, k, state)
+        distances = np.where(np.isfinite(distances), distances, 2.0).mean(axis=1)
+        scores = np.clip(10 - 5 * distances / threshold, 0, 10)
+        return [(float(d), float(s)) for d, s in zip(distances, scores)]
+
+    # --- Building ---
+    @contextmanager
+    def _writer(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(".lock"), "w") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def add(self, embeddings):
+        """Appends genuine notes' embeddings (N x dim) without touching existing rows; returns the new count."""
+        if not len(embeddings):
+            return len(self)
+        unit = normalize(embeddings)
+        with self._writer():
+            meta = self._read_meta() or {"dim": unit.shape[1], "dtype": self.dtype, "count": 0, "nlist": 0, "trained_count": 0,
+                                         "ivf": 0, "version": 0, "threshold": None, "scale": 127 / (INT8_HEADROOM * float(np.abs(unit).max()))}
+            if unit.shape[1] != meta["dim"]:
+                raise ValueError(f"Embedding size {unit.shape[1]} does not match the index ({meta['dim']})")
+            count, row_bytes = meta["count"], meta["dim"] * np.dtype(DTYPES[meta["dtype"]]).itemsize
+            _append(self._path(f"vectors.{meta['dtype']}"), encode(unit, meta).tobytes(), count * row_bytes)
+            if meta["nlist"]:
+                lists = self._assign(decode(encode(unit, meta), meta), np.load(self._ivf_path(meta, "centroids")))
+                # Readers only take the first `count` entries that meta.json announces, so appending is safe
+                _append(self._ivf_path(meta, "lists"), lists.astype(np.int32).tobytes(), count * 4)
+            meta["count"] += len(unit)
+            if meta["count"] >= IVF_MIN_TRAIN and meta["count"] >= 2 * meta["trained_count"]:
+                self._train(meta)
+            meta["threshold"] = self._calibrate(meta)
+            meta["version"] += 1
+            _replace(self._path("meta.json"), json.dumps(meta).encode())
+            self._remove_stale_ivf(meta)
+        return meta["count"]
+
+    @staticmethod
+    def _assign(unit, centroids):
+        return np.concatenate([np.argmax(unit[start:start + CHUNK_ROWS] @ centroids.T, axis=1)
+                               for start in range(0, len(unit), CHUNK_ROWS)])
+
+    def _train(self, meta):
+        # Spherical k-means on a sample, then every row is reassigned to its nearest list. The result goes to
+        # the next generation of IVF files; add() publishes it by writing meta.json last
+        vectors = self._load_state(dict(meta, nlist=0)).vectors
+        nlist = max(1, min(IVF_MAX_LISTS, meta["count"] // IVF_LIST_SIZE))
+        rng = np.random.default_rng(meta["count"])
+        sample = decode(vectors[np.sort(rng.choice(meta["count"], min(meta["count"], nlist * KMEANS_SAMPLE_PER_LIST, KMEANS_MAX_SAMPLE), replace=False))], meta)
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            labels = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize(sums)
+        lists = np.concatenate([self._assign(decode(vectors[start:start + CHUNK_ROWS], meta), centroids)
+                                for start in range(0, meta["count"], CHUNK_ROWS)])
+        meta["ivf"] += 1
+        _replace(self._ivf_path(meta, "lists"), lists.astype(np.int32).tobytes())
+        with open(self._ivf_path(meta, "centroids") + ".tmp", "wb") as f:
+            np.save(f, centroids.astype(np.float32))
+        os.replace(self._ivf_path(meta, "centroids") + ".tmp", self._ivf_path(meta, "centroids"))
+        meta["nlist"], meta["trained_count"] = nlist, meta["count"]
+
+    def _remove_stale_ivf(self, meta):
+        # Files of earlier trainings (or of one interrupted before meta.json was written); readers still holding
+        # an older meta.json retry with the new one
+        current = {self._ivf_path(meta, "lists"), self._ivf_path(meta, "centroids")} if meta["nlist"] else set()
+        for path in glob.glob(self._path("lists.*.i4")) + glob.glob(self._path("centroids.*.npy")):
+            if path not in current:
+                os.remove(path)
+
+    def _calibrate(self, meta):
+        # Leave-one-out: each sampled note finds itself first, so ask for one more neighbour and drop it
+        if meta["count"] < 2:
+            return None
+        state = self._load_state(meta)
+        rng = np.random.default_rng(0)
+        rows = np.sort(rng.choice(meta["count"], min(meta["count"], CALIBRATION_SAMPLE), replace=False))
+        k = min(self.k, meta["count"] - 1)
+        distances, _ = self.search(decode(state.vectors[rows], meta), k + 1, state)
+        distances = np.where(np.isfinite(distances[:, 1:]), distances[:, 1:], 2.0).mean(axis=1)
+        return max(float(np.percentile(distances, CALIBRATION_PERCENTILE)), 1e-4)
+
+    def stats(self):
+        state = self.refresh()
+        if state is None:
+            return {"directory": self.directory, "count": 0}
+        meta = state.meta
+        return dict(meta, directory=self.directory,
+                    bytes=os.path.getsize(self._path(f"vectors.{meta['dtype']}")) if meta["count"] else 0)
+
+
+reference_index = ReferenceIndex(config.REFERENCE_INDEX_DIR, config.REFERENCE_DTYPE, config.REFERENCE_K, config.REFERENCE_NPROBE)
+
+
+def note_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            yield from (os.path.join(path, name) for name in sorted(os.listdir(path))
+                        if name.lower().endswith((".jpg", ".jpeg", ".png")))
+        else:
+            yield path
+
+
+def add_notes(index, paths, denomination=None, batch_size=None):
+    """Embeds genuine note photos with the forensic model and adds them to `index`; returns (added, skipped)."""
+    import detector
+    if not config.INFERENCE_ADDRESS and not os.path.exists(config.MODEL_PATH):
+        print(f"Warning: no forensic weights at {config.MODEL_PATH}. An untrained model gives different embeddings in every process.")
+    batch_size = batch_size or config.MAX_BATCH_SIZE
+    paths = list(note_paths(paths))
+    added = skipped = 0
+    for start in range(0, len(paths), batch_size):
+        frames = []
+        for path in paths[start:start + batch_size]:
+            with open(path, "rb") as f:
+                frame = detector.decode_image(f.read(), denomination)
+            if frame is None:
+                print(f"Skipping {path}: not a readable image")
+                skipped += 1
+            else:
+                frames.append(frame)
+        embeddings = [output.get("embedding") for output in detector.run_ai_batch(frames)] if frames else []
+        if any(embedding is None for embedding in embeddings):
+            raise RuntimeError("the forensic model returned no embeddings (AI core disabled or a model exported without them)")
+        if embeddings:
+            index.add(np.stack(embeddings))
+            added += len(embeddings)
+        print(f"{added} notes added ({len(index)} in the index)")
+    return added, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("add", "stats"))
+    parser.add_argument("paths", nargs="*", help="genuine note photos or folders of them (add)")
+    parser.add_argument("--index", default=config.REFERENCE_INDEX_DIR, help="index directory (default: FORENSIC_REFERENCE_INDEX_DIR)")
+    parser.add_argument("--dtype", choices=tuple(DTYPES), default=config.REFERENCE_DTYPE, help="storage for a new index")
+    parser.add_argument("--denomination", default=None)
+    args = parser.parse_args()
+
+    index = ReferenceIndex(args.index, args.dtype, config.REFERENCE_K, config.REFERENCE_NPROBE)
+    if args.command == "add":
+        if not args.paths:
+            parser.error("add needs at least one photo or folder")
+        try:
+            add_notes(index, args.paths, args.denomination)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            return 1
+    print(json.dumps(index.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import threading
+
+import cv2
+
+
+class ResourceRegistry:
+    """
+    Process-wide cache for CV resources (cascades, templates, kernels).
+    Each resource is loaded once and reused across requests. OpenCV objects that
+    are not safe to share can be requested per thread instead.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shared = {}
+        self._local = threading.local()
+
+    def get(self, key, loader, per_thread=False):
+        if per_thread:
+            cache = self._local.__dict__.setdefault("resources", {})
+            if key not in cache:
+                cache[key] = loader()
+            return cache[key]
+
+        resource = self._shared.get(key)
+        if resource is None:
+            with self._lock:
+                resource = self._shared.get(key)
+                if resource is None:
+                    resource = self._shared[key] = loader()
+        return resource
+
+    def clear(self):
+        with self._lock:
+            self._shared.clear()
+        self._local = threading.local()
+
+
+registry = ResourceRegistry()
+
+
+def _load_cascade(name):
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + name)
+    if cascade.empty():
+        raise RuntimeError(f"Could not load Haar cascade '{name}'")
+    return cascade
+
+
+def get_cascade(name="haarcascade_frontalface_default.xml"):
+    # detectMultiScale keeps internal scratch state, so each thread gets its own classifier
+    return registry.get(("cascade", name), lambda: _load_cascade(name), per_thread=True)
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import config
+from ttl_cache import TTLCache
+
+
+def make_key(image_bytes, strictness, modules, layout="generic", early_exit=False, reference=""):
+    """Content hash of the upload plus every setting that changes the verdict (or which modules ran)."""
+    digest = hashlib.sha256(image_bytes)
+    digest.update(f"|strictness={strictness}|modules={','.join(sorted(modules))}|layout={layout}".encode())
+    if early_exit:
+        digest.update(b"|early_exit")
+    if reference:
+        digest.update(f"|reference={reference}".encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of analysis results: an in-memory LRU with size/TTL eviction,
+    backed by an optional directory of JSON files that survives restarts.
+    """
+    def __init__(self, max_entries=1024, ttl_s=3600.0, disk_dir="", disk_max_entries=50000, disk_ttl_s=7 * 24 * 3600.0):
+        self.memory = TTLCache(max_entries, ttl_s)
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self.disk_ttl_s = disk_ttl_s
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        self._disk_count = None
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key):
+        results = self.memory.get(key)
+        if results is not None:
+            self._count("memory_hits")
+            return results
+        results = self._disk_get(key)
+        if results is not None:
+            self.memory.put(key, results)
+            self._count("disk_hits")
+            return results
+        self._count("misses")
+        return None
+
+    def put(self, key, results):
+        self.memory.put(key, results)
+        self._count("stores")
+        if self.disk_dir:
+            self._disk_put(key, results)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        counters["hit_rate"] = round((counters["memory_hits"] + counters["disk_hits"]) / lookups, 4) if lookups else 0.0
+        counters["memory_entries"] = len(self.memory)
+        counters["disk_enabled"] = bool(self.disk_dir)
+        return counters
+
+    def clear(self):
+        self.memory.clear()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.disk_ttl_s:
+                os.remove(path)
+                return None
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key, results):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            is_new = not os.path.exists(path)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(results, f)
+            os.replace(tmp_path, path)  # atomic, so concurrent readers never see partial files
+            if is_new:
+                self._track_disk_entry()
+        except OSError as e:
+            print(f"Result Cache Warning: could not write {path} ({e})")
+
+    def _disk_entries(self):
+        entries = []
+        for shard in os.listdir(self.disk_dir):
+            shard_dir = os.path.join(self.disk_dir, shard)
+            if os.path.isdir(shard_dir):
+                entries.extend(os.path.join(shard_dir, name) for name in os.listdir(shard_dir) if name.endswith(".json"))
+        return entries
+
+    def _track_disk_entry(self):
+        # The directory is only walked once at start-up and again when the budget is exceeded
+        with self._lock:
+            if self._disk_count is None:
+                self._disk_count = len(self._disk_entries())
+            else:
+                self._disk_count += 1
+            if self._disk_count <= self.disk_max_entries:
+                return
+            entries = self._disk_entries()
+            entries.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+            # Evict down to 90% of the budget so pruning is amortized over many writes
+            excess = len(entries) - int(self.disk_max_entries * 0.9)
+            for path in entries[:max(0, excess)]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._disk_count = len(entries) - max(0, excess)
+
+
+result_cache = ResultCache(
+    config.RESULT_CACHE_SIZE,
+    config.RESULT_CACHE_TTL_S,
+    config.RESULT_CACHE_DIR,
+    config.RESULT_CACHE_DISK_MAX,
+    config.RESULT_CACHE_DISK_TTL_S,
+)
@@ -0,0 +1,361 @@
+"""
+Bulk scanner for stored note images. Walks directories and zip/tar archives, analyzes
+the notes on a pool of worker processes (each runs batched AI inference) and appends
+one record per note to JSONL, CSV or Parquet as results arrive. Re-running with the
+same output resumes: notes already recorded are skipped. With --retry-errors, failed
+notes are scanned again and a new record is appended (the last record per path wins).
+
+Usage:
+    python scan_notes.py scans/ archive-2024.zip more.tar.gz --output results.jsonl
+    python scan_notes.py scans/ --output results.parquet --workers 4 --batch-size 8 --modules ai,lines,watermark
+
+Records: path (archive members as <archive>!<member>), is_real, score, anomaly_score,
+ai_confidence (both null when the early exit skipped the AI), ai_active, timed_out_modules,
+skipped_modules, modules (per-module summary) and error.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+ARCHIVE_SEPARATOR = "!"
+RECORD_FIELDS = ("path", "is_real", "score", "anomaly_score", "ai_confidence", "ai_active", "timed_out_modules", "skipped_modules", "modules", "error")
+FORMATS = ("jsonl", "csv", "parquet")
+
+
+# --- Note Sources ---
+def is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def is_archive(name):
+    return name.lower().endswith(('.zip',) + TAR_EXTENSIONS)
+
+
+def _expand(paths):
+    """Plain images and archives in scan order; directories are walked in sorted order."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if is_image(name) or is_archive(name):
+                    yield os.path.join(root, name)
+
+
+def iter_notes(paths, skip=frozenset(), read=True):
+    """
+    Yields (note_id, image bytes) for every image under `paths`. Notes in `skip` are passed
+    over without reading their data; with read=False only the ids are listed (data is None).
+    """
+    for path in _expand(paths):
+        lower = path.lower()
+        if lower.endswith('.zip'):
+            with zipfile.ZipFile(path) as archive:
+                for name in archive.namelist():
+                    note_id = f"{path}{ARCHIVE_SEPARATOR}{name}"
+                    if is_image(name) and note_id not in skip:
+                        yield note_id, archive.read(name) if read else None
+        elif lower.endswith(TAR_EXTENSIONS):
+            # Streaming mode: compressed tars are read once, front to back
+            with tarfile.open(path, "r|*") as archive:
+                for member in archive:
+                    note_id = f"{path}{ARCHIVE_SEPARATOR}{member.name}"
+                    if member.isfile() and is_image(member.name) and note_id not in skip:
+                        yield note_id, archive.extractfile(member).read() if read else None
+        elif is_image(path) and path not in skip:
+            if not read:
+                yield path, None
+                continue
+            try:
+                with open(path, "rb") as f:
+                    yield path, f.read()
+            except OSError as e:
+                print(f"Scan Warning: could not read {path} ({e})", file=sys.stderr)
+                yield path, b""
+
+
+# --- Worker Processes ---
+_options = None
+
+
+def _init_worker(options):
+    global _options
+    import detector
+    detector.warm_up()
+    _options = options
+
+
+def _scan_batch(notes):
+    """Analyzes one batch of (note_id, bytes) in a worker and returns one record per note."""
+    import detector
+    outputs = detector.analyze_currency_batch([data for _, data in notes], max_batch_size=len(notes), visuals="none", **_options)
+    return [to_record(note_id, results, error) for (note_id, _), (results, error) in zip(notes, outputs)]
+
+
+def to_record(note_id, results, error):
+    if results is None:
+        return dict({field: None for field in RECORD_FIELDS}, path=note_id, error=error)
+    return dict({field: results.get(field) for field in RECORD_FIELDS}, path=note_id, error=error)
+
+
+# --- Output Writers ---
+class JsonlWriter:
+    def __init__(self, path):
+        self.path = path
+        _truncate_partial_line(path)
+        self.file = open(path, "a")
+
+    def recorded(self):
+        with open(self.path) as f:
+            for line in f:
+                yield json.loads(line)
+
+    def write(self, records):
+        for record in records:
+            self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CsvWriter:
+    """One row per note; `modules`, `timed_out_modules` and `skipped_modules` are JSON-encoded columns."""
+    def __init__(self, path):
+        self.path = path
+        _truncate_partial_line(path)
+        is_new = not os.path.getsize(path)
+        if not is_new:
+            with open(path, newline="") as f:
+                header = next(csv.reader(f), [])
+            if tuple(header) != RECORD_FIELDS:
+                raise ValueError(f"'{path}' has columns {', '.join(header)}; resume into a file written with the current columns or start a new one")
+        self.file = open(path, "a", newline="")
+        self.writer = csv.DictWriter(self.file, RECORD_FIELDS)
+        if is_new:
+            self.writer.writeheader()
+
+    def recorded(self):
+        with open(self.path, newline="") as f:
+            yield from csv.DictReader(f)
+
+    def write(self, records):
+        for record in records:
+            self.writer.writerow(dict(record, modules=json.dumps(record["modules"]), timed_out_modules=json.dumps(record["timed_out_modules"]),
+                                      skipped_modules=json.dumps(record["skipped_modules"])))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """
+    Parquet files cannot be appended to, so the output is a dataset directory of
+    part files, one per `flush_every` records. Records not yet flushed when the scan
+    stops are simply scanned again on resume.
+    """
+    def __init__(self, path, flush_every=500):
+        import pyarrow  # noqa: F401  (fail early if the optional dependency is missing)
+        self.path = path
+        self.flush_every = flush_every
+        self.pending = []
+        os.makedirs(path, exist_ok=True)
+
+    def _parts(self):
+        return sorted(os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith(".parquet"))
+
+    def recorded(self):
+        import pyarrow.parquet as pq
+        for part in self._parts():
+            yield from pq.read_table(part, columns=["path", "error"]).to_pylist()
+
+    def write(self, records):
+        self.pending.extend(records)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        # Explicit schema: a part holding only failed notes would otherwise infer null columns
+        schema = pa.schema([("path", pa.string()), ("is_real", pa.bool_()), ("score", pa.float64()), ("anomaly_score", pa.float64()),
+                            ("ai_confidence", pa.float64()), ("ai_active", pa.bool_()), ("timed_out_modules", pa.list_(pa.string())),
+                            ("skipped_modules", pa.list_(pa.string())), ("modules", pa.string()), ("error", pa.string())])
+        rows = [dict(record, modules=json.dumps(record["modules"])) for record in self.pending]
+        part = os.path.join(self.path, f"part-{len(self._parts()):05d}.parquet")
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), part + ".tmp")
+        os.replace(part + ".tmp", part)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+
+def _truncate_partial_line(path):
+    """Drops a half-written last line left by an interrupted scan (creates the file if missing)."""
+    with open(path, "ab+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if not size:
+            return
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+        if tail.endswith(b"\n"):
+            return
+        cut = tail.rfind(b"\n")
+        f.truncate(size - len(tail) + cut + 1 if cut >= 0 else max(0, size - len(tail)))
+
+
+def open_writer(path, fmt=None):
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "csv" if path.endswith(".csv") else "jsonl")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format '{fmt}' (expected one of {', '.join(FORMATS)})")
+    return {"jsonl": JsonlWriter, "csv": CsvWriter, "parquet": ParquetWriter}[fmt](path)
+
+
+def completed_notes(writer, retry_errors=False):
+    """Note ids already in the output (minus failed ones with `retry_errors`)."""
+    return {record["path"] for record in writer.recorded() if not (retry_errors and record.get("error"))}
+
+
+# --- Progress ---
+class Progress:
+    """Throughput and ETA on stderr, at most once every `interval_s` seconds."""
+    def __init__(self, total, interval_s=5.0):
+        self.total = total
+        self.interval_s = interval_s
+        self.done = 0
+        self.errors = 0
+        self.start = time.monotonic()
+        self.last = 0.0
+        self.reported = 0
+
+    def update(self, records, final=False):
+        self.done += len(records)
+        self.errors += sum(1 for record in records if record["error"])
+        now = time.monotonic()
+        if now - self.last < self.interval_s and not (final and self.done != self.reported):
+            return
+        self.last, self.reported = now, self.done
+        rate = self.done / max(now - self.start, 1e-9)
+        eta = (self.total - self.done) / rate if rate else float("inf")
+        eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta != float("inf") else "--:--:--"
+        print(f"{self.done}/{self.total} notes ({self.done / max(self.total, 1):.0%})  {rate:.2f} notes/s  "
+              f"ETA {eta_text}  errors {self.errors}", file=sys.stderr, flush=True)
+
+
+# --- Scan ---
+def scan(paths, writer, workers, batch_size, options, retry_errors=False, progress_s=5.0):
+    """Runs the scan and returns the Progress (notes done, errors, elapsed)."""
+    skip = completed_notes(writer, retry_errors)
+    total = sum(1 for _ in iter_notes(paths, skip, read=False))
+    if skip:
+        print(f"Resuming: {len(skip)} notes already recorded, {total} left", file=sys.stderr)
+    progress = Progress(total, progress_s)
+    if not total:
+        return progress
+
+    # Read by config in the spawned workers: cores are split between them, and each keeps
+    # one OCR engine in-process instead of a nested OCR pool
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    os.environ.setdefault("FORENSIC_OCR_BACKEND", "local")
+    os.environ.setdefault("FORENSIC_VISUAL_CACHE_SIZE", "1")
+
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker, initargs=(options,))
+    pending = set()
+    batch_ids = {}
+
+    def drain(until):
+        nonlocal pending
+        while len(pending) > until:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                note_ids = batch_ids.pop(future)
+                try:
+                    records = future.result()
+                except Exception as e:
+                    # One failing batch must not end the scan: record its notes as errors (--retry-errors rescans them)
+                    print(f"Scan Warning: batch of {len(note_ids)} notes failed ({type(e).__name__}: {e})", file=sys.stderr)
+                    records = [to_record(note_id, None, f"Worker error: {type(e).__name__}: {e}") for note_id in note_ids]
+                writer.write(records)
+                progress.update(records)
+
+    def submit(batch):
+        future = pool.submit(_scan_batch, batch)
+        batch_ids[future] = [note_id for note_id, _ in batch]
+        return future
+
+    try:
+        batch = []
+        for note in iter_notes(paths, skip):
+            batch.append(note)
+            if len(batch) == batch_size:
+                pending.add(submit(batch))
+                batch = []
+                # Bounded read-ahead: at most two batches queued per worker
+                drain(2 * workers)
+        if batch:
+            pending.add(submit(batch))
+        drain(0)
+    finally:
+        pool.shutdown(wait=not pending, cancel_futures=True)
+        writer.close()
+    progress.update([], final=True)
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="directories, image files, .zip or .tar[.gz|.bz2|.xz] archives")
+    parser.add_argument("--output", required=True, help="results file (.jsonl, .csv) or .parquet dataset directory")
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the output extension)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=8, help="notes per worker task and per forward pass")
+    parser.add_argument("--modules", default=None, help="comma-separated modules (default: FORENSIC_DEFAULT_MODULES / all)")
+    parser.add_argument("--strictness", type=int, default=12)
+    parser.add_argument("--denomination", default=None)
+    parser.add_argument("--full-analysis", action="store_true", help="run every module, no early exit once the verdict is decided (audits)")
+    parser.add_argument("--retry-errors", action="store_true", help="rescan notes whose recorded result is an error")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    # Validated here so a typo fails once, not once per note in every worker
+    # (the detector registers the AI module; its model is only loaded in the workers)
+    from detector import resolve_modules
+    from note_layout import get_layout
+    try:
+        modules = resolve_modules(args.modules)
+        if args.denomination:
+            get_layout(args.denomination)
+        writer = open_writer(args.output, args.format)
+    except (ValueError, ImportError) as e:
+        parser.error(str(e))
+
+    options = {"strictness": args.strictness, "modules": modules, "denomination": args.denomination, "full_analysis": args.full_analysis}
+    start = time.perf_counter()
+    try:
+        progress = scan(args.paths, writer, max(1, args.workers), max(1, args.batch_size), options, args.retry_errors, args.progress_every)
+    except KeyboardInterrupt:
+        print("Interrupted. Re-run the same command to resume.", file=sys.stderr)
+        sys.exit(130)
+    elapsed = time.perf_counter() - start
+    print(f"Scanned {progress.done} notes in {elapsed:.1f}s ({progress.done / max(elapsed, 1e-9):.2f} notes/s), "
+          f"{progress.errors} errors -> {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
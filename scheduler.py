@@ -0,0 +1,87 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import config
+from metrics import metrics
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Bounded, process-wide pool for forensic modules (OpenCV, torch and Tesseract release the GIL)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config.MODULE_WORKERS, thread_name_prefix="forensic")
+    return _executor
+
+
+class ModuleRun:
+    """Handle for a set of modules submitted together; `collect` waits for them."""
+    def __init__(self, submitted):
+        self.futures = {}
+        self.submitted = submitted
+        self.started = {}  # name -> threading.Event, set when the task leaves the queue
+        self.start_times = {}
+        self.timed_out = []
+
+    def wrap(self, name, fn):
+        started = self.started[name] = threading.Event()
+        def task():
+            self.start_times[name] = time.monotonic()
+            started.set()
+            return fn()
+        return task
+
+
+def submit_modules(tasks):
+    """Starts every zero-argument callable in `tasks` ({name: fn}) on the pool without waiting."""
+    executor = get_executor()
+    run = ModuleRun(time.monotonic())
+    for name, fn in tasks.items():
+        run.futures[name] = executor.submit(run.wrap(name, fn))
+    return run
+
+
+def _wait(run, name, future, timeout):
+    # The timeout counts from when the module starts running, not from submission: time spent queued
+    # behind other notes' modules is bounded separately, and a module still queued then is cancelled
+    queued_for = max(0.0, run.submitted + config.MODULE_QUEUE_TIMEOUT_S - time.monotonic())
+    if not run.started[name].wait(queued_for) and future.cancel():
+        raise TimeoutError(f"still queued after {config.MODULE_QUEUE_TIMEOUT_S}s")
+    run.started[name].wait()  # cancel() failed: the task has just started
+    return future.result(timeout=max(0.0, run.start_times[name] + timeout - time.monotonic()))
+
+
+def collect(run, defaults=None, timeouts=None):
+    """
+    Waits for submitted modules and returns {name: result}.
+    A module that runs longer than its timeout, waits in the pool's queue longer than
+    MODULE_QUEUE_TIMEOUT_S, or raises yields its entry in `defaults` instead, so one
+    slow check cannot stall the verdict. Such stand-ins carry `fallback: True`.
+    """
+    defaults = defaults or {}
+    timeouts = timeouts or {}
+    results = {}
+    for name, future in run.futures.items():
+        timeout = timeouts.get(name, config.MODULE_TIMEOUT_S)
+        try:
+            results[name] = _wait(run, name, future, timeout)
+        except TimeoutError as e:
+            print(f"Module Timeout: '{name}' {e or f'exceeded {timeout}s'}")
+            run.timed_out.append(name)
+            results[name] = dict(defaults.get(name) or {}, fallback=True)
+        except Exception as e:
+            print(f"Module Error: '{name}' failed ({e})")
+            metrics.inc("forensic_module_errors_total", module=name)
+            results[name] = dict(defaults.get(name) or {}, fallback=True)
+    return results
+
+
+def run_modules(tasks, defaults=None, timeouts=None):
+    """Runs independent modules concurrently and merges their results into one dict."""
+    run = submit_modules(tasks)
+    results = collect(run, defaults, timeouts)
+    return results, run.timed_out
@@ -1,35 +1,353 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Request, render_template, request, jsonify, Response, url_for
+from contextlib import contextmanager, ExitStack
+import io
+import json
 import os
+import sys
+import time
+import uuid
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Import the detector (cv2, the module registry) at boot. torch and the model are imported later by
+# init_detector / gunicorn's preload (detector.import_ai_runtime), or by the first request if neither ran
+_import_start = time.perf_counter()
+import config
+import detector
+from detector import analyze_currency_elite, analyze_currency_batch, get_ai_batcher, REGISTRY
+from jobs import job_store
+from metrics import metrics
+IMPORT_SECONDS = time.perf_counter() - _import_start
+
+class UploadRequest(Request):
+    """
+    Keeps uploaded files in memory instead of spooling them to temp files, so the detector
+    can read them in place (see upload_buffer). The body is bounded by MAX_CONTENT_LENGTH.
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
 
 app = Flask(__name__)
+app.request_class = UploadRequest
+# Werkzeug rejects larger bodies with 413 from Content-Length, before reading them
+app.config['MAX_CONTENT_LENGTH'] = int(config.MAX_REQUEST_MB * 1024 * 1024)
+
+def init_detector():
+    """Loads weights and runs the warm-up pass, reporting cold-start timings."""
+    timings = detector.warm_up()
+    print(f"Cold start: import {IMPORT_SECONDS:.2f}s, model load {timings['load_s']:.2f}s, warm-up {timings['warmup_s']:.2f}s, OCR workers {timings['ocr_warmup_s']:.2f}s")
+    return timings
+
+@contextmanager
+def upload_buffer(storage):
+    """
+    Zero-copy view of an uploaded file. The view is released when the block ends,
+    before werkzeug closes the underlying stream.
+    """
+    stream = storage.stream
+    if not hasattr(stream, "getbuffer"):
+        yield storage.read()
+        return
+    view = stream.getbuffer()
+    try:
+        yield view
+    finally:
+        view.release()
+
+def raw_upload():
+    """True for a bare image body (`Content-Type: image/*`) instead of a multipart form."""
+    return request.mimetype.startswith('image/')
+
+def read_body():
+    """A bare request body read straight into one preallocated buffer (no intermediate chunks)."""
+    length = request.content_length
+    if length is None:
+        return request.get_data(cache=False)
+    body = bytearray(length)
+    with memoryview(body) as view:
+        filled = 0
+        while filled < length:
+            count = request.stream.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+    return body if filled == length else body[:filled]
+
+def requested_modules():
+    """Module selection from a comma-separated or repeated `modules` field; None means the defaults."""
+    names = request.values.getlist('modules')
+    return ",".join(names) if names else None
+
+def visual_urls(results):
+    """Links to each visual of a result, served as image/jpeg straight from the encoded buffer."""
+    if results.get("result_id") is None:
+        return {}
+    frame, outputs = detector.visual_store.get(results["result_id"], (None, {}))
+    return {name: url_for('visual_image', result_id=results["result_id"], name=name) for name in detector.available_visuals(outputs)}
+
+def multipart_response(results, mode):
+    """
+    Streams the verdict JSON followed by one image/jpeg part per visual, so images
+    are never base64-inflated or copied into the JSON body.
+    """
+    frame, outputs = detector.visual_store.get(results.get("result_id"), (None, {}))
+    boundary = uuid.uuid4().hex
+    max_side = config.THUMBNAIL_SIZE if mode == "thumbnails" else None
+    quality = request.values.get('quality', None, type=int)
+
+    def generate():
+        yield f"--{boundary}\r\nContent-Type: application/json\r\n\r\n".encode()
+        yield json.dumps(results).encode() + b"\r\n"
+        if mode != "none" and frame is not None:
+            for name in config.RESPONSE_VISUALS:
+                img = detector.render_visual(frame, outputs, name)
+                if img is None:
+                    continue
+                buffer = detector.encode_jpeg(img, quality, max_side)
+                yield (f"--{boundary}\r\nContent-Type: image/jpeg\r\n"
+                       f"Content-Disposition: inline; name=\"{name}\"; filename=\"{name}.jpg\"\r\n"
+                       f"Content-Length: {len(buffer)}\r\n\r\n").encode()
+                yield buffer.tobytes()
+                yield b"\r\n"
+        yield f"--{boundary}--\r\n".encode()
+
+    return Response(generate(), mimetype=f"multipart/mixed; boundary={boundary}")
+
+# --- Request Metrics ---
+@app.before_request
+def start_timer():
+    request.started_at = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    # Label by route pattern, not the raw path, so job and result ids do not create series
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    if endpoint != '/metrics':
+        metrics.inc("forensic_http_requests_total", endpoint=endpoint, method=request.method, status=response.status_code)
+        metrics.observe("forensic_http_request_seconds", time.perf_counter() - getattr(request, "started_at", time.perf_counter()), endpoint=endpoint)
+        metrics.maybe_dump()
+    return response
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": f"Request too large (limit {config.MAX_REQUEST_MB:g} MB)"}), 413
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def analysis_options():
+    """Per-request settings shared by the sync and async endpoints; raises ValueError on bad input."""
+    visuals = request.values.get('visuals')
+    if visuals is not None and visuals not in detector.VISUAL_MODES:
+        raise ValueError(f"Unknown visuals mode '{visuals}'")
+    return {
+        "strictness": request.values.get('strictness', 12, type=int),
+        "modules": requested_modules(),
+        "visuals": visuals,
+        "denomination": request.values.get('denomination'),
+        "include_timings": flag_requested('timings'),
+        "full_analysis": flag_requested('full_analysis'),
+    }
+
+def flag_requested(name):
+    return request.values.get(name, '').lower() in ('1', 'true', 'yes')
+
+def upload_error():
+    """Error message when the request carries no note, else None."""
+    if raw_upload():
+        return None if request.content_length else "Empty request body"
+    if 'file' not in request.files:
+        return "No file uploaded"
+    if request.files['file'].filename == '':
+        return "No selected file"
+    return None
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
-    if 'file' not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"error": "No selected file"}), 400
-    
-    image_bytes = file.read()
-    
-    # Try elite analysis, fallback to legacy if needed
+    error = upload_error()
+    if error:
+        return jsonify({"error": error}), 400
     try:
-        from detector import analyze_currency_elite
-        results, error = analyze_currency_elite(image_bytes)
-    except ImportError:
-        from detector import analyze_currency
-        results, error = analyze_currency(image_bytes)
+        options = analysis_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response_format = request.values.get('format', 'json')
+    if response_format not in ('json', 'multipart'):
+        return jsonify({"error": f"Unknown format '{response_format}' (expected json or multipart)"}), 400
+    
+    # Multipart responses carry the images as binary parts, never as base64 in the JSON
+    visuals = options["visuals"]
+    if response_format == 'multipart':
+        options["visuals"] = 'none'
+    if raw_upload():
+        # Bare image body: read straight from the request stream, no form parsing
+        results, error = analyze_currency_elite(read_body(), **options)
+    else:
+        with upload_buffer(request.files['file']) as image_bytes:
+            results, error = analyze_currency_elite(image_bytes, **options)
     
     if error:
         return jsonify({"error": error}), 400
     
+    results["visual_urls"] = visual_urls(results)
+    if response_format == 'multipart':
+        return multipart_response(results, visuals or config.DEFAULT_VISUALS)
     return jsonify(results)
 
+@app.route('/analyze/async', methods=['POST'])
+def analyze_async():
+    """
+    Queues the analysis and answers 202 right away with a job to poll at /analyze/jobs/<job_id>,
+    so the request thread is free again as soon as the upload is in. Only the analysis is offloaded:
+    the upload itself is read on this thread (buffer slow clients in a reverse proxy). Takes the same fields as /analyze.
+    """
+    error = upload_error()
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        options = analysis_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # The job outlives the request, so it gets its own copy of the upload
+    image_bytes = read_body() if raw_upload() else request.files['file'].read()
+    job_id = job_store.submit(analyze_currency_elite, image_bytes, **options)
+    if job_id is None:
+        return jsonify({"error": "Too many pending jobs, retry later"}), 503, {"Retry-After": "5"}
+    status_url = url_for('analyze_job', job_id=job_id)
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": status_url}), 202, {"Location": status_url}
+
+@app.route('/analyze/jobs/<job_id>', methods=['GET'])
+def analyze_job(job_id):
+    """Job status (queued / running / done / failed); finished jobs carry the same result as /analyze."""
+    record = job_store.get(job_id)
+    if record is None:
+        return jsonify({"error": "Unknown or expired job_id"}), 404
+    return jsonify(record)
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    files = [f for f in request.files.getlist('files') if f.filename != '']
+    if not files:
+        return jsonify({"error": "No files uploaded"}), 400
+
+    strictness = request.form.get('strictness', 12, type=int)
+    max_batch_size = request.form.get('max_batch_size', None, type=int)
+    if max_batch_size is not None and max_batch_size < 1:
+        return jsonify({"error": "max_batch_size must be at least 1"}), 400
+    visuals = request.values.get('visuals')
+
+    try:
+        modules = detector.resolve_modules(requested_modules())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with ExitStack() as stack:
+        buffers = [stack.enter_context(upload_buffer(f)) for f in files]
+        outputs = analyze_currency_batch(buffers, strictness=strictness, max_batch_size=max_batch_size, modules=modules, visuals=visuals,
+                                         denomination=request.values.get('denomination'), include_timings=flag_requested('timings'),
+                                         full_analysis=flag_requested('full_analysis'))
+
+    for results, _ in outputs:
+        if results:
+            results["visual_urls"] = visual_urls(results)
+
+    # One entry per uploaded note, in upload order
+    return jsonify({"results": [
+        {"filename": f.filename, "result": results, "error": error}
+        for f, (results, error) in zip(files, outputs)
+    ]})
+
+@app.route('/visuals/<result_id>', methods=['GET'])
+def visuals(result_id):
+    """Renders visuals for a recent analysis on demand (`mode`=thumbnails|full, optional `names`)."""
+    stored = detector.visual_store.get(result_id)
+    if stored is None:
+        return jsonify({"error": "Unknown or expired result_id"}), 404
+    frame, outputs = stored
+
+    mode = request.args.get('mode', 'full')
+    names = request.args.get('names')
+    names = [n.strip() for n in names.split(',') if n.strip()] if names else detector.available_visuals(outputs)
+    try:
+        encoded = detector.encode_visuals(frame, outputs, mode, names)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"result_id": result_id, "available": detector.available_visuals(outputs), "visuals": encoded})
+
+@app.route('/visuals/<result_id>/<name>.jpg', methods=['GET'])
+def visual_image(result_id, name):
+    """One visual as image/jpeg (optional `quality` and `max_side`)."""
+    stored = detector.visual_store.get(result_id)
+    if stored is None:
+        return jsonify({"error": "Unknown or expired result_id"}), 404
+    frame, outputs = stored
+
+    quality = request.args.get('quality', None, type=int)
+    max_side = request.args.get('max_side', None, type=int)
+    jpeg = detector.visual_jpeg(frame, outputs, name, quality, max_side)
+    if jpeg is None:
+        return jsonify({"error": f"Visual '{name}' is not available for this result"}), 404
+    return Response(jpeg, mimetype='image/jpeg', headers={"Cache-Control": "private, max-age=60"})
+
+@app.route('/modules', methods=['GET'])
+def modules():
+    return jsonify({"modules": [module.describe() for module in REGISTRY.values()]})
+
+def process_stats():
+    """Memory of this worker process (peak RSS from getrusage, current RSS from /proc on Linux)."""
+    stats = {"pid": os.getpid()}
+    if resource is not None:
+        stats["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    try:
+        with open(f"/proc/{os.getpid()}/statm") as statm:
+            stats["rss_mb"] = round(int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, AttributeError, ValueError):
+        pass
+    return stats
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({"batcher": get_ai_batcher().stats(), "result_cache": detector.result_cache.stats(),
+                    "jobs": job_store.stats(), "process": process_stats()})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape target: request and per-stage latency histograms, error counters and gauges."""
+    gauges = {
+        "forensic_ai_disabled": detector.AI_DISABLED,
+        "forensic_model_warm": detector.WARM,
+        "forensic_async_jobs_pending": job_store.stats()["pending"],
+        "forensic_result_cache_memory_entries": detector.result_cache.stats()["memory_entries"],
+    }
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+# --- Health Checks ---
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the worker is up and serving requests."""
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 200 once the model is loaded and warm (CV-only mode counts as ready), 503 before."""
+    ready = detector.WARM or detector.AI_DISABLED
+    return jsonify({
+        "ready": ready,
+        "model_warm": detector.WARM,
+        "ai_active": not detector.AI_DISABLED,
+        "model_backend": getattr(detector.model, "backend", None),
+        "inference_service": config.INFERENCE_ADDRESS or None,
+        "pid": os.getpid(),
+    }), 200 if ready else 503
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    if '--profile-startup' in sys.argv:
+        # Import and warm-up time per module, measured in a fresh interpreter (see startup_profile.py)
+        import startup_profile
+        sys.exit(startup_profile.main([__file__] + [arg for arg in sys.argv[1:] if arg != '--profile-startup']))
+    # Development server only; production runs under gunicorn (see gunicorn_conf.py)
+    init_detector()
+    app.run(debug=config.DEBUG, use_reloader=False, threaded=True, port=5000)
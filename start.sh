@@ -14,6 +14,21 @@ fi
 # Activate venv
 source venv/bin/activate
 
+# Function to start the shared inference service (only when the front ends are pointed at it)
+start_inference() {
+    if [ -z "$FORENSIC_INFERENCE_ADDRESS" ]; then
+        return
+    fi
+    if pgrep -f "python3 inference_service.py" > /dev/null; then
+        echo "⚠️  Inference service is already running."
+    else
+        echo "🧠 Starting inference service at $FORENSIC_INFERENCE_ADDRESS ..."
+        nohup python3 inference_service.py --listen "$FORENSIC_INFERENCE_ADDRESS" > inference.log 2>&1 &
+        echo $! > .inference.pid
+        echo "✅ Inference service started. Logs: inference.log"
+    fi
+}
+
 # Function to start streamlit
 start_streamlit() {
     if pgrep -f "streamlit run app.py" > /dev/null; then
@@ -29,8 +44,14 @@ start_streamlit() {
 
 # Function to start flask
 start_flask() {
-    if pgrep -f "python3 server.py" > /dev/null; then
+    if pgrep -f "python3 server.py|gunicorn -c gunicorn_conf.py" > /dev/null; then
         echo "⚠️  Flask Classic UI is already running."
+    elif command -v gunicorn > /dev/null; then
+        echo "🌐 Starting Flask Classic UI (gunicorn) at http://127.0.0.1:5000 ..."
+        nohup gunicorn -c gunicorn_conf.py server:app > server.log 2>&1 &
+        echo $! > .flask.pid
+        sleep 2
+        echo "✅ Flask started. Logs: server.log"
     else
         echo "🌐 Starting Flask Classic UI at http://127.0.0.1:5000 ..."
         nohup python3 server.py > server.log 2>&1 &
@@ -40,6 +61,7 @@ start_flask() {
     fi
 }
 
+start_inference
 start_streamlit
 start_flask
 
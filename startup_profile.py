@@ -0,0 +1,136 @@
+"""
+Startup profiler for the front ends: how long a cold interpreter spends importing each
+module a script imports, which packages that time goes to, and how long detector
+initialization (model load, warm-up pass, OCR engines) takes afterwards.
+
+    python startup_profile.py server.py [--budget 3] [--no-init] [--no-ocr]
+    python server.py --profile-startup
+    python startup_profile.py app.py
+
+The script itself is not executed: its top-level imports are replayed in a fresh
+interpreter under `python -X importtime`. Exits with status 1 when the total exceeds
+the budget (default FORENSIC_STARTUP_BUDGET_S; 0 = no budget).
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+import config
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = r"""
+import importlib, json, sys, time
+timings = {"imports": [], "init": {}}
+for name in json.loads(sys.argv[1]):
+    start = time.perf_counter()
+    try:
+        importlib.import_module(name)
+    except Exception as e:
+        print(f"import {name} failed: {e}", file=sys.stderr)
+    timings["imports"].append([name, time.perf_counter() - start])
+if sys.argv[2] != "none":
+    import detector
+    start = time.perf_counter()
+    timings["init"] = detector.warm_up(ocr=sys.argv[2] == "ocr")
+    timings["init"]["total_s"] = time.perf_counter() - start
+print("RESULT" + json.dumps(timings))
+"""
+
+
+def script_imports(path):
+    """Absolute module names a script imports at top level (including inside try/if blocks, not the __main__ block), in order."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    names = []
+
+    def visit(body):
+        for node in body:
+            if isinstance(node, ast.Import):
+                names.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names.append(node.module)
+            elif isinstance(node, ast.If) and "__main__" in ast.unparse(node.test):
+                continue  # what the script does when run, not what importing it costs
+            elif isinstance(node, (ast.Try, ast.If)):
+                visit(node.body)
+                visit(node.orelse)
+                for handler in getattr(node, "handlers", []):
+                    visit(handler.body)
+    visit(tree.body)
+    return list(dict.fromkeys(names))
+
+
+def package_times(importtime_log):
+    """Self import time per top-level package (seconds) from `-X importtime` output."""
+    totals = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0.0) + int(self_us) / 1e6
+    return totals
+
+
+def profile(script, init="ocr"):
+    """Import and init timings for `script` measured in a fresh interpreter; `init` is 'ocr', 'model' or 'none'."""
+    modules = script_imports(script)
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE, json.dumps(modules), init],
+                         cwd=ROOT, capture_output=True, text=True)
+    line = [l for l in out.stdout.splitlines() if l.startswith("RESULT")]
+    if not line:
+        raise RuntimeError(out.stderr[-2000:])
+    timings = json.loads(line[0][len("RESULT"):])
+    timings["packages"] = package_times(out.stderr)
+    return timings
+
+
+def report(script, timings, budget_s, top=10):
+    """Prints the profile; returns the total startup time in seconds."""
+    print(f"Startup profile: {script}")
+    print("  imports (in script order; shared dependencies count toward the first importer)")
+    import_s = 0.0
+    for name, seconds in timings["imports"]:
+        import_s += seconds
+        print(f"    {name:<32} {seconds * 1000:9.1f} ms")
+    print("  slowest packages by own import time (during imports and initialization)")
+    for package, seconds in sorted(timings["packages"].items(), key=lambda item: -item[1])[:top]:
+        print(f"    {package:<32} {seconds * 1000:9.1f} ms")
+    init = timings["init"]
+    if init:
+        print("  initialization (detector.warm_up)")
+        for key, label in (("load_s", "model load (with torch import)"), ("warmup_s", "warm-up pass"), ("ocr_warmup_s", "OCR engines")):
+            print(f"    {label:<32} {init[key] * 1000:9.1f} ms")
+    total = import_s + init.get("total_s", 0.0)
+    verdict = ""
+    if budget_s:
+        verdict = f" (budget {budget_s:g} s: {'OK' if total <= budget_s else 'OVER'})"
+    print(f"  total {total:.2f} s{verdict}")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("script", nargs="?", default="server.py", help="front end to profile (default: server.py)")
+    parser.add_argument("--budget", type=float, default=config.STARTUP_BUDGET_S, help="seconds; exit 1 when exceeded")
+    parser.add_argument("--no-init", action="store_true", help="imports only, no detector warm-up")
+    parser.add_argument("--no-ocr", action="store_true", help="warm the model but do not start the OCR engines")
+    parser.add_argument("--json", action="store_true", help="print the raw timings as JSON")
+    args = parser.parse_args(argv)
+
+    init = "none" if args.no_init else ("model" if args.no_ocr else "ocr")
+    timings = profile(os.path.join(ROOT, args.script) if not os.path.isabs(args.script) else args.script, init)
+    if args.json:
+        print(json.dumps(timings))
+        total = sum(seconds for _, seconds in timings["imports"]) + timings["init"].get("total_s", 0.0)
+    else:
+        total = report(args.script, timings, args.budget)
+    return 1 if args.budget and total > args.budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
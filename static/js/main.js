@@ -51,6 +51,8 @@ async function handleFileUpload(file) {
 
     const formData = new FormData();
     formData.append('file', file);
+    // Images are fetched separately as image/jpeg streams via data.visual_urls
+    formData.append('visuals', 'none');
 
     try {
         const response = await fetch('/analyze', {
@@ -93,14 +95,20 @@ function displayResults(data) {
     }
 
     // Set Confidence
-    confidenceVal.innerText = data.confidence.toFixed(1) + '%';
-
-    // Set Images
-    origPreview.src = 'data:image/jpeg;base64,' + data.visuals.original;
-    edgeImg.src = 'data:image/jpeg;base64,' + data.visuals.edges;
-    houghImg.src = 'data:image/jpeg;base64,' + data.visuals.hough;
-    faceImg.src = 'data:image/jpeg;base64,' + data.visuals.faces;
-    ocrContent.innerText = data.ocr_text || 'No text detected';
+    // null when the early exit decided the verdict without the AI stage
+    if (data.ai_confidence == null) {
+        confidenceVal.innerText = (data.skipped_modules || []).includes('ai') ? 'skipped' : 'n/a';
+    } else {
+        confidenceVal.innerText = data.ai_confidence.toFixed(1) + '%';
+    }
+
+    // Set Images (served as binary JPEGs straight from the analysis cache)
+    const urls = data.visual_urls || {};
+    origPreview.src = urls.original || '';
+    edgeImg.src = urls.edges || '';
+    houghImg.src = urls.cv_features || '';
+    faceImg.src = urls.portrait || '';
+    ocrContent.innerText = (data.modules && data.modules.ocr && data.modules.ocr.text) || 'No text detected';
 
     // Populate Features
     featureList.innerHTML = '';
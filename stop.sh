@@ -24,6 +24,16 @@ if [ -f .flask.pid ]; then
     rm .flask.pid
 fi
 
+# Stop the inference service
+if [ -f .inference.pid ]; then
+    PID=$(cat .inference.pid)
+    if ps -p $PID > /dev/null; then
+        kill $PID
+        echo "✅ Inference service (PID: $PID) stopped."
+    fi
+    rm .inference.pid
+fi
+
 # PID file from previous version
 if [ -f .server.pid ]; then
     PID=$(cat .server.pid)
@@ -34,5 +44,7 @@ fi
 # Fallback cleanup
 pkill -f "streamlit run app.py" 2>/dev/null
 pkill -f "python3 server.py" 2>/dev/null
+pkill -f "gunicorn -c gunicorn_conf.py" 2>/dev/null
+pkill -f "python3 inference_service.py" 2>/dev/null
 
 echo "✅ All services stopped."
@@ -0,0 +1,309 @@
+"""
+Live analysis of a note held in front of a camera (or a video file / network stream).
+
+Cheap checks run on every frame in which a note is located. The medium and expensive
+checks (CurrencyForensicNet, OCR, lines, faces, thread) run in the background, and only
+on keyframes: frames where the note has been still for a few frames and is about as sharp
+as the sharpest frame seen so far. Sharpness is the Laplacian variance of the portrait
+region, the same measure the intaglio check uses. While a keyframe is being analyzed,
+later frames only get the cheap checks. Per-frame results are fused over a sliding window
+into one verdict per note, and the window resets when the note leaves the frame.
+
+Usage:
+    python stream_analyzer.py --source 0                   # webcam
+    python stream_analyzer.py --source note.mp4 --display  # video file
+    python stream_analyzer.py --source rtsp://camera/stream --denomination 1000
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import config
+import detector
+from detector import REGISTRY, resolve_modules, evaluate_modules, score_outputs
+from note_frame import NoteFrame
+from note_layout import align_note, locate_note
+
+MOTION_WIDTH = 320  # Frame differences are taken on a small grayscale copy
+
+
+# --- Temporal Fusion ---
+class TemporalFusion:
+    """
+    Keeps the last `window` outputs of each module for the current note and fuses them:
+    a module passes if it passed in at least half of its observations, and its scalar
+    outputs are the median of the observed values (text outputs: the latest).
+    """
+    def __init__(self, window=15):
+        self.window = window
+        self.history = {}
+        self.keyframes = 0
+        self.observations = 0
+
+    def reset(self):
+        self.history = {}
+        self.keyframes = 0
+        self.observations = 0
+
+    def add(self, outputs, keyframe=False):
+        for name, output in outputs.items():
+            self.history.setdefault(name, deque(maxlen=self.window)).append(output)
+        self.keyframes += int(keyframe)
+        self.observations += 1
+
+    def fused(self):
+        fused = {}
+        for name, observations in self.history.items():
+            output = {"passed": sum(bool(o.get("passed")) for o in observations) * 2 >= len(observations)}
+            for key in REGISTRY[name].outputs:
+                values = [o.get(key) for o in observations]
+                numbers = [v for v in values if isinstance(v, (int, float))]
+                output[key] = statistics.median(numbers) if len(numbers) == len(values) else values[-1]
+            fused[name] = output
+        return fused
+
+
+# --- Stream Analyzer ---
+class StreamAnalyzer:
+    """
+    Feed frames with `process(image, t)`; each call returns that frame's gate readings,
+    the note outline (`corners`, None without a note), whether it became a keyframe, and the current fused verdict (None until the first
+    keyframe has been analyzed). The verdict is final after STREAM_MIN_KEYFRAMES keyframes.
+    """
+    def __init__(self, modules=None, strictness=12, denomination=None):
+        names = resolve_modules(modules)
+        self.cheap = [name for name in names if REGISTRY[name].cost == "cheap"]
+        self.heavy = [name for name in names if REGISTRY[name].cost != "cheap"]
+        self.strictness = strictness
+        self.denomination = denomination
+        self.fusion = TemporalFusion(config.STREAM_FUSION_WINDOW)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="keyframe")
+        self._lock = threading.Lock()
+        self._keyframe = None
+        self._previous = None
+        self._still_frames = 0
+        self._absent_frames = 0
+        self._best_sharpness = 0.0
+        self._last_keyframe_t = None
+        self.frames = 0
+        self.keyframe_ms = []
+
+    def process(self, image, t=None):
+        t = time.monotonic() if t is None else t
+        self.frames += 1
+        self._collect_keyframe()
+        motion = self._motion(image)
+        result = {"frame": self.frames, "t": t, "note_found": False, "motion": motion, "sharpness": None, "keyframe": False}
+
+        corners = locate_note(image)
+        result["corners"] = corners
+        if corners is None:
+            self._absent_frames += 1
+            if self._absent_frames == config.STREAM_RESET_FRAMES:
+                self._reset()
+            result["verdict"] = self.verdict()
+            return result
+        self._absent_frames = 0
+        result["note_found"] = True
+
+        frame = NoteFrame(image, self.denomination)
+        # Warp with the outline found above instead of locating the note a second time
+        frame.memo("aligned", lambda: NoteFrame(align_note(image, frame.layout, config.NOTE_WIDTH, corners), frame.layout.name))
+        outputs, _ = evaluate_modules(frame, self.cheap)
+        sharpness = self._sharpness(frame, outputs)
+        self._best_sharpness = max(self._best_sharpness, sharpness)
+        result["sharpness"] = round(sharpness, 1)
+        with self._lock:
+            self.fusion.add(outputs)
+
+        self._still_frames = self._still_frames + 1 if motion is not None and motion <= config.STREAM_MAX_MOTION else 0
+        if self._keyframe_ready(sharpness, t):
+            self._last_keyframe_t = t
+            self._keyframe = self._executor.submit(self._analyze_keyframe, frame)
+            result["keyframe"] = True
+        result["verdict"] = self.verdict()
+        return result
+
+    def verdict(self):
+        """Fused verdict for the current note, or None before its first keyframe result."""
+        with self._lock:
+            # Without medium/expensive modules selected, the cheap checks alone make the verdict
+            settled = self.fusion.keyframes if self.heavy else self.fusion.observations
+            if not settled:
+                return None
+            fused, keyframes = self.fusion.fused(), self.fusion.keyframes
+        total_score, is_real = score_outputs(fused, self.strictness)
+        return {
+            "is_real": bool(is_real),
+            "score": round(total_score, 1),
+            "keyframes": keyframes,
+            "final": settled >= config.STREAM_MIN_KEYFRAMES,
+            "modules": {name: REGISTRY[name].summary(output) for name, output in fused.items()},
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._collect_keyframe()
+
+    def _keyframe_ready(self, sharpness, t):
+        if self._keyframe is not None or not self.heavy:
+            return False
+        if self._still_frames < config.STREAM_STABLE_FRAMES or sharpness < config.STREAM_MIN_SHARPNESS:
+            return False
+        # Only frames close to the sharpest one seen for this note
+        if sharpness < config.STREAM_SHARPNESS_RATIO * self._best_sharpness:
+            return False
+        return self._last_keyframe_t is None or t - self._last_keyframe_t >= config.STREAM_KEYFRAME_INTERVAL_S
+
+    def _analyze_keyframe(self, frame):
+        start = time.perf_counter()
+        outputs, _ = evaluate_modules(frame, self.heavy)
+        self.keyframe_ms.append((time.perf_counter() - start) * 1000)
+        return outputs
+
+    def _collect_keyframe(self):
+        if self._keyframe is None or not self._keyframe.done():
+            return
+        future, self._keyframe = self._keyframe, None
+        with self._lock:
+            self.fusion.add(future.result(), keyframe=True)
+
+    def _reset(self):
+        # The note left the frame; a keyframe still being analyzed belongs to it, so its result is dropped
+        self._keyframe = None
+        with self._lock:
+            self.fusion.reset()
+        self._best_sharpness = 0.0
+        self._last_keyframe_t = None
+
+    def _motion(self, image):
+        height, width = image.shape[:2]
+        scale = MOTION_WIDTH / width
+        small = cv2.cvtColor(cv2.resize(image, (MOTION_WIDTH, max(1, int(height * scale))), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        # Blurred so fine print shifting by a pixel does not count as movement
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+        previous, self._previous = self._previous, small
+        if previous is None or previous.shape != small.shape:
+            return None
+        return round(float(cv2.absdiff(small, previous).mean()), 2)
+
+    @staticmethod
+    def _sharpness(frame, outputs):
+        if "intaglio" in outputs:
+            return outputs["intaglio"]["variance"]
+        return float(cv2.Laplacian(frame.region("portrait").gray, cv2.CV_64F).var())
+
+
+# --- Frame Sources ---
+def open_source(source):
+    """A camera index ('0'), a video file, or a stream URL (rtsp://, http://)."""
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video source '{source}'")
+    return capture
+
+
+def run_stream(source, analyzer, realtime=None, max_frames=None, on_frame=None):
+    """
+    Reads `source` until it ends (or `max_frames`) and feeds every frame to `analyzer`.
+    Video files are read as fast as they decode unless `realtime`, in which case frames
+    the analyzer is too slow for are dropped, as a camera would. Returns run statistics.
+    """
+    capture = open_source(source)
+    is_file = not source.isdigit() and "://" not in source
+    realtime = not is_file if realtime is None else realtime
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_ms, dropped, start = [], 0, time.monotonic()
+    try:
+        while max_frames is None or analyzer.frames < max_frames:
+            ok, image = capture.read()
+            if not ok:
+                break
+            # Stream time: the file's own timeline, or the wall clock for live sources
+            t = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 if is_file else time.monotonic()
+            if realtime and is_file and t < time.monotonic() - start - 1.0 / fps:
+                dropped += 1
+                continue
+            begin = time.perf_counter()
+            result = analyzer.process(image, t)
+            frame_ms.append((time.perf_counter() - begin) * 1000)
+            if on_frame is not None and on_frame(image, result) is False:
+                break
+            if realtime and is_file:
+                time.sleep(max(0.0, t - (time.monotonic() - start)))
+    finally:
+        capture.release()
+        analyzer.close()
+    elapsed = time.monotonic() - start
+    return {
+        "frames": analyzer.frames,
+        "dropped": dropped,
+        "fps": round(analyzer.frames / max(elapsed, 1e-9), 1),
+        "frame_ms_p50": round(float(np.percentile(frame_ms, 50)), 1) if frame_ms else None,
+        "frame_ms_p95": round(float(np.percentile(frame_ms, 95)), 1) if frame_ms else None,
+        "keyframes": len(analyzer.keyframe_ms),
+        "keyframe_ms_p50": round(float(np.percentile(analyzer.keyframe_ms, 50)), 1) if analyzer.keyframe_ms else None,
+        "verdict": analyzer.verdict(),
+    }
+
+
+def draw_overlay(image, result):
+    """Note outline plus gate readings and the current verdict, for --display, drawn on a copy of the frame."""
+    # `image` may back the NoteFrame a keyframe thread is still analyzing
+    image = image.copy()
+    corners = result.get("corners")
+    if corners is not None:
+        cv2.polylines(image, [corners.astype(np.int32)], True, (0, 255, 0) if result["keyframe"] else (255, 200, 0), 2)
+    verdict = result["verdict"]
+    text = "NO VERDICT YET" if verdict is None else f"{'GENUINE' if verdict['is_real'] else 'SUSPECT'} {verdict['score']} ({verdict['keyframes']} kf)"
+    color = (200, 200, 200) if verdict is None else (0, 200, 0) if verdict["is_real"] else (0, 0, 255)
+    cv2.putText(image, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+    cv2.putText(image, f"motion {result['motion']}  sharpness {result['sharpness']}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    return image
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="0", help="camera index, video file or stream URL")
+    parser.add_argument("--modules", default=None)
+    parser.add_argument("--strictness", type=int, default=12)
+    parser.add_argument("--denomination", default=None)
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--realtime", action="store_true", help="pace video files at their frame rate, dropping frames like a camera")
+    parser.add_argument("--display", action="store_true", help="show the frames with the verdict overlaid (q quits)")
+    args = parser.parse_args()
+
+    detector.warm_up()
+    analyzer = StreamAnalyzer(args.modules, args.strictness, args.denomination)
+    last = {"verdict": None}
+
+    def on_frame(image, result):
+        verdict = result["verdict"]
+        summary = None if verdict is None else (verdict["is_real"], verdict["score"], verdict["final"])
+        if summary != last["verdict"]:
+            last["verdict"] = summary
+            print(f"frame {result['frame']}: " + ("no verdict" if verdict is None else
+                  f"{'GENUINE' if verdict['is_real'] else 'SUSPECT'} score={verdict['score']} keyframes={verdict['keyframes']}"
+                  f"{' (final)' if verdict['final'] else ''}"))
+        if args.display:
+            cv2.imshow("Currency Guardian - Live", draw_overlay(image, result))
+            return cv2.waitKey(1) & 0xFF != ord("q")
+        return True
+
+    try:
+        stats = run_stream(args.source, analyzer, args.realtime or None, args.max_frames, on_frame)
+    finally:
+        if args.display:
+            cv2.destroyAllWindows()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ from torch.utils.data import DataLoader, Dataset
 import cv2
 import os
 from model_arch import CurrencyForensicNet
+import config
 import numpy as np
 
 class RealCurrencyDataset(Dataset):
@@ -49,8 +50,8 @@ def train_anomaly_detector(data_path, epochs=50, batch_size=4):
             
         print(f"Epoch [{epoch+1}/{epochs}], Loss: {total_loss/len(loader):.6f}")
         
-    torch.save(model.state_dict(), "currency_forensic_model.pth")
-    print("Optimization Complete. Model saved as currency_forensic_model.pth")
+    torch.save(model.state_dict(), config.MODEL_PATH)
+    print(f"Optimization Complete. Model saved as {config.MODEL_PATH}")
 
 if __name__ == "__main__":
     # Create a dummy folder if it doesn't exist to show usage
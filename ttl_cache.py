@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe LRU mapping whose entries expire `ttl_s` seconds after insertion.
+    When full, the least recently used entry is evicted.
+    """
+    def __init__(self, max_entries=128, ttl_s=300.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._data.items() if expires < now]:
+            del self._data[key]
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)